@@ -1,5 +1,6 @@
 """penstock — lightweight flow tracing and visualization."""
 
+from penstock._batching import batch_step
 from penstock._config import configure
 from penstock._context import (
     current_flow_id,
@@ -9,14 +10,18 @@ from penstock._context import (
 )
 from penstock._dag import generate_dag
 from penstock._decorators import entrypoint, step
+from penstock._runner import arun_flow, run_flow
 
 __all__ = [
+    "arun_flow",
+    "batch_step",
     "configure",
     "current_flow_id",
     "entrypoint",
     "generate_dag",
     "get_flow_context",
     "get_flow_context_value",
+    "run_flow",
     "set_flow_context_value",
     "step",
 ]
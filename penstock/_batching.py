@@ -0,0 +1,262 @@
+"""``@batch_step``: gather concurrent step calls into one batch call."""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import threading
+import uuid
+from collections.abc import Callable, Hashable, Sequence
+from concurrent.futures import Future
+from typing import Any
+
+from penstock._config import get_backend
+from penstock._context import FlowContext, _set_context, get_flow_context
+from penstock._decorators import _normalize_after
+from penstock._instrument import (
+    await_step,
+    call_observers,
+    call_step,
+    resume_observers,
+)
+from penstock._registry import _registry
+from penstock._types import StepInfo
+
+# (value, batch_id, batch_size) delivered to each caller.
+_Outcome = tuple[Any, str, int]
+
+
+def batch_step(
+    flow_name: str,
+    *,
+    name: str | None = None,
+    after: str | Callable[..., Any] | list[str | Callable[..., Any]] | None = None,
+    max_batch: int = 100,
+    window_ms: float = 0.0,
+) -> Callable[[Callable[[list[Any]], Any]], Callable[[Hashable], Any]]:
+    """Mark a batch function as a flow step called with one key at a time.
+
+    The decorated function takes a list of keys and returns a sequence of
+    results in the same order.  Callers pass a single key; calls made close
+    together are gathered and the batch function runs once for all of them,
+    with up to *max_batch* keys.
+
+    An ``async def`` batch function gathers the calls made on an event loop
+    within *window_ms* (the current loop iteration when ``0``).  A sync one
+    gathers calls from different threads within *window_ms*, so it needs a
+    small positive window to batch anything.
+
+    Each caller gets its own span with ``batch_id`` and ``batch_size``
+    attributes.  The batch call has its own span, whose correlation ID is
+    the ``batch_id``.
+    """
+    if max_batch <= 0:
+        raise ValueError(f"max_batch must be positive, got {max_batch!r}")
+    if window_ms < 0:
+        raise ValueError(f"window_ms must not be negative, got {window_ms!r}")
+
+    def decorator(fn: Callable[[list[Any]], Any]) -> Callable[[Hashable], Any]:
+        info = StepInfo(
+            name=name or fn.__name__,
+            flow_name=flow_name,
+            after=_normalize_after(after),
+            is_entrypoint=False,
+        )
+        if inspect.iscoroutinefunction(fn):
+            wrapper = _AsyncBatcher(fn, info, max_batch, window_ms).wrapper()
+        else:
+            wrapper = _ThreadBatcher(fn, info, max_batch, window_ms).wrapper()
+        _registry.register(info, wrapper)
+        return wrapper
+
+    return decorator
+
+
+class _Batcher:
+    def __init__(
+        self,
+        fn: Callable[[list[Any]], Any],
+        info: StepInfo,
+        max_batch: int,
+        window_ms: float,
+    ) -> None:
+        self.fn = fn
+        self.step_name = info.name
+        self.flow_name = info.flow_name
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+
+    def _context(self) -> FlowContext:
+        ctx = get_flow_context()
+        if ctx is None:
+            raise RuntimeError(
+                f"@batch_step '{self.step_name}' called outside of a flow context. "
+                "Ensure an @entrypoint has been called first."
+            )
+        return ctx
+
+    def _check(self, keys: list[Any], results: Sequence[Any]) -> Sequence[Any]:
+        if len(results) != len(keys):
+            raise ValueError(
+                f"@batch_step '{self.step_name}' returned {len(results)} results "
+                f"for {len(keys)} keys"
+            )
+        return results
+
+    def _batch_context(self, sampled: bool) -> tuple[contextvars.Context, str]:
+        """Return a context for running one batch as its own flow."""
+        batch_id = uuid.uuid4().hex
+        context = contextvars.Context()
+        context.run(_set_context, FlowContext(batch_id, sampled=sampled))
+        return context, batch_id
+
+
+class _ThreadBatcher(_Batcher):
+    """Gathers calls from threads; the first caller of a batch runs it."""
+
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        self._lock = threading.Lock()
+        self._pending: list[tuple[Any, Future[_Outcome], bool]] = []
+
+    def wrapper(self) -> Callable[[Hashable], Any]:
+        @functools.wraps(self.fn)
+        def wrapper(key: Hashable) -> Any:
+            ctx = self._context()
+            if ctx.sampled is False:
+                return self._submit(key, False)[0]
+            backend = get_backend()
+            with backend.span(self.step_name, self.flow_name):
+                value, batch_id, size = self._submit(key, True)
+                backend.set_span_attributes(batch_id=batch_id, batch_size=size)
+                return value
+
+        return wrapper
+
+    def _submit(self, key: Hashable, sampled: bool) -> _Outcome:
+        future: Future[_Outcome] = Future()
+        with self._lock:
+            self._pending.append((key, future, sampled))
+            count = len(self._pending)
+        if count >= self.max_batch:
+            self._flush()
+        elif count == 1:
+            # First caller of a new batch: collect for the window unless a
+            # full batch is flushed first, then run whatever arrived.
+            try:
+                return future.result(timeout=self.window)
+            except TimeoutError:
+                self._flush()
+        return future.result()
+
+    def _flush(self) -> None:
+        with self._lock:
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+        if not batch:
+            return
+        keys = [key for key, _, _ in batch]
+        context, batch_id = self._batch_context(any(s for _, _, s in batch))
+        try:
+            results = context.run(self._run, keys)
+        except BaseException as exc:
+            for _, future, _ in batch:
+                future.set_exception(exc)
+            return
+        for (_, future, _), value in zip(batch, results, strict=True):
+            future.set_result((value, batch_id, len(batch)))
+
+    def _run(self, keys: list[Any]) -> Sequence[Any]:
+        ctx = self._context()
+        observers = call_observers(self.flow_name, self.step_name, ctx)
+        if not ctx.sampled:
+            return self._check(keys, call_step(self.fn, (keys,), {}, observers, None))
+        backend = get_backend()
+        with backend.flow_span(self.step_name, self.flow_name, batch_size=len(keys)):
+            results = call_step(self.fn, (keys,), {}, observers, backend)
+            return self._check(keys, results)
+
+
+class _AsyncBatcher(_Batcher):
+    """Gathers calls made on one event loop and runs each batch as a task."""
+
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        # Event loop -> calls waiting for the next batch on it.
+        self._pending: dict[
+            asyncio.AbstractEventLoop,
+            list[tuple[Any, asyncio.Future[_Outcome], bool]],
+        ] = {}
+        self._handles: dict[asyncio.AbstractEventLoop, asyncio.Handle] = {}
+
+    def wrapper(self) -> Callable[[Hashable], Any]:
+        @functools.wraps(self.fn)
+        async def wrapper(key: Hashable) -> Any:
+            ctx = self._context()
+            if ctx.sampled is False:
+                return (await self._submit(key, False))[0]
+            backend = get_backend()
+            with backend.span(self.step_name, self.flow_name):
+                value, batch_id, size = await self._submit(key, True)
+                backend.set_span_attributes(batch_id=batch_id, batch_size=size)
+                return value
+
+        return wrapper
+
+    def _submit(self, key: Hashable, sampled: bool) -> asyncio.Future[_Outcome]:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[_Outcome] = loop.create_future()
+        pending = self._pending.setdefault(loop, [])
+        pending.append((key, future, sampled))
+        if len(pending) >= self.max_batch:
+            handle = self._handles.pop(loop, None)
+            if handle is not None:
+                handle.cancel()
+            self._flush(loop)
+        elif len(pending) == 1:
+            if self.window:
+                handle = loop.call_later(self.window, self._flush, loop)
+            else:
+                handle = loop.call_soon(self._flush, loop)
+            self._handles[loop] = handle
+        return future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._handles.pop(loop, None)
+        batch = self._pending.pop(loop, [])
+        if not batch:
+            return
+        context, batch_id = self._batch_context(any(s for _, _, s in batch))
+        loop.create_task(self._run(batch, batch_id), context=context)
+
+    async def _run(
+        self,
+        batch: list[tuple[Any, asyncio.Future[_Outcome], bool]],
+        batch_id: str,
+    ) -> None:
+        keys = [key for key, _, _ in batch]
+        try:
+            results = await self._call(keys)
+        except BaseException as exc:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            if not isinstance(exc, Exception):
+                raise
+            return
+        for (_, future, _), value in zip(batch, results, strict=True):
+            if not future.done():
+                future.set_result((value, batch_id, len(batch)))
+
+    async def _call(self, keys: list[Any]) -> Sequence[Any]:
+        ctx = self._context()
+        observers = resume_observers(self.flow_name, self.step_name, ctx)
+        if not ctx.sampled:
+            results = await await_step(self.fn(keys), observers, None)
+            return self._check(keys, results)
+        backend = get_backend()
+        with backend.flow_span(self.step_name, self.flow_name, batch_size=len(keys)):
+            results = await await_step(self.fn(keys), observers, backend)
+            return self._check(keys, results)
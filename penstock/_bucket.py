@@ -0,0 +1,36 @@
+"""Token bucket shared by the rate limits."""
+
+from __future__ import annotations
+
+import time
+
+
+class TokenBucket:
+    """Allows *rate* events a second on average, and up to *capacity* at once.
+
+    The bucket starts full.  Not thread-safe: callers hold their own lock.
+    """
+
+    __slots__ = ("_refilled", "_tokens", "capacity", "rate")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate!r}")
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity!r}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._refilled = time.monotonic()
+
+    def take(self) -> bool:
+        """Take a token if one is available and return whether one was."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._refilled) * self.rate
+        )
+        self._refilled = now
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
@@ -0,0 +1,136 @@
+"""Single-flight sharing of identical concurrent calls."""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import threading
+from collections.abc import Awaitable, Callable, Hashable
+from concurrent.futures import Future
+from typing import Any
+
+ABANDONED: Any = object()
+"""A flight's result when its leader was cancelled or interrupted.
+
+Its followers join a new flight instead: the cancellation was the
+leader's, not theirs.
+"""
+
+
+class Flight:
+    """One in-flight execution and the callers waiting on it."""
+
+    __slots__ = ("followers", "future", "leader_id")
+
+    def __init__(self, leader_id: str) -> None:
+        self.leader_id = leader_id
+        self.followers = 0
+        self.future: Future[Any] = Future()
+        # A running future can't be cancelled, so a follower giving up (e.g.
+        # a cancelled task awaiting it) doesn't cancel the leader's result.
+        self.future.set_running_or_notify_cancel()
+
+    def landed(self, timeout: float | None = None) -> bool:
+        """Wait up to *timeout* seconds for the leader; return whether it finished."""
+        try:
+            self.future.exception(timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    async def alanded(self, timeout: float | None = None) -> bool:
+        """Async counterpart of :meth:`landed`."""
+        waiter = asyncio.wrap_future(self.future)
+        try:
+            await asyncio.wait((waiter,), timeout=timeout)
+        finally:
+            waiter.cancel()
+        return self.future.done()
+
+    def outcome(self) -> Any:
+        """Return the leader's result, or raise a copy of its exception.
+
+        Each follower raises its own copy, chained to the leader's, so
+        followers raising at once in different threads or tasks don't all
+        add to one ``__traceback__``.  Blocks until the flight has landed.
+        """
+        error = self.future.exception()
+        if error is None:
+            return self.future.result()
+        try:
+            clone = copy.copy(error)
+        except Exception:
+            # Exceptions whose __init__ doesn't take their args can't be
+            # copied; those are shared.
+            clone = None
+        if clone is None:
+            raise error
+        if hasattr(error, "__notes__"):
+            clone.__notes__ = list(error.__notes__)
+        raise clone from error
+
+
+class Flights:
+    """In-flight executions keyed by call, e.g. of one coalescing entrypoint.
+
+    Safe to share between threads and event loops: followers wait on a
+    :class:`concurrent.futures.Future`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: dict[Hashable, Flight] = {}
+
+    def join(self, key: Hashable, correlation_id: str) -> tuple[Flight, bool]:
+        """Return the flight for *key* and whether the caller leads it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                return flight, False
+            flight = self._flights[key] = Flight(correlation_id)
+            return flight, True
+
+    def lead(self, flight: Flight, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run *fn* as the leader of *flight* and hand its outcome to followers.
+
+        If *fn* is cancelled or interrupted rather than raising an
+        :class:`Exception`, the followers get :data:`ABANDONED`.
+        """
+        try:
+            result = fn()
+        except Exception as exc:
+            self._land(key)
+            flight.future.set_exception(exc)
+            raise
+        except BaseException:
+            self._land(key)
+            flight.future.set_result(ABANDONED)
+            raise
+        self._land(key)
+        flight.future.set_result(result)
+        return result
+
+    async def alead(
+        self, flight: Flight, key: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Async counterpart of :meth:`lead`."""
+        try:
+            result = await fn()
+        except Exception as exc:
+            self._land(key)
+            flight.future.set_exception(exc)
+            raise
+        except BaseException:
+            self._land(key)
+            flight.future.set_result(ABANDONED)
+            raise
+        self._land(key)
+        flight.future.set_result(result)
+        return result
+
+    def _land(self, key: Hashable) -> None:
+        # Calls arriving from now on start a new flight rather than reuse a
+        # finished one.
+        with self._lock:
+            self._flights.pop(key, None)
@@ -5,13 +5,21 @@ from __future__ import annotations
 import threading
 
 from penstock.backends.base import TracingBackend
+from penstock.sampling import Sampler
 
 _lock = threading.Lock()
 _backend: TracingBackend | None = None
 _configured = False
+_sampler: Sampler | None = None
+_cpu_time = False
 
 
-def configure(backend: TracingBackend | str = "auto") -> None:
+def configure(
+    backend: TracingBackend | str = "auto",
+    *,
+    sampler: Sampler | None = None,
+    cpu_time: bool = False,
+) -> None:
     """Set the global tracing backend.
 
     *backend* can be:
@@ -19,8 +27,15 @@ def configure(backend: TracingBackend | str = "auto") -> None:
     - ``"logging"`` — use the built-in :class:`LoggingBackend`
     - ``"otel"`` — reserved for future OpenTelemetry support
     - ``"auto"`` — try OTel, fall back to logging
+
+    *sampler* decides once per flow whether its spans are emitted (see
+    :mod:`penstock.sampling`).  ``None`` samples every flow.
+
+    *cpu_time* records the thread CPU time of every step, and for async steps
+    the split between time running on the event loop and time suspended at
+    ``await``, as span attributes.
     """
-    global _backend, _configured
+    global _backend, _configured, _sampler, _cpu_time
     with _lock:
         if isinstance(backend, TracingBackend):
             _backend = backend
@@ -36,6 +51,8 @@ def configure(backend: TracingBackend | str = "auto") -> None:
             _backend = _auto_detect()
         else:
             raise ValueError(f"Unknown backend: {backend!r}")
+        _sampler = sampler
+        _cpu_time = cpu_time
         _configured = True
 
 
@@ -54,12 +71,24 @@ def get_backend() -> TracingBackend:
         return _backend
 
 
+def get_sampler() -> Sampler | None:
+    """Return the configured sampler, or ``None`` to sample every flow."""
+    return _sampler
+
+
+def cpu_time_enabled() -> bool:
+    """Return whether per-step CPU timing is enabled."""
+    return _cpu_time
+
+
 def reset() -> None:
     """Reset configuration to unconfigured state. Intended for testing."""
-    global _backend, _configured
+    global _backend, _configured, _sampler, _cpu_time
     with _lock:
         _backend = None
         _configured = False
+        _sampler = None
+        _cpu_time = False
 
 
 def _auto_detect() -> TracingBackend:
@@ -3,9 +3,17 @@
 from __future__ import annotations
 
 import copy
+import time
 import uuid
 from contextvars import ContextVar
-from typing import Any
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from penstock.backends.logging import StepTimings
+
+# (correlation_id, metadata, sampled, deadline, traceparent, tracestate),
+# see FlowContext._to_state.
+_State = tuple[str, dict[str, Any], bool | None, float | None, str | None, str | None]
 
 
 class FlowContext:
@@ -14,17 +22,49 @@ class FlowContext:
     Thread-safe and async-safe via ``contextvars``.  Use :meth:`fork` to
     create a child context that shares the correlation ID but gets an
     independent deep-copy of metadata (useful for Celery / cross-process).
+
+    ``sampled`` holds the head-based sampling decision for the flow: ``True``
+    or ``False`` once an entrypoint (or an upstream service) has decided, and
+    ``None`` while undecided.  Only an explicit ``False`` suppresses spans.
+
+    ``deadline`` is an absolute Unix timestamp after which the flow's result
+    is no longer wanted, or ``None``; see :mod:`penstock.deadlines`.
+
+    ``traceparent`` and ``tracestate`` hold the W3C Trace Context headers the
+    flow was started with, if any, so they can be passed on unchanged; see
+    :mod:`penstock.propagation`.
     """
 
-    __slots__ = ("_metadata", "correlation_id")
+    __slots__ = (
+        "_metadata",
+        "_span_buffer",
+        "_step_timings",
+        "correlation_id",
+        "deadline",
+        "sampled",
+        "traceparent",
+        "tracestate",
+    )
 
     def __init__(
         self,
         correlation_id: str | None = None,
         metadata: dict[str, Any] | None = None,
+        sampled: bool | None = None,
+        deadline: float | None = None,
+        traceparent: str | None = None,
+        tracestate: str | None = None,
     ) -> None:
         self.correlation_id: str = correlation_id or uuid.uuid4().hex
         self._metadata: dict[str, Any] = metadata if metadata is not None else {}
+        self.sampled: bool | None = sampled
+        self.deadline: float | None = deadline
+        self.traceparent: str | None = traceparent
+        self.tracestate: str | None = tracestate
+        # Step records held back by a buffering backend until the flow ends.
+        self._span_buffer: list[tuple[str, dict[str, Any]]] | None = None
+        # Step timings accumulated by a summarising backend.
+        self._step_timings: StepTimings | None = None
 
     # -- value helpers --------------------------------------------------------
 
@@ -45,6 +85,38 @@ class FlowContext:
         """Read-only snapshot of the current metadata."""
         return dict(self._metadata)
 
+    def time_left(self) -> float | None:
+        """Return the seconds left until the deadline (negative once passed)."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    # -- serialization --------------------------------------------------------
+
+    def _to_state(self) -> _State:
+        """Return a compact picklable form for crossing process boundaries."""
+        return (
+            self.correlation_id,
+            self._metadata,
+            self.sampled,
+            self.deadline,
+            self.traceparent,
+            self.tracestate,
+        )
+
+    @classmethod
+    def _from_state(cls, state: _State) -> FlowContext:
+        """Rebuild a context from :meth:`_to_state` output."""
+        correlation_id, metadata, sampled, deadline, traceparent, tracestate = state
+        return cls(
+            correlation_id=correlation_id,
+            metadata=metadata,
+            sampled=sampled,
+            deadline=deadline,
+            traceparent=traceparent,
+            tracestate=tracestate,
+        )
+
     # -- forking --------------------------------------------------------------
 
     def fork(self) -> FlowContext:
@@ -56,6 +128,10 @@ class FlowContext:
         return FlowContext(
             correlation_id=self.correlation_id,
             metadata=copy.deepcopy(self._metadata),
+            sampled=self.sampled,
+            deadline=self.deadline,
+            traceparent=self.traceparent,
+            tracestate=self.tracestate,
         )
 
 
@@ -6,6 +6,8 @@ from pathlib import Path
 from typing import Literal, overload
 
 from penstock._registry import _registry
+from penstock.caching import report
+from penstock.histograms import snapshot
 
 
 @overload
@@ -14,6 +16,8 @@ def generate_dag(
     *,
     format: Literal["mermaid"] = ...,
     output: None = ...,
+    cache_stats: bool = ...,
+    latency: bool = ...,
 ) -> str: ...
 
 
@@ -23,6 +27,8 @@ def generate_dag(
     *,
     format: Literal["mermaid"] = ...,
     output: str,
+    cache_stats: bool = ...,
+    latency: bool = ...,
 ) -> None: ...
 
 
@@ -31,6 +37,8 @@ def generate_dag(
     *,
     format: Literal["mermaid"] = "mermaid",
     output: str | None = None,
+    cache_stats: bool = False,
+    latency: bool = False,
 ) -> str | None:
     """Generate a DAG diagram for a registered flow.
 
@@ -44,6 +52,12 @@ def generate_dag(
         Optional file path. When provided the diagram is written to this path
         and the function returns ``None``. Otherwise the diagram string is
         returned.
+    cache_stats:
+        Label steps declared with ``cache=`` with their hit rate so far
+        (see :mod:`penstock.caching`).
+    latency:
+        Label steps with their median and p99 latency so far (see
+        :mod:`penstock.histograms`).
 
     Raises
     ------
@@ -65,15 +79,40 @@ def generate_dag(
         for predecessor in step.after
     ]
 
+    # Edges seen at runtime, e.g. Celery tasks a step fanned out, are dotted.
+    runtime_edges = sorted(_registry.get_runtime_edges(flow_name) - set(edges))
+
     # Sort for deterministic output.
     edges.sort()
 
-    if not edges:
+    if not edges and not runtime_edges:
         # Flow with steps but no edges — list each step as a standalone node.
         lines.extend(f"    {name}" for name in sorted(info.steps))
     else:
         for src, dst in edges:
             lines.append(f"    {src} --> {dst}")
+        for src, dst in runtime_edges:
+            lines.append(f"    {src} -.-> {dst}")
+
+    labels: dict[str, list[str]] = {}
+    if cache_stats:
+        for (flow, name), stats in sorted(report().items()):
+            calls = stats.hits + stats.misses + stats.shared
+            if flow == flow_name and name in info.steps and calls:
+                labels.setdefault(name, []).append(
+                    f"cache {stats.hit_rate:.0%} hit ({calls - stats.misses}/{calls})"
+                )
+
+    if latency:
+        for (flow, name), histogram in sorted(snapshot().items()):
+            if flow == flow_name and name in info.steps and histogram.count:
+                labels.setdefault(name, []).append(
+                    f"p50 {histogram.percentile(50):.3g}ms, "
+                    f"p99 {histogram.percentile(99):.3g}ms"
+                )
+
+    for name, parts in sorted(labels.items()):
+        lines.append(f'    {name}["{"<br/>".join([name, *parts])}"]')
 
     diagram = "\n".join(lines) + "\n"
 
@@ -2,20 +2,33 @@
 
 from __future__ import annotations
 
+import asyncio
 import functools
 import inspect
-from collections.abc import Callable
-from typing import Any
+import time
+from collections.abc import Callable, Hashable
+from typing import Any, Literal, overload
 
-from penstock._config import get_backend
+from penstock import concurrent, inflight, limits
+from penstock._coalesce import ABANDONED, Flight, Flights
+from penstock._config import get_backend, get_sampler
 from penstock._context import (
     FlowContext,
     _reset_context,
     _set_context,
     get_flow_context,
 )
+from penstock._instrument import (
+    await_step,
+    call_observers,
+    call_step,
+    resume_observers,
+)
 from penstock._registry import _registry
 from penstock._types import P, R, StepInfo
+from penstock.backends.base import TracingBackend
+from penstock.caching import StepCache
+from penstock.deadlines import DeadlineExceeded, OnDeadline, _combine, _expired
 
 # ---------------------------------------------------------------------------
 # after= normalization
@@ -40,6 +53,69 @@ def _normalize_after(
     return tuple(result)
 
 
+# ---------------------------------------------------------------------------
+# Flow start
+# ---------------------------------------------------------------------------
+
+
+def _start_flow(
+    flow_name: str, entrypoint: str, deadline: float | None = None
+) -> tuple[FlowContext, FlowContext | None]:
+    """Install a fresh FlowContext for an entrypoint call.
+
+    Inside an enclosing context (e.g. one restored by the web or Celery
+    integrations, or another flow's), the new one is a fork of it: the
+    correlation ID, trace context, metadata, sampling decision and deadline
+    carry over, so the flow's spans join the request or task that started
+    it.  Otherwise the sampling decision is made here by the configured
+    sampler.  *deadline* seconds from now can only bring the deadline
+    forward.  Raises :class:`~penstock.deadlines.DeadlineExceeded` if it has
+    already passed, and :class:`~penstock.inflight.FlowRejected` if the flow
+    is at its in-flight limit.  Returns the new context and the enclosing
+    one, if any, for :func:`_end_flow` to put back.
+    """
+    outer = get_flow_context()
+    ctx = outer.fork() if outer is not None else FlowContext()
+    if ctx.sampled is None:
+        sampler = get_sampler()
+        ctx.sampled = sampler.should_sample(flow_name) if sampler is not None else True
+    ctx.deadline = _combine(ctx.deadline, deadline, time.time())
+    if ctx.deadline is not None:
+        _expired(ctx, flow_name, "raise")
+    if inflight.is_enabled():
+        inflight._admit(flow_name, entrypoint, ctx)
+    _set_context(ctx)
+    return ctx, outer
+
+
+def _end_flow(ctx: FlowContext, outer: FlowContext | None) -> None:
+    """Undo :func:`_start_flow` once the entrypoint call has finished."""
+    if inflight.is_enabled():
+        inflight._release(ctx)
+    if outer is not None:
+        _set_context(outer)
+    else:
+        _reset_context()
+
+
+def _enter_step(step_name: str, on_deadline: OnDeadline) -> FlowContext | None:
+    """Return the flow context for a step call, or ``None`` to skip the call.
+
+    Raises :class:`RuntimeError` outside a flow, and
+    :class:`~penstock.deadlines.DeadlineExceeded` past the flow's deadline
+    unless *on_deadline* is ``"skip"``.
+    """
+    ctx = get_flow_context()
+    if ctx is None:
+        raise RuntimeError(
+            f"@step '{step_name}' called outside of a flow context. "
+            "Ensure an @entrypoint has been called first."
+        )
+    if ctx.deadline is not None and _expired(ctx, step_name, on_deadline):
+        return None
+    return ctx
+
+
 # ---------------------------------------------------------------------------
 # @entrypoint("flow_name")
 # ---------------------------------------------------------------------------
@@ -50,14 +126,34 @@ def entrypoint(
     *,
     name: str | None = None,
     after: str | Callable[..., Any] | list[str | Callable[..., Any]] | None = None,
+    coalesce: Callable[..., Hashable] | None = None,
+    deadline: float | None = None,
 ) -> Callable[[Callable[P, R]], Callable[P, R]]:
     """Mark a callable as a flow entrypoint.
 
     Always called with parentheses: ``@entrypoint("my_flow")``.
+
+    With *coalesce*, concurrent calls for which ``coalesce(*args, **kwargs)``
+    returns equal keys share one execution and its result or exception.
+    Every caller still gets its own flow; the span of a caller that waited
+    has a ``coalesced_with`` attribute naming the correlation ID of the call
+    that ran, whose span has ``coalesced_followers``.
+
+    With *deadline*, the flow must finish within that many seconds, or
+    sooner if it inherited an earlier deadline; see :mod:`penstock.deadlines`.
     """
+    if deadline is not None and deadline <= 0:
+        raise ValueError(f"deadline must be positive, got {deadline!r}")
 
     def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
-        return _make_entrypoint(fn, flow_name=flow_name, name=name, after=after)
+        return _make_entrypoint(
+            fn,
+            flow_name=flow_name,
+            name=name,
+            after=after,
+            coalesce=coalesce,
+            deadline=deadline,
+        )
 
     return decorator
 
@@ -68,6 +164,8 @@ def _make_entrypoint(
     flow_name: str,
     name: str | None,
     after: str | Callable[..., Any] | list[str | Callable[..., Any]] | None,
+    coalesce: Callable[..., Hashable] | None = None,
+    deadline: float | None = None,
 ) -> Callable[..., Any]:
     step_name = name or fn.__name__
     after_tuple = _normalize_after(after)
@@ -77,33 +175,177 @@ def _make_entrypoint(
         flow_name=flow_name,
         after=after_tuple,
         is_entrypoint=True,
+        deadline=deadline,
+        coalesced=coalesce is not None,
     )
-    _registry.register(info)
+
+    if coalesce is not None:
+        return _make_coalescing_entrypoint(fn, info, coalesce, deadline)
 
     if inspect.iscoroutinefunction(fn):
 
         @functools.wraps(fn)
         async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
-            _set_context(FlowContext())
+            ctx, outer = _start_flow(flow_name, step_name, deadline)
+            try:
+                observers = resume_observers(flow_name, step_name, ctx)
+                if not ctx.sampled:
+                    return await await_step(fn(*args, **kwargs), observers, None)
+                backend = get_backend()
+                with backend.flow_span(step_name, flow_name):
+                    return await await_step(fn(*args, **kwargs), observers, backend)
+            finally:
+                _end_flow(ctx, outer)
+
+        _registry.register(info, async_wrapper)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        ctx, outer = _start_flow(flow_name, step_name, deadline)
+        try:
+            observers = call_observers(flow_name, step_name, ctx)
+            if not ctx.sampled:
+                return call_step(fn, args, kwargs, observers, None)
             backend = get_backend()
+            with backend.flow_span(step_name, flow_name):
+                return call_step(fn, args, kwargs, observers, backend)
+        finally:
+            _end_flow(ctx, outer)
+
+    _registry.register(info, wrapper)
+    return wrapper
+
+
+def _report_followers(backend: TracingBackend | None, flight: Flight) -> None:
+    if backend is not None and flight.followers:
+        backend.set_span_attributes(coalesced_followers=flight.followers)
+
+
+def _report_leader(backend: TracingBackend | None, flight: Flight) -> None:
+    if backend is not None:
+        backend.set_span_attributes(coalesced_with=flight.leader_id)
+
+
+def _gave_up(flight: Flight, ctx: FlowContext, name: str) -> DeadlineExceeded:
+    return DeadlineExceeded(
+        f"'{name}' stopped waiting for flow {flight.leader_id}: flow "
+        f"{ctx.correlation_id} reached its deadline"
+    )
+
+
+def _make_coalescing_entrypoint(
+    fn: Callable[..., Any],
+    info: StepInfo,
+    coalesce: Callable[..., Hashable],
+    deadline: float | None,
+) -> Callable[..., Any]:
+    step_name = info.name
+    flow_name = info.flow_name
+    flights = Flights()
+
+    if inspect.iscoroutinefunction(fn):
+
+        async def arun(
+            ctx: FlowContext,
+            args: tuple[Any, ...],
+            kwargs: dict[str, Any],
+            flight: Flight,
+            backend: TracingBackend | None,
+        ) -> Any:
+            observers = resume_observers(flow_name, step_name, ctx)
+            try:
+                return await await_step(fn(*args, **kwargs), observers, backend)
+            finally:
+                _report_followers(backend, flight)
+
+        async def acoalesced(
+            ctx: FlowContext,
+            args: tuple[Any, ...],
+            kwargs: dict[str, Any],
+            backend: TracingBackend | None,
+        ) -> Any:
+            key = coalesce(*args, **kwargs)
+            # Lead or follow a new flight if the leader was cancelled.
+            while True:
+                flight, leading = flights.join(key, ctx.correlation_id)
+                if leading:
+                    return await flights.alead(
+                        flight,
+                        key,
+                        functools.partial(arun, ctx, args, kwargs, flight, backend),
+                    )
+                _report_leader(backend, flight)
+                if not await flight.alanded(ctx.time_left()):
+                    raise _gave_up(flight, ctx, step_name)
+                result = flight.outcome()
+                if result is not ABANDONED:
+                    return result
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            ctx, outer = _start_flow(flow_name, step_name, deadline)
             try:
-                with backend.span(step_name, flow_name):
-                    return await fn(*args, **kwargs)
+                if not ctx.sampled:
+                    return await acoalesced(ctx, args, kwargs, None)
+                backend = get_backend()
+                with backend.flow_span(step_name, flow_name):
+                    return await acoalesced(ctx, args, kwargs, backend)
             finally:
-                _reset_context()
+                _end_flow(ctx, outer)
 
+        _registry.register(info, async_wrapper)
         return async_wrapper
 
+    def run(
+        ctx: FlowContext,
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+        flight: Flight,
+        backend: TracingBackend | None,
+    ) -> Any:
+        observers = call_observers(flow_name, step_name, ctx)
+        try:
+            return call_step(fn, args, kwargs, observers, backend)
+        finally:
+            _report_followers(backend, flight)
+
+    def coalesced(
+        ctx: FlowContext,
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+        backend: TracingBackend | None,
+    ) -> Any:
+        key = coalesce(*args, **kwargs)
+        # Lead or follow a new flight if the leader was interrupted.
+        while True:
+            flight, leading = flights.join(key, ctx.correlation_id)
+            if leading:
+                return flights.lead(
+                    flight,
+                    key,
+                    functools.partial(run, ctx, args, kwargs, flight, backend),
+                )
+            _report_leader(backend, flight)
+            if not flight.landed(ctx.time_left()):
+                raise _gave_up(flight, ctx, step_name)
+            result = flight.outcome()
+            if result is not ABANDONED:
+                return result
+
     @functools.wraps(fn)
     def wrapper(*args: Any, **kwargs: Any) -> Any:
-        _set_context(FlowContext())
-        backend = get_backend()
+        ctx, outer = _start_flow(flow_name, step_name, deadline)
         try:
-            with backend.span(step_name, flow_name):
-                return fn(*args, **kwargs)
+            if not ctx.sampled:
+                return coalesced(ctx, args, kwargs, None)
+            backend = get_backend()
+            with backend.flow_span(step_name, flow_name):
+                return coalesced(ctx, args, kwargs, backend)
         finally:
-            _reset_context()
+            _end_flow(ctx, outer)
 
+    _registry.register(info, wrapper)
     return wrapper
 
 
@@ -112,19 +354,90 @@ def _make_entrypoint(
 # ---------------------------------------------------------------------------
 
 
+@overload
+def step(
+    flow_name: str,
+    *,
+    name: str | None = ...,
+    after: str | Callable[..., Any] | list[str | Callable[..., Any]] | None = ...,
+    executor: Literal["process"] | None = ...,
+    offload: Literal[False] = ...,
+    cache: StepCache | None = ...,
+    max_concurrency: int | None = ...,
+    timeout: float | None = ...,
+    on_deadline: OnDeadline = ...,
+) -> Callable[[Callable[P, R]], Callable[P, R]]: ...
+
+
+@overload
+def step(
+    flow_name: str,
+    *,
+    name: str | None = ...,
+    after: str | Callable[..., Any] | list[str | Callable[..., Any]] | None = ...,
+    executor: Literal["process"] | None = ...,
+    offload: Literal[True],
+    cache: StepCache | None = ...,
+    max_concurrency: int | None = ...,
+    timeout: float | None = ...,
+    on_deadline: OnDeadline = ...,
+) -> Callable[[Callable[P, Any]], Callable[P, Any]]: ...
+
+
 def step(
     flow_name: str,
     *,
     name: str | None = None,
     after: str | Callable[..., Any] | list[str | Callable[..., Any]] | None = None,
-) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    executor: Literal["process"] | None = None,
+    offload: bool = False,
+    cache: StepCache | None = None,
+    max_concurrency: int | None = None,
+    timeout: float | None = None,
+    on_deadline: OnDeadline = "raise",
+) -> (
+    Callable[[Callable[P, R]], Callable[P, R]]
+    | Callable[[Callable[P, Any]], Callable[P, Any]]
+):
     """Mark a callable as a flow step.
 
     Always called with parentheses: ``@step("my_flow", after="validate")``.
+
+    With ``executor="process"``, a sync module-level function runs in the
+    process pool managed by :mod:`penstock.concurrent`, and its arguments
+    and result must be picklable.
+
+    With ``offload=True``, a sync function called on an event loop thread
+    returns an awaitable and runs in the thread pool managed by
+    :mod:`penstock.concurrent`.  Called anywhere else, it runs inline.  The
+    return type is therefore ``Any`` for type checkers.
+
+    With *cache*, results are memoized in the given
+    :class:`~penstock.caching.StepCache`, which can't be shared with other
+    steps or combined with ``executor="process"``.
+
+    *max_concurrency* caps how many calls of the step run at once, and
+    *timeout* is a deadline in seconds for each call; see
+    :mod:`penstock.limits`.
+
+    A step called after its flow's deadline raises
+    :class:`~penstock.deadlines.DeadlineExceeded` without running, or
+    returns ``None`` with ``on_deadline="skip"``.
     """
 
     def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
-        return _make_step(fn, flow_name=flow_name, name=name, after=after)
+        return _make_step(
+            fn,
+            flow_name=flow_name,
+            name=name,
+            after=after,
+            executor=executor,
+            offload=offload,
+            cache=cache,
+            max_concurrency=max_concurrency,
+            timeout=timeout,
+            on_deadline=on_deadline,
+        )
 
     return decorator
 
@@ -135,9 +448,39 @@ def _make_step(
     flow_name: str,
     name: str | None,
     after: str | Callable[..., Any] | list[str | Callable[..., Any]] | None,
+    executor: Literal["process"] | None = None,
+    offload: bool = False,
+    cache: StepCache | None = None,
+    max_concurrency: int | None = None,
+    timeout: float | None = None,
+    on_deadline: OnDeadline = "raise",
 ) -> Callable[..., Any]:
     step_name = name or fn.__name__
     after_tuple = _normalize_after(after)
+    if executor not in (None, "process"):
+        raise ValueError(f"Unknown executor: {executor!r}")
+    if on_deadline not in ("raise", "skip"):
+        raise ValueError(f"Unknown on_deadline: {on_deadline!r}")
+    if cache is not None:
+        if executor is not None:
+            raise ValueError(
+                f"@step '{step_name}': cache= can't be used with executor="
+            )
+        cache._bind(flow_name, step_name)
+    # The step body as run by the wrappers below: limited and cached if
+    # requested.
+    # Process steps are limited around the hop to the pool instead.
+    body = fn
+    hop = concurrent._run_in_process
+    if max_concurrency is not None or timeout is not None:
+        limiter = limits._bind(flow_name, step_name, max_concurrency, timeout)
+        if executor == "process":
+            hop = limiter.wrap(hop)
+        else:
+            body = limiter.wrap(fn)
+    # Cache hits and shared calls don't take a concurrency slot.
+    if cache is not None:
+        body = cache._wrap(body)
 
     info = StepInfo(
         name=step_name,
@@ -145,34 +488,74 @@ def _make_step(
         after=after_tuple,
         is_entrypoint=False,
     )
-    _registry.register(info)
 
     if inspect.iscoroutinefunction(fn):
+        if executor is not None or offload:
+            option = "executor=" if executor is not None else "offload="
+            raise TypeError(f"@step '{step_name}': {option} requires a sync function")
 
         @functools.wraps(fn)
         async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
-            ctx = get_flow_context()
+            ctx = _enter_step(step_name, on_deadline)
             if ctx is None:
-                raise RuntimeError(
-                    f"@step '{step_name}' called outside of a flow context. "
-                    "Ensure an @entrypoint has been called first."
-                )
+                return None
+            observers = resume_observers(flow_name, step_name, ctx)
+            if ctx.sampled is False:
+                return await await_step(body(*args, **kwargs), observers, None)
             backend = get_backend()
             with backend.span(step_name, flow_name):
-                return await fn(*args, **kwargs)
+                return await await_step(body(*args, **kwargs), observers, backend)
 
+        _registry.register(info, async_wrapper)
         return async_wrapper
 
     @functools.wraps(fn)
     def wrapper(*args: Any, **kwargs: Any) -> Any:
-        ctx = get_flow_context()
+        ctx = _enter_step(step_name, on_deadline)
         if ctx is None:
-            raise RuntimeError(
-                f"@step '{step_name}' called outside of a flow context. "
-                "Ensure an @entrypoint has been called first."
-            )
+            return None
+        observers = call_observers(flow_name, step_name, ctx)
+        if ctx.sampled is False:
+            return call_step(body, args, kwargs, observers, None)
         backend = get_backend()
         with backend.span(step_name, flow_name):
-            return fn(*args, **kwargs)
+            return call_step(body, args, kwargs, observers, backend)
 
-    return wrapper
+    sync_wrapper = wrapper
+    if executor == "process":
+
+        @functools.wraps(fn)
+        def process_wrapper(*args: Any, **kwargs: Any) -> Any:
+            ctx = _enter_step(step_name, on_deadline)
+            if ctx is None:
+                return None
+            if concurrent._in_worker:
+                # Already in a pool worker: don't hop to another process.
+                return wrapper(*args, **kwargs)
+            # Workers import the step by name, so send the decorated
+            # callable that is actually bound to that name.
+            observers = call_observers(flow_name, step_name, ctx)
+            job = (exported, ctx, args, kwargs)
+            if ctx.sampled is False:
+                return call_step(hop, (*job, None), {}, observers, None)
+            backend = get_backend()
+            with backend.span(step_name, flow_name):
+                return call_step(hop, (*job, backend), {}, observers, backend)
+
+        sync_wrapper = process_wrapper
+
+    exported = sync_wrapper
+    if offload:
+
+        @functools.wraps(fn)
+        def offload_wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return sync_wrapper(*args, **kwargs)
+            return concurrent._offload(loop, sync_wrapper, args, kwargs)
+
+        exported = offload_wrapper
+
+    _registry.register(info, exported)
+    return exported
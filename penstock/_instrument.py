@@ -0,0 +1,260 @@
+"""Per-step measurements taken by the decorators around the wrapped call."""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Coroutine, Generator
+from typing import TYPE_CHECKING, Any, Protocol
+
+from penstock._config import cpu_time_enabled
+from penstock.backends.base import TracingBackend
+
+if TYPE_CHECKING:
+    from penstock._context import FlowContext
+
+
+class ResumeObserver(Protocol):
+    """Notified around every stretch a step runs on its thread.
+
+    An async step runs one stretch per resumption of its coroutine; a sync
+    step runs a single stretch for the whole call.
+    """
+
+    def resumed(self) -> None:
+        """Called just before the step starts or resumes running."""
+
+    def suspended(self, run_ns: int) -> None:
+        """Called once it suspends or finishes, after running *run_ns*."""
+
+    def finished(self) -> dict[str, Any] | None:
+        """Called once the step has returned or raised.
+
+        May return attributes to attach to the step's span.
+        """
+
+
+class BaseObserver:
+    """:class:`ResumeObserver` that does nothing; override what you need."""
+
+    __slots__ = ()
+
+    def resumed(self) -> None:
+        pass
+
+    def suspended(self, run_ns: int) -> None:
+        pass
+
+    def finished(self) -> dict[str, Any] | None:
+        return None
+
+
+NULL_OBSERVER = BaseObserver()
+"""Shared observer for calls a factory is not interested in."""
+
+
+class WallTimer(BaseObserver):
+    """Observer that passes a step call's wall time, in ns, to *on_finished*.
+
+    Timed from construction, i.e. from the start of the call, to its end.
+    """
+
+    __slots__ = ("_on_finished", "_start")
+
+    def __init__(self, on_finished: Callable[[int], object]) -> None:
+        self._on_finished = on_finished
+        self._start = time.perf_counter_ns()
+
+    def finished(self) -> None:
+        self._on_finished(time.perf_counter_ns() - self._start)
+
+
+ObserverFactory = Callable[[str, str, "FlowContext"], ResumeObserver]
+
+# Factories installed by opt-in diagnostics (see penstock.watchdog and
+# penstock.profiling).  Each is called with (flow_name, step_name, ctx) once
+# per step call.
+_async_factories: list[ObserverFactory] = []
+_sync_factories: list[ObserverFactory] = []
+
+
+def add_observer_factory(
+    factory: ObserverFactory, *, include_sync: bool = False
+) -> None:
+    """Install *factory* for every subsequent async (and optionally sync) step."""
+    if factory not in _async_factories:
+        _async_factories.append(factory)
+    if include_sync and factory not in _sync_factories:
+        _sync_factories.append(factory)
+
+
+def remove_observer_factory(factory: ObserverFactory) -> None:
+    """Uninstall *factory*.  Does nothing if it is not installed."""
+    for factories in (_async_factories, _sync_factories):
+        if factory in factories:
+            factories.remove(factory)
+
+
+def resume_observers(
+    flow_name: str, step_name: str, ctx: FlowContext
+) -> tuple[ResumeObserver, ...]:
+    """Return the observers for one async step call (usually empty)."""
+    if not _async_factories:
+        return ()
+    return tuple(factory(flow_name, step_name, ctx) for factory in _async_factories)
+
+
+def call_observers(
+    flow_name: str, step_name: str, ctx: FlowContext
+) -> tuple[ResumeObserver, ...]:
+    """Return the observers for one sync step call (usually empty)."""
+    if not _sync_factories:
+        return ()
+    return tuple(factory(flow_name, step_name, ctx) for factory in _sync_factories)
+
+
+class InstrumentedCoroutine:
+    """Awaitable that drives a coroutine and times each stretch it runs.
+
+    Every resumption of the wrapped coroutine (from its start or from an
+    ``await`` that suspended it) is timed with ``perf_counter_ns`` and, when
+    *measure_cpu* is set, ``thread_time_ns``.  ``run_ns`` is the time the
+    coroutine spent running on the event loop and ``cpu_ns`` the CPU time it
+    used doing so.  *observers* are notified around every stretch, and the
+    attributes they return when the coroutine finishes are collected in
+    ``attributes``.
+    """
+
+    __slots__ = (
+        "_coro",
+        "_measure_cpu",
+        "_observers",
+        "attributes",
+        "cpu_ns",
+        "resumes",
+        "run_ns",
+    )
+
+    def __init__(
+        self,
+        coro: Coroutine[Any, Any, Any],
+        observers: tuple[ResumeObserver, ...] = (),
+        *,
+        measure_cpu: bool = True,
+    ) -> None:
+        self._coro = coro
+        self._observers = observers
+        self._measure_cpu = measure_cpu
+        self.run_ns = 0
+        self.cpu_ns = 0
+        self.resumes = 0
+        self.attributes: dict[str, Any] = {}
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        inner = self._coro.__await__()
+        observers = self._observers
+        measure_cpu = self._measure_cpu
+        value: Any = None
+        error: BaseException | None = None
+        try:
+            while True:
+                for observer in observers:
+                    observer.resumed()
+                cpu_start = time.thread_time_ns() if measure_cpu else 0
+                start = time.perf_counter_ns()
+                try:
+                    yielded = inner.send(value) if error is None else inner.throw(error)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    run_ns = time.perf_counter_ns() - start
+                    if measure_cpu:
+                        self.cpu_ns += time.thread_time_ns() - cpu_start
+                    self.run_ns += run_ns
+                    self.resumes += 1
+                    for observer in observers:
+                        observer.suspended(run_ns)
+                try:
+                    value = yield yielded
+                    error = None
+                except GeneratorExit:
+                    inner.close()
+                    raise
+                except BaseException as exc:
+                    value = None
+                    error = exc
+        finally:
+            self.attributes = _finish(observers)
+
+
+def _finish(observers: tuple[ResumeObserver, ...]) -> dict[str, Any]:
+    attributes: dict[str, Any] = {}
+    for observer in observers:
+        extra = observer.finished()
+        if extra:
+            attributes.update(extra)
+    return attributes
+
+
+def call_step(
+    fn: Callable[..., Any],
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+    observers: tuple[ResumeObserver, ...],
+    backend: TracingBackend | None,
+) -> Any:
+    """Call a sync step as a single stretch reported to *observers*.
+
+    *backend* is the backend whose span is open around the call, or ``None``
+    for an unsampled flow.  When set, observer attributes and (if enabled)
+    the thread CPU time are reported on the span.
+    """
+    measure_cpu = backend is not None and cpu_time_enabled()
+    if not observers and not measure_cpu:
+        return fn(*args, **kwargs)
+    for observer in observers:
+        observer.resumed()
+    cpu_start = time.thread_time_ns() if measure_cpu else 0
+    start = time.perf_counter_ns()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        run_ns = time.perf_counter_ns() - start
+        attributes: dict[str, Any] = {}
+        if measure_cpu:
+            attributes["cpu_ns"] = time.thread_time_ns() - cpu_start
+        for observer in observers:
+            observer.suspended(run_ns)
+        attributes.update(_finish(observers))
+        if backend is not None and attributes:
+            backend.set_span_attributes(**attributes)
+
+
+async def await_step(
+    coro: Coroutine[Any, Any, Any],
+    observers: tuple[ResumeObserver, ...],
+    backend: TracingBackend | None,
+) -> Any:
+    """Await an async step, driving it only when something needs measuring.
+
+    *backend* is as for :func:`call_step`.  With CPU timing enabled, the
+    span also gets ``run_ns`` and ``suspended_ns``.
+    """
+    measure_cpu = backend is not None and cpu_time_enabled()
+    if not observers and not measure_cpu:
+        return await coro
+    run = InstrumentedCoroutine(coro, observers, measure_cpu=measure_cpu)
+    start = time.perf_counter_ns()
+    try:
+        return await run
+    finally:
+        if backend is not None:
+            attributes = run.attributes
+            if measure_cpu:
+                attributes = {
+                    "cpu_ns": run.cpu_ns,
+                    "run_ns": run.run_ns,
+                    "suspended_ns": time.perf_counter_ns() - start - run.run_ns,
+                    **attributes,
+                }
+            if attributes:
+                backend.set_span_attributes(**attributes)
@@ -3,6 +3,8 @@
 from __future__ import annotations
 
 import threading
+from collections.abc import Callable, Iterable
+from typing import Any
 
 from penstock._types import FlowInfo, StepInfo
 
@@ -13,9 +15,15 @@ class FlowRegistry:
     def __init__(self) -> None:
         self._lock = threading.Lock()
         self._steps: dict[str, dict[str, StepInfo]] = {}
+        self._callables: dict[tuple[str, str], Callable[..., Any]] = {}
+        self._runtime_edges: dict[str, set[tuple[str, str]]] = {}
 
-    def register(self, info: StepInfo) -> None:
-        """Register a step. Idempotent for identical info, raises on conflict."""
+    def register(self, info: StepInfo, fn: Callable[..., Any] | None = None) -> None:
+        """Register a step. Idempotent for identical info, raises on conflict.
+
+        *fn* is the decorated callable, kept for :func:`~penstock.run_flow`.
+        Re-registering identical info replaces it.
+        """
         with self._lock:
             flow_steps = self._steps.setdefault(info.flow_name, {})
             existing = flow_steps.get(info.name)
@@ -25,8 +33,10 @@ class FlowRegistry:
                         f"Conflicting registration for step '{info.name}' "
                         f"in flow '{info.flow_name}'"
                     )
-                return
-            flow_steps[info.name] = info
+            else:
+                flow_steps[info.name] = info
+            if fn is not None:
+                self._callables[info.flow_name, info.name] = fn
 
     def get_flow(self, name: str) -> FlowInfo:
         """Return resolved FlowInfo. Raises KeyError if flow not found."""
@@ -37,6 +47,27 @@ class FlowRegistry:
             entrypoints = frozenset(s.name for s in steps.values() if s.is_entrypoint)
             return FlowInfo(name=name, steps=dict(steps), entrypoints=entrypoints)
 
+    def get_callable(self, flow_name: str, step_name: str) -> Callable[..., Any]:
+        """Return the decorated callable of a step. Raises KeyError if unknown."""
+        with self._lock:
+            fn = self._callables.get((flow_name, step_name))
+            if fn is None:
+                raise KeyError(
+                    f"No callable registered for step '{step_name}' "
+                    f"in flow '{flow_name}'"
+                )
+            return fn
+
+    def record_edges(self, flow_name: str, edges: Iterable[tuple[str, str]]) -> None:
+        """Add edges seen at runtime rather than declared, e.g. task fan-out."""
+        with self._lock:
+            self._runtime_edges.setdefault(flow_name, set()).update(edges)
+
+    def get_runtime_edges(self, flow_name: str) -> set[tuple[str, str]]:
+        """Return the edges recorded with :meth:`record_edges` for a flow."""
+        with self._lock:
+            return set(self._runtime_edges.get(flow_name, ()))
+
     def get_all_flow_names(self) -> list[str]:
         """Return names of all registered flows."""
         with self._lock:
@@ -65,6 +96,8 @@ class FlowRegistry:
         """Remove all registered flows. Intended for testing."""
         with self._lock:
             self._steps.clear()
+            self._callables.clear()
+            self._runtime_edges.clear()
 
 
 _registry = FlowRegistry()
@@ -0,0 +1,201 @@
+"""Run a registered flow as a DAG, executing independent steps concurrently."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import traceback
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from graphlib import TopologicalSorter
+from typing import TYPE_CHECKING, Any
+
+from penstock._config import get_backend
+from penstock._context import FlowContext
+from penstock._decorators import _end_flow, _start_flow
+from penstock._instrument import (
+    ResumeObserver,
+    await_step,
+    call_observers,
+    call_step,
+    resume_observers,
+)
+from penstock._registry import _registry
+from penstock.concurrent import carry_context
+
+if TYPE_CHECKING:
+    from penstock.backends.base import TracingBackend
+
+
+@dataclass(frozen=True, slots=True)
+class _Plan:
+    flow_name: str
+    entrypoint: str
+    order: tuple[str, ...]
+    """Steps reachable from the entrypoint, predecessors first."""
+    inputs: dict[str, tuple[str, ...]]
+    """Step name -> the predecessors whose results it receives, in ``after`` order."""
+    deadline: float | None
+    """The entrypoint's ``deadline=``."""
+
+
+def run_flow(
+    flow_name: str,
+    *inputs: Any,
+    entrypoint: str | None = None,
+    max_workers: int | None = None,
+) -> dict[str, Any]:
+    """Run *flow_name* from its entrypoint, executing independent steps concurrently.
+
+    Synchronous wrapper around :func:`arun_flow`; it cannot be called from a
+    running event loop.
+    """
+    return asyncio.run(
+        arun_flow(flow_name, *inputs, entrypoint=entrypoint, max_workers=max_workers)
+    )
+
+
+async def arun_flow(
+    flow_name: str,
+    *inputs: Any,
+    entrypoint: str | None = None,
+    max_workers: int | None = None,
+) -> dict[str, Any]:
+    """Run *flow_name* as a DAG and return every step's result by step name.
+
+    The entrypoint is called with *inputs*.  Every step reachable from it
+    through ``after`` edges then runs as soon as its predecessors have
+    finished, receiving their results as positional arguments in ``after``
+    order.  Predecessors that are not reachable (e.g. alternative
+    entrypoints) are ignored.  Async steps run as tasks on the current loop
+    and sync steps in a thread pool of *max_workers* threads (the loop's
+    default executor when ``None``).
+
+    The whole run is one flow: a single correlation ID, with the entrypoint's
+    span enclosing the step spans, and the entrypoint's ``deadline=``
+    applies to it.  If a step raises, the steps still running are cancelled
+    and its exception propagates; when several fail together, the first
+    carries the others' tracebacks as notes.
+
+    Parameters
+    ----------
+    entrypoint:
+        The entrypoint to start from.  Required when the flow has several.
+
+    Raises
+    ------
+    KeyError
+        If the flow or the entrypoint is not registered.
+    ValueError
+        If the entrypoint is ambiguous or coalesces calls, or the reachable
+        steps form a cycle.
+    """
+    plan = _plan(flow_name, entrypoint)
+    pool = ThreadPoolExecutor(max_workers) if max_workers is not None else None
+    ctx, outer = _start_flow(flow_name, plan.entrypoint, plan.deadline)
+    try:
+        # The run itself stands in for the entrypoint wrapper; call the
+        # undecorated function inside it.
+        wrapper = _registry.get_callable(flow_name, plan.entrypoint)
+        fn: Callable[..., Any] = wrapper.__wrapped__  # type: ignore[attr-defined]
+        observers = _entry_observers(fn, flow_name, plan.entrypoint, ctx)
+        if not ctx.sampled:
+            return await _execute(plan, fn, inputs, observers, None, pool)
+        backend = get_backend()
+        with backend.flow_span(plan.entrypoint, flow_name):
+            return await _execute(plan, fn, inputs, observers, backend, pool)
+    finally:
+        _end_flow(ctx, outer)
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+
+def _plan(flow_name: str, entrypoint: str | None) -> _Plan:
+    info = _registry.get_flow(flow_name)
+    if entrypoint is None:
+        if len(info.entrypoints) != 1:
+            raise ValueError(
+                f"Flow '{flow_name}' has entrypoints "
+                f"{sorted(info.entrypoints)}; pass entrypoint= to choose one"
+            )
+        (entrypoint,) = info.entrypoints
+    elif entrypoint not in info.entrypoints:
+        raise KeyError(f"Flow '{flow_name}' has no entrypoint '{entrypoint}'")
+    if info.steps[entrypoint].coalesced:
+        # Sharing the entrypoint call wouldn't share the steps after it.
+        raise ValueError(
+            f"Entrypoint '{entrypoint}' of flow '{flow_name}' coalesces calls; "
+            "call it directly instead of through run_flow"
+        )
+
+    successors: dict[str, list[str]] = {}
+    for s in info.steps.values():
+        for ref in s.after:
+            successors.setdefault(ref, []).append(s.name)
+    reachable = {entrypoint}
+    pending = [entrypoint]
+    while pending:
+        for name in successors.get(pending.pop(), ()):
+            if name not in reachable:
+                reachable.add(name)
+                pending.append(name)
+
+    inputs = {
+        name: tuple(ref for ref in info.steps[name].after if ref in reachable)
+        for name in reachable
+    }
+    inputs[entrypoint] = ()
+    try:
+        order = tuple(TopologicalSorter(inputs).static_order())
+    except ValueError as exc:  # graphlib.CycleError
+        raise ValueError(f"Flow '{flow_name}' has a cycle: {exc.args[1]}") from None
+    return _Plan(flow_name, entrypoint, order, inputs, info.steps[entrypoint].deadline)
+
+
+def _entry_observers(
+    fn: Callable[..., Any], flow_name: str, step_name: str, ctx: FlowContext
+) -> tuple[ResumeObserver, ...]:
+    if inspect.iscoroutinefunction(fn):
+        return resume_observers(flow_name, step_name, ctx)
+    return call_observers(flow_name, step_name, ctx)
+
+
+async def _execute(
+    plan: _Plan,
+    entry_fn: Callable[..., Any],
+    inputs: tuple[Any, ...],
+    observers: tuple[ResumeObserver, ...],
+    backend: TracingBackend | None,
+    pool: ThreadPoolExecutor | None,
+) -> dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    tasks: dict[str, asyncio.Task[Any]] = {}
+
+    async def run(name: str) -> Any:
+        args = [await tasks[ref] for ref in plan.inputs[name]]
+        if name == plan.entrypoint:
+            if inspect.iscoroutinefunction(entry_fn):
+                return await await_step(entry_fn(*inputs), observers, backend)
+            call = functools.partial(
+                call_step, entry_fn, inputs, {}, observers, backend
+            )
+        else:
+            fn = _registry.get_callable(plan.flow_name, name)
+            if inspect.iscoroutinefunction(fn):
+                return await fn(*args)
+            call = functools.partial(fn, *args)
+        return await loop.run_in_executor(pool, carry_context(call))
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            for name in plan.order:
+                tasks[name] = group.create_task(run(name), name=name)
+    except BaseExceptionGroup as group_error:
+        first, *others = group_error.exceptions
+        for other in others:
+            trace = "".join(traceback.format_exception(other)).rstrip()
+            first.add_note(f"\nAnother step failed at the same time:\n{trace}")
+        raise first from None
+    return {name: task.result() for name, task in tasks.items()}
@@ -17,6 +17,10 @@ class StepInfo:
     flow_name: str
     after: tuple[str, ...]
     is_entrypoint: bool
+    deadline: float | None = None
+    """Seconds an entrypoint's flow has to finish, from ``@entrypoint(deadline=)``."""
+    coalesced: bool = False
+    """Whether the entrypoint shares concurrent calls (``@entrypoint(coalesce=)``)."""
 
 
 @dataclass(frozen=True, slots=True)
@@ -16,6 +16,37 @@ class TracingBackend(ABC):
     def span(self, step_name: str, flow_name: str, **attrs: Any) -> Iterator[None]:
         """Open a tracing span for the duration of a step."""
 
+    @contextmanager
+    def flow_span(self, step_name: str, flow_name: str, **attrs: Any) -> Iterator[None]:
+        """Open the root span for an ``@entrypoint`` call.
+
+        Defaults to :meth:`span`.  Backends override this to act on a flow as
+        a whole, e.g. to buffer or summarise the spans of its steps.
+        """
+        with self.span(step_name, flow_name, **attrs):
+            yield
+
+    def set_span_attributes(self, **attrs: Any) -> None:  # noqa: B027
+        """Attach attributes to the innermost open span.
+
+        Used by the decorators to report measurements that are only known
+        once the step has run.  The default implementation discards them.
+        """
+
+    def record_span(  # noqa: B027
+        self,
+        step_name: str,
+        flow_name: str,
+        start_time_ns: int,
+        duration_ns: int,
+        **attrs: Any,
+    ) -> None:
+        """Report a span that already finished elsewhere, e.g. in a worker process.
+
+        *start_time_ns* is a ``time.time_ns()`` timestamp.  The span belongs
+        to the innermost open span.  The default implementation discards it.
+        """
+
     @abstractmethod
     def get_correlation_id(self) -> str:
         """Return the current correlation ID."""
@@ -3,9 +3,12 @@
 from __future__ import annotations
 
 import logging
+import threading
 import time
+from array import array
 from collections.abc import Iterator
 from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Any
 
 from penstock._context import _get_or_create_context, current_flow_id
@@ -13,32 +16,245 @@ from penstock.backends.base import TracingBackend
 
 logger = logging.getLogger("penstock")
 
+# Attributes reported for the innermost open span via set_span_attributes().
+_span_attrs: ContextVar[dict[str, Any] | None] = ContextVar(
+    "penstock_span_attrs", default=None
+)
+
+
+class StepTimings:
+    """Per-flow record of step timings, preallocated for the expected steps.
+
+    Holds one ``(name, offset, duration)`` entry per finished step, where the
+    offset is measured from the start of the flow.  Timestamps are
+    ``perf_counter_ns`` values.  Storage grows by doubling if a flow runs more
+    steps than its initial *capacity*.
+    """
+
+    __slots__ = ("_lock", "count", "names", "origin", "times")
+
+    def __init__(self, origin: int, capacity: int = 16) -> None:
+        self.origin = origin
+        self.count = 0
+        self.names: list[str] = [""] * capacity
+        # Flat (offset, duration) pairs in nanoseconds.
+        self.times = array("q", bytes(16 * capacity))
+        self._lock = threading.Lock()
+
+    def record(self, name: str, start: int, end: int) -> None:
+        """Append a finished step that ran from *start* to *end*."""
+        with self._lock:
+            i = self.count
+            if i == len(self.names):
+                grow = max(i, 1)
+                self.names.extend([""] * grow)
+                self.times.extend(array("q", bytes(16 * grow)))
+            self.names[i] = name
+            self.times[2 * i] = start - self.origin
+            self.times[2 * i + 1] = end - start
+            self.count = i + 1
+
+    def encode(self) -> str:
+        """Encode as ``step:offset_ms:duration_ms`` entries joined by ``;``."""
+        times = self.times
+        return ";".join(
+            f"{self.names[i]}:{times[2 * i] / 1e6:.3f}:{times[2 * i + 1] / 1e6:.3f}"
+            for i in range(self.count)
+        )
+
 
 class LoggingBackend(TracingBackend):
-    """Emits structured log records for each span start/end."""
+    """Emits structured log records for each span start/end.
+
+    Durations are measured with ``perf_counter_ns`` and reported as both
+    ``duration_ns`` and ``duration_ms``.  Attributes passed to
+    :meth:`set_span_attributes` while a step runs are added to its
+    ``step.end`` record.  Spans passed to :meth:`record_span` are logged as
+    a ``step.start``/``step.end`` pair when they are reported.
+
+    With *summary* set, steps are not logged individually.  Their timings are
+    accumulated in a :class:`StepTimings` on the flow's
+    :class:`~penstock._context.FlowContext` and the entrypoint logs a single
+    ``flow.summary`` record when it finishes.
+
+    With *slow_flow_ms* set, the records of a flow's steps are held in a
+    buffer on its :class:`~penstock._context.FlowContext` (records beyond
+    *buffer_size* are dropped) instead of being logged immediately.  When the
+    entrypoint finishes, the buffer is flushed only if the flow took longer
+    than *slow_flow_ms* or raised; otherwise a single ``flow.summary`` record
+    is logged in place of the step records.
+    """
+
+    def __init__(
+        self,
+        *,
+        summary: bool = False,
+        slow_flow_ms: float | None = None,
+        buffer_size: int = 64,
+    ) -> None:
+        self.summary = summary
+        self.slow_flow_ms = slow_flow_ms
+        self.buffer_size = buffer_size
+        # Largest step count seen per flow, used to size StepTimings.
+        self._capacity: dict[str, int] = {}
 
     @contextmanager
     def span(self, step_name: str, flow_name: str, **attrs: Any) -> Iterator[None]:
-        correlation_id = self.get_correlation_id()
+        ctx = _get_or_create_context()
+        timings = ctx._step_timings
+        if timings is None:
+            extra = {
+                "flow": flow_name,
+                "step": step_name,
+                "correlation_id": ctx.correlation_id,
+                **attrs,
+            }
+            logger.info("step.start", extra=extra)
+            late_attrs: dict[str, Any] = {}
+            token = _span_attrs.set(late_attrs)
+            start = time.perf_counter_ns()
+            try:
+                yield
+            finally:
+                duration_ns = time.perf_counter_ns() - start
+                _span_attrs.reset(token)
+                logger.info(
+                    "step.end",
+                    extra={**extra, **late_attrs, **_durations(duration_ns)},
+                )
+            return
+
+        buffer = ctx._span_buffer
+        extra = {}
+        if buffer is not None:
+            extra = {
+                "flow": flow_name,
+                "step": step_name,
+                "correlation_id": ctx.correlation_id,
+                **attrs,
+            }
+            self._buffer(buffer, "step.start", extra)
+        late_attrs = {}
+        token = _span_attrs.set(late_attrs)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            _span_attrs.reset(token)
+            timings.record(step_name, start, end)
+            if buffer is not None:
+                self._buffer(
+                    buffer,
+                    "step.end",
+                    {**extra, **late_attrs, **_durations(end - start)},
+                )
+
+    @contextmanager
+    def flow_span(self, step_name: str, flow_name: str, **attrs: Any) -> Iterator[None]:
+        if not self.summary and self.slow_flow_ms is None:
+            with self.span(step_name, flow_name, **attrs):
+                yield
+            return
+
+        ctx = _get_or_create_context()
+        buffer: list[tuple[str, dict[str, Any]]] | None = None
+        if self.slow_flow_ms is not None:
+            buffer = []
         extra = {
             "flow": flow_name,
             "step": step_name,
-            "correlation_id": correlation_id,
+            "correlation_id": ctx.correlation_id,
             **attrs,
         }
-        logger.info("step.start", extra=extra)
-        start = time.monotonic()
+        failed = False
+        late_attrs: dict[str, Any] = {}
+        token = _span_attrs.set(late_attrs)
+        start = time.perf_counter_ns()
+        timings = StepTimings(start, self._capacity.get(flow_name, 16))
+        ctx._span_buffer = buffer
+        ctx._step_timings = timings
         try:
             yield
+        except BaseException:
+            failed = True
+            raise
         finally:
-            duration_ms = (time.monotonic() - start) * 1000
-            logger.info(
-                "step.end",
-                extra={**extra, "duration_ms": duration_ms},
-            )
+            duration_ns = time.perf_counter_ns() - start
+            duration_ms = duration_ns / 1e6
+            _span_attrs.reset(token)
+            end_extra = {**extra, **late_attrs, **_durations(duration_ns)}
+            ctx._span_buffer = None
+            ctx._step_timings = None
+            if timings.count > self._capacity.get(flow_name, 0):
+                self._capacity[flow_name] = timings.count
+            slow = self.slow_flow_ms is not None and duration_ms > self.slow_flow_ms
+            if buffer is not None and (failed or slow):
+                logger.info("step.start", extra=extra)
+                for msg, record_extra in buffer:
+                    logger.info(msg, extra=record_extra)
+                logger.info("step.end", extra=end_extra)
+            else:
+                logger.info(
+                    "flow.summary",
+                    extra={
+                        **end_extra,
+                        "failed": failed,
+                        "step_count": timings.count,
+                        "steps": timings.encode(),
+                    },
+                )
+
+    def record_span(
+        self,
+        step_name: str,
+        flow_name: str,
+        start_time_ns: int,  # noqa: ARG002
+        duration_ns: int,
+        **attrs: Any,
+    ) -> None:
+        ctx = _get_or_create_context()
+        extra = {
+            "flow": flow_name,
+            "step": step_name,
+            "correlation_id": ctx.correlation_id,
+            **attrs,
+        }
+        end_extra = {**extra, **_durations(duration_ns)}
+        timings = ctx._step_timings
+        if timings is None:
+            logger.info("step.start", extra=extra)
+            logger.info("step.end", extra=end_extra)
+            return
+        # Remote spans are reported right after they end; place them on the
+        # local clock accordingly.
+        end = time.perf_counter_ns()
+        timings.record(step_name, end - duration_ns, end)
+        buffer = ctx._span_buffer
+        if buffer is not None:
+            self._buffer(buffer, "step.start", extra)
+            self._buffer(buffer, "step.end", end_extra)
+
+    def set_span_attributes(self, **attrs: Any) -> None:
+        late_attrs = _span_attrs.get()
+        if late_attrs is not None:
+            late_attrs.update(attrs)
+
+    def _buffer(
+        self,
+        buffer: list[tuple[str, dict[str, Any]]],
+        msg: str,
+        extra: dict[str, Any],
+    ) -> None:
+        if len(buffer) < self.buffer_size:
+            buffer.append((msg, extra))
 
     def get_correlation_id(self) -> str:
         cid = current_flow_id()
         if cid is not None:
             return cid
         return _get_or_create_context().correlation_id
+
+
+def _durations(duration_ns: int) -> dict[str, Any]:
+    return {"duration_ns": duration_ns, "duration_ms": duration_ns / 1e6}
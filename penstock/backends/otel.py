@@ -22,6 +22,10 @@ except ImportError:  # pragma: no cover
 class OTelBackend(TracingBackend):
     """Emits real OpenTelemetry spans for each flow step.
 
+    Attributes reported through :meth:`set_span_attributes` (such as
+    ``cpu_ns``) are set on the current span with a ``penstock.`` prefix.
+    Spans passed to :meth:`record_span` keep their original timestamps.
+
     Requires ``opentelemetry-api`` to be installed.  Raises
     :class:`RuntimeError` at construction time if the package is missing.
     """
@@ -42,6 +46,26 @@ class OTelBackend(TracingBackend):
         ):
             yield
 
+    def set_span_attributes(self, **attrs: Any) -> None:
+        trace.get_current_span().set_attributes(
+            {f"penstock.{key}": value for key, value in attrs.items()}
+        )
+
+    def record_span(
+        self,
+        step_name: str,
+        flow_name: str,
+        start_time_ns: int,
+        duration_ns: int,
+        **attrs: Any,
+    ) -> None:
+        span = self._tracer.start_span(
+            step_name,
+            start_time=start_time_ns,
+            attributes={"penstock.flow": flow_name, **attrs},
+        )
+        span.end(end_time=start_time_ns + duration_ns)
+
     def get_correlation_id(self) -> str:
         span = trace.get_current_span()
         ctx = span.get_span_context()
@@ -0,0 +1,247 @@
+"""Result memoization for steps.
+
+Pass a :class:`StepCache` to ``@step`` to keep the results of a pure step::
+
+    from penstock.caching import StepCache
+
+    @step("pricing", after="validate", cache=StepCache(maxsize=1024, ttl=60))
+    def list_price(sku: str) -> Decimal: ...
+
+Entries are evicted least-recently-used beyond *maxsize* and expire *ttl*
+seconds after they were stored.  Concurrent calls with the same key, from
+threads or asyncio tasks, share one execution instead of all missing.
+Exceptions are never cached.
+
+Each call's span gets a ``cache`` attribute of ``"hit"``, ``"miss"`` or
+``"shared"`` (waited on an identical call in flight), and :func:`report`
+aggregates them per ``(flow, step)``.  ``generate_dag(..., cache_stats=True)``
+adds the hit rates to the diagram.
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+from penstock._coalesce import ABANDONED, Flights
+from penstock._config import get_backend
+from penstock._context import FlowContext, get_flow_context
+
+
+@dataclass(slots=True)
+class CacheStats:
+    """Counters of one cached step."""
+
+    hits: int = 0
+    misses: int = 0
+    shared: int = 0
+    """Calls that waited for an identical call already running."""
+    evictions: int = 0
+    """Entries dropped to stay within ``maxsize`` (expired ones are not counted)."""
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of calls that didn't run the step themselves."""
+        calls = self.hits + self.misses + self.shared
+        return (self.hits + self.shared) / calls if calls else 0.0
+
+
+_MISSING = object()
+_lock = threading.Lock()
+_caches: dict[tuple[str, str], StepCache] = {}
+
+
+class StepCache:
+    """Bounded LRU cache with optional TTL for the results of one step.
+
+    *key* computes the cache key from the step's arguments; by default the
+    positional and keyword arguments themselves, which must be hashable.
+    With *per_flow*, entries are only reused within the same flow (same
+    correlation ID).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        ttl: float | None = None,
+        *,
+        key: Callable[..., Hashable] | None = None,
+        per_flow: bool = False,
+    ) -> None:
+        if maxsize <= 0:
+            raise ValueError(f"maxsize must be positive, got {maxsize!r}")
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f"ttl must be positive, got {ttl!r}")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.key = key
+        self.per_flow = per_flow
+        self.owner: tuple[str, str] | None = None
+        self._lock = threading.Lock()
+        # key -> (expires_at, value); most recently used last.
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._flights = Flights()
+        self._stats = CacheStats()
+
+    def stats(self) -> CacheStats:
+        """Return a copy of the counters."""
+        with self._lock:
+            s = self._stats
+            return CacheStats(s.hits, s.misses, s.shared, s.evictions)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # -- used by @step ---------------------------------------------------------
+
+    def _bind(self, flow_name: str, step_name: str) -> None:
+        owner = (flow_name, step_name)
+        with _lock:
+            if self.owner is not None and self.owner != owner:
+                raise ValueError(
+                    f"StepCache already used by step '{self.owner[1]}' "
+                    f"in flow '{self.owner[0]}'"
+                )
+            self.owner = owner
+            _caches[owner] = self
+
+    def _wrap(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Return step body *fn* memoized by this cache, annotating the span."""
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_cached(*args: Any, **kwargs: Any) -> Any:
+                ctx = get_flow_context()
+                assert ctx is not None
+                result, outcome = await self._acall(
+                    ctx, args, kwargs, lambda: fn(*args, **kwargs)
+                )
+                if ctx.sampled is not False:
+                    get_backend().set_span_attributes(cache=outcome)
+                return result
+
+            return async_cached
+
+        @functools.wraps(fn)
+        def cached(*args: Any, **kwargs: Any) -> Any:
+            ctx = get_flow_context()
+            assert ctx is not None
+            result, outcome = self._call(ctx, args, kwargs, lambda: fn(*args, **kwargs))
+            if ctx.sampled is not False:
+                get_backend().set_span_attributes(cache=outcome)
+            return result
+
+        return cached
+
+    def _make_key(
+        self, ctx: FlowContext, args: tuple[Any, ...], kwargs: dict[str, Any]
+    ) -> Hashable:
+        if self.key is not None:
+            key = self.key(*args, **kwargs)
+        elif kwargs:
+            key = (args, tuple(sorted(kwargs.items())))
+        else:
+            key = args
+        if self.per_flow:
+            return (ctx.correlation_id, key)
+        return key
+
+    def _lookup(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.ttl is None or entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            return _MISSING
+
+    def _store(self, key: Hashable, value: Any) -> Any:
+        expires = time.monotonic() + self.ttl if self.ttl is not None else 0.0
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+        return value
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            if outcome == "miss":
+                self._stats.misses += 1
+            else:
+                self._stats.shared += 1
+
+    def _call(
+        self,
+        ctx: FlowContext,
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+        compute: Callable[[], Any],
+    ) -> tuple[Any, str]:
+        """Return the cached result or compute it, and how it was obtained."""
+        key = self._make_key(ctx, args, kwargs)
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value, "hit"
+        # Lead or follow a new flight if the leader was interrupted.
+        while True:
+            flight, leading = self._flights.join(key, ctx.correlation_id)
+            if leading:
+                break
+            result = flight.outcome()
+            if result is not ABANDONED:
+                self._count("shared")
+                return result, "shared"
+        self._count("miss")
+        result = self._flights.lead(flight, key, lambda: self._store(key, compute()))
+        return result, "miss"
+
+    async def _acall(
+        self,
+        ctx: FlowContext,
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+        compute: Callable[[], Awaitable[Any]],
+    ) -> tuple[Any, str]:
+        """Async counterpart of :meth:`_call`."""
+        key = self._make_key(ctx, args, kwargs)
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value, "hit"
+        while True:
+            flight, leading = self._flights.join(key, ctx.correlation_id)
+            if leading:
+                break
+            await flight.alanded()
+            result = flight.outcome()
+            if result is not ABANDONED:
+                self._count("shared")
+                return result, "shared"
+        self._count("miss")
+
+        async def fill() -> Any:
+            return self._store(key, await compute())
+
+        return await self._flights.alead(flight, key, fill), "miss"
+
+
+def report() -> dict[tuple[str, str], CacheStats]:
+    """Return the counters of every cached step, keyed by ``(flow, step)``."""
+    with _lock:
+        caches = list(_caches.items())
+    return {owner: cache.stats() for owner, cache in caches}
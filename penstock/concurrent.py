@@ -0,0 +1,326 @@
+"""Executors that carry the flow context into their workers.
+
+``ThreadPoolExecutor.submit`` and ``loop.run_in_executor`` run callables
+without the caller's ``contextvars``, and process or interpreter pools
+start from an empty context altogether.  The executors here restore the
+submitting flow's :class:`~penstock._context.FlowContext` around every
+task, so ``current_flow_id()`` works in the worker and any ``@step`` it
+calls emits its span as part of the flow::
+
+    from penstock.concurrent import FlowThreadPoolExecutor
+
+    pool = FlowThreadPoolExecutor(max_workers=8)
+
+    @step("order_processing", after="validate")
+    def charge(order): ...
+
+    @entrypoint("order_processing")
+    def receive(orders):
+        return list(pool.map(charge, orders))
+
+Thread pools run each task in a copy of the caller's context, which also
+keeps OpenTelemetry span parentage.  Process and interpreter pools send the
+flow context as a tuple of its fields (correlation ID, metadata, sampling
+decision, deadline and trace context), so its metadata must be picklable.
+
+Sync steps declared with ``@step(..., executor="process")`` run in a
+managed process pool sized with :func:`configure_process_pool`.  Spans of
+the steps they call in the worker are recorded there and replayed into the
+parent's backend with :meth:`~penstock.backends.base.TracingBackend.record_span`.
+
+Sync steps declared with ``@step(..., offload=True)`` become awaitable when
+called on an event loop thread and run in a bounded thread pool sized with
+:func:`configure_offload_pool`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+import traceback
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any
+
+from penstock._config import configure
+from penstock._context import (
+    FlowContext,
+    _flow_context_var,
+    _State,
+    get_flow_context,
+)
+from penstock._types import P, R
+from penstock.backends.base import TracingBackend
+
+# (step_name, flow_name, start_time_ns, duration_ns, attrs) of a worker span.
+_Span = tuple[str, str, int, int, dict[str, Any]]
+
+
+def carry_context(fn: Callable[P, R]) -> Callable[P, R]:
+    """Bind *fn* to a copy of the current context.
+
+    Use it with executors you don't control, e.g.
+    ``loop.run_in_executor(None, carry_context(fn))``.
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class FlowThreadPoolExecutor(ThreadPoolExecutor):
+    """``ThreadPoolExecutor`` that runs each task in the submitter's context."""
+
+    def submit(
+        self, fn: Callable[P, R], /, *args: P.args, **kwargs: P.kwargs
+    ) -> Future[R]:
+        return super().submit(
+            contextvars.copy_context().run,  # type: ignore[arg-type]
+            fn,
+            *args,
+            **kwargs,
+        )
+
+
+class FlowProcessPoolExecutor(ProcessPoolExecutor):
+    """``ProcessPoolExecutor`` that restores the submitter's flow context."""
+
+    def submit(
+        self, fn: Callable[P, R], /, *args: P.args, **kwargs: P.kwargs
+    ) -> Future[R]:
+        return super().submit(_run_in_flow, _capture(), fn, args, kwargs)
+
+
+try:
+    from concurrent.futures import InterpreterPoolExecutor
+except ImportError:  # interpreter without subinterpreter support
+    pass
+else:
+
+    class FlowInterpreterPoolExecutor(InterpreterPoolExecutor):
+        """``InterpreterPoolExecutor`` that restores the submitter's flow context."""
+
+        def submit(
+            self, fn: Callable[P, R], /, *args: P.args, **kwargs: P.kwargs
+        ) -> Future[R]:
+            return super().submit(_run_in_flow, _capture(), fn, args, kwargs)
+
+
+def _capture() -> _State | None:
+    ctx = get_flow_context()
+    return ctx._to_state() if ctx is not None else None
+
+
+def _run_in_flow(
+    state: _State | None,
+    fn: Callable[..., R],
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> R:
+    """Worker-side trampoline: run *fn* inside the flow described by *state*."""
+    if state is None:
+        return fn(*args, **kwargs)
+    token = _flow_context_var.set(FlowContext._from_state(state))
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _flow_context_var.reset(token)
+
+
+# ---------------------------------------------------------------------------
+# Managed pool for @step(executor="process")
+# ---------------------------------------------------------------------------
+
+_pool_lock = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+_pool_workers: int | None = None
+# Set in pool workers, where process steps run inline.
+_in_worker = False
+
+
+def configure_process_pool(
+    max_workers: int | None = None, *, prestart: bool = False
+) -> None:
+    """Size the pool that runs ``@step(..., executor="process")`` steps.
+
+    Replaces the current pool; tasks already submitted to it still finish.
+    With *prestart*, the workers are started now rather than on the first
+    step, so that step doesn't pay for spawning them.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        old, _pool, _pool_workers = _pool, None, max_workers
+    if old is not None:
+        old.shutdown(wait=False)
+    if prestart:
+        pool = _get_pool()
+        workers = pool._max_workers  # type: ignore[attr-defined]
+        for future in [pool.submit(os.getpid) for _ in range(workers)]:
+            future.result()
+
+
+def shutdown_process_pool(*, wait: bool = True) -> None:
+    """Shut the step pool down.  The next process step starts a new one."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(_pool_workers, initializer=_init_worker)
+        return _pool
+
+
+def _init_worker() -> None:
+    global _in_worker
+    _in_worker = True
+    configure(_SpanRecorder())
+
+
+def _run_in_process(
+    step_fn: Callable[..., Any],
+    ctx: FlowContext,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+    backend: TracingBackend | None,
+) -> Any:
+    """Run the undecorated body of *step_fn* in the step pool.
+
+    *step_fn* is the decorated step, which pickles by reference.  The spans
+    recorded in the worker are replayed into *backend*, along with
+    ``worker_*`` attributes for the span open around the call.
+    """
+    future = _get_pool().submit(_run_step, ctx._to_state(), step_fn, args, kwargs)
+    error, result, spans, attrs = future.result()
+    if backend is not None:
+        for step_name, flow_name, start_time_ns, duration_ns, span_attrs in spans:
+            backend.record_span(
+                step_name, flow_name, start_time_ns, duration_ns, **span_attrs
+            )
+        backend.set_span_attributes(**attrs)
+    if error is not None:
+        raise error
+    return result
+
+
+def _run_step(
+    state: _State,
+    step_fn: Callable[..., Any],
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> tuple[Exception | None, Any, list[_Span], dict[str, Any]]:
+    """Worker-side counterpart of :func:`_run_in_process`."""
+    _recorded.clear()
+    token = _flow_context_var.set(FlowContext._from_state(state))
+    cpu_start = time.process_time_ns()
+    start = time.perf_counter_ns()
+    error: Exception | None = None
+    result = None
+    try:
+        result = step_fn.__wrapped__(*args, **kwargs)  # type: ignore[attr-defined]
+    except Exception as exc:
+        # The traceback doesn't survive pickling; keep the worker's stack
+        # as a note so the parent's error still shows where it was raised.
+        remote = "".join(traceback.format_exception(exc)).rstrip()
+        exc.add_note(f"\nRaised in step worker {os.getpid()}:\n{remote}")
+        error = exc
+    finally:
+        _flow_context_var.reset(token)
+    attrs = {
+        "worker_pid": os.getpid(),
+        "worker_run_ns": time.perf_counter_ns() - start,
+        "worker_cpu_ns": time.process_time_ns() - cpu_start,
+    }
+    spans = list(_recorded)
+    _recorded.clear()
+    return error, result, spans, attrs
+
+
+_recorded: list[_Span] = []
+_span_attrs: contextvars.ContextVar[dict[str, Any] | None] = contextvars.ContextVar(
+    "penstock_recorded_span_attrs", default=None
+)
+
+
+class _SpanRecorder(TracingBackend):
+    """Worker backend that keeps finished spans for the parent to replay."""
+
+    @contextmanager
+    def span(self, step_name: str, flow_name: str, **attrs: Any) -> Iterator[None]:
+        late_attrs: dict[str, Any] = {}
+        token = _span_attrs.set(late_attrs)
+        start_time = time.time_ns()
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration_ns = time.perf_counter_ns() - start
+            _span_attrs.reset(token)
+            _recorded.append(
+                (step_name, flow_name, start_time, duration_ns, {**attrs, **late_attrs})
+            )
+
+    def set_span_attributes(self, **attrs: Any) -> None:
+        late_attrs = _span_attrs.get()
+        if late_attrs is not None:
+            late_attrs.update(attrs)
+
+    def get_correlation_id(self) -> str:
+        ctx = get_flow_context()
+        return ctx.correlation_id if ctx is not None else ""
+
+
+# ---------------------------------------------------------------------------
+# Managed pool for @step(offload=True)
+# ---------------------------------------------------------------------------
+
+_offload_lock = threading.Lock()
+_offload_pool: ThreadPoolExecutor | None = None
+_offload_workers: int | None = None
+
+
+def configure_offload_pool(max_workers: int | None = None) -> None:
+    """Size the thread pool that runs ``@step(..., offload=True)`` steps.
+
+    ``None`` uses the ``ThreadPoolExecutor`` default.  Replaces the current
+    pool; calls already running in it still finish.
+    """
+    global _offload_pool, _offload_workers
+    with _offload_lock:
+        old, _offload_pool, _offload_workers = _offload_pool, None, max_workers
+    if old is not None:
+        old.shutdown(wait=False)
+
+
+def shutdown_offload_pool(*, wait: bool = True) -> None:
+    """Shut the offload pool down.  The next offloaded call starts a new one."""
+    global _offload_pool
+    with _offload_lock:
+        pool, _offload_pool = _offload_pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
+
+
+def _offload(
+    loop: asyncio.AbstractEventLoop,
+    fn: Callable[..., R],
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> asyncio.Future[R]:
+    """Run ``fn(*args, **kwargs)`` in the offload pool, in the current context."""
+    global _offload_pool
+    with _offload_lock:
+        if _offload_pool is None:
+            _offload_pool = ThreadPoolExecutor(
+                _offload_workers, thread_name_prefix="penstock-offload"
+            )
+        pool = _offload_pool
+    call = functools.partial(fn, *args, **kwargs)
+    return loop.run_in_executor(pool, contextvars.copy_context().run, call)
@@ -0,0 +1,65 @@
+"""ASGI middleware that creates a flow context per request.
+
+Wrap any ASGI application, e.g. Starlette or FastAPI::
+
+    from penstock.contrib.asgi import FlowASGIMiddleware
+
+    app = FlowASGIMiddleware(app)
+    # or: app.add_middleware(FlowASGIMiddleware)
+
+Each HTTP request and WebSocket connection gets a
+:class:`~penstock._context.FlowContext` whose correlation ID, taken from
+the ``X-Correlation-ID`` or ``traceparent`` header or freshly generated, is
+attached as the ``X-Correlation-ID`` response header.  The context is
+set in the request's own task, with no thread hop, and stays set until the
+application returns, i.e. until the response body, streamed or not, has
+been sent.
+
+The other request headers are adopted as with the Django middleware; see
+:mod:`penstock.propagation`.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable, MutableMapping
+from typing import Any
+
+from penstock import propagation
+from penstock._context import _reset_context, _set_context
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+class FlowASGIMiddleware:
+    """ASGI middleware that wraps each request in a penstock flow context."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        headers = {name.lower(): value for name, value in scope.get("headers", ())}
+
+        def get(name: str) -> str | None:
+            value = headers.get(name.encode("latin-1"))
+            return None if value is None else value.decode("latin-1")
+
+        ctx = propagation.extract(get)
+        cid_header = (b"x-correlation-id", ctx.correlation_id.encode("latin-1"))
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), cid_header]
+            await send(message)
+
+        _set_context(ctx)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _reset_context()
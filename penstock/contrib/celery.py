@@ -16,17 +16,173 @@ Usage::
         print(current_flow_id())
 
 The ``flow_task`` decorator wraps a Celery task so that the caller's
-correlation ID is injected into the task headers and restored on the
-worker side.
+correlation ID, sampling decision, deadline, W3C trace context and selected
+baggage (see :mod:`penstock.propagation`) are injected into the task
+headers and restored on the worker side.  A ``flow_task`` that starts after
+its flow's deadline raises :class:`~penstock.deadlines.DeadlineExceeded`
+instead of running.
+
+The flow's metadata travels too, as compact JSON in a single
+``penstock_context`` header, so tasks don't have to look up again what the
+caller already knew.  Use :func:`configure_context` to send only some keys
+or to change the size cap.
+
+Pass a ``group``, ``chain`` or ``chord`` through :func:`flow_canvas` before
+applying it to stamp every task in it with the flow at once, including a
+chord's callback, which a worker publishes later.
 """
 
 from __future__ import annotations
 
 import functools
-from collections.abc import Callable
+import json
+import time
+from collections.abc import Callable, Iterable, Mapping
 from typing import Any
 
-from penstock._context import FlowContext, _reset_context, _set_context, current_flow_id
+from penstock import inflight, propagation
+from penstock._config import get_backend
+from penstock._context import (
+    FlowContext,
+    _reset_context,
+    _set_context,
+    get_flow_context,
+)
+from penstock._registry import _registry
+from penstock.deadlines import _expired
+
+_CID_HEADER = "penstock_correlation_id"
+_SAMPLED_HEADER = "penstock_sampled"
+_DEADLINE_HEADER = "penstock_deadline"
+_CONTEXT_HEADER = "penstock_context"
+_PUBLISHED_HEADER = "penstock_published_at"
+_PARENT_FLOW_HEADER = "penstock_parent_flow"
+_PARENT_STEP_HEADER = "penstock_parent_step"
+_FAN_IN_HEADER = "penstock_fan_in"
+
+# Celery header names for the penstock HTTP headers; the W3C headers keep
+# their names.
+_CELERY_NAMES = {
+    propagation.CORRELATION_HEADER: _CID_HEADER,
+    propagation.SAMPLED_HEADER: _SAMPLED_HEADER,
+    propagation.DEADLINE_HEADER: _DEADLINE_HEADER,
+}
+
+
+DEFAULT_MAX_CONTEXT_BYTES = 4096
+
+# Compact separators and no ASCII escaping keep the header small; a
+# preconfigured encoder skips building one per call.
+_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+_context_keys: frozenset[str] | None = None
+_max_context_bytes = DEFAULT_MAX_CONTEXT_BYTES
+
+
+def configure_context(
+    keys: Iterable[str] | None = None,
+    *,
+    max_bytes: int = DEFAULT_MAX_CONTEXT_BYTES,
+) -> None:
+    """Choose which flow metadata is sent with tasks.
+
+    *keys* restricts the ``penstock_context`` header to those metadata keys;
+    ``None`` sends all of them.  Values must be JSON serialisable; others are
+    left out.  Once the encoded header would exceed *max_bytes*, further
+    keys are left out, in insertion order.
+    """
+    global _context_keys, _max_context_bytes
+    if max_bytes <= 0:
+        raise ValueError(f"max_bytes must be positive, got {max_bytes!r}")
+    _context_keys = frozenset(keys) if keys is not None else None
+    _max_context_bytes = max_bytes
+
+
+def _headers_from_context() -> dict[str, str]:
+    """Build penstock headers for the current flow (empty outside a flow)."""
+    ctx = get_flow_context()
+    return _headers_for(ctx) if ctx is not None else {}
+
+
+def _headers_for(ctx: FlowContext) -> dict[str, str]:
+    headers = {
+        _CELERY_NAMES.get(name, name): value
+        for name, value in propagation.inject(ctx).items()
+    }
+    if ctx._metadata:
+        encoded = _encode_metadata(ctx._metadata)
+        if encoded is not None:
+            headers[_CONTEXT_HEADER] = encoded
+    return headers
+
+
+def _encode_metadata(metadata: Mapping[str, Any]) -> str | None:
+    """Encode *metadata* for the context header, or ``None`` if nothing fits."""
+    keys = _context_keys
+    items = (
+        metadata
+        if keys is None
+        else {key: value for key, value in metadata.items() if key in keys}
+    )
+    if not items:
+        return None
+    encoded = _try_encode(items)
+    if encoded is not None and _size(encoded) <= _max_context_bytes:
+        return encoded
+    # Something is not serialisable or it is too big: add keys one by one.
+    parts: list[str] = []
+    size = 2
+    for key, value in items.items():
+        encoded = _try_encode(value)
+        if encoded is None:
+            continue
+        part = f"{_encoder.encode(key)}:{encoded}"
+        if size + _size(part) + bool(parts) > _max_context_bytes:
+            continue
+        size += _size(part) + bool(parts)
+        parts.append(part)
+    return "{" + ",".join(parts) + "}" if parts else None
+
+
+def _try_encode(value: Any) -> str | None:
+    try:
+        return _encoder.encode(value)
+    except TypeError:  # not serialisable
+        return None
+    except ValueError:  # circular reference
+        return None
+
+
+def _size(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode())
+
+
+def _decode_metadata(value: str | None) -> dict[str, Any]:
+    if value is None or len(value) > 4 * _max_context_bytes:
+        return {}
+    try:
+        metadata = json.loads(value)
+    except ValueError:
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
+
+
+def _context_from(get: propagation.HeaderGetter) -> FlowContext:
+    ctx = propagation.extract(get)
+    ctx._metadata.update(_decode_metadata(get(_CONTEXT_HEADER)))
+    return ctx
+
+
+def _getter(headers: dict[str, Any], request: Any = None) -> propagation.HeaderGetter:
+    """Look headers up on the task *request*, then in *headers*."""
+
+    def get(name: str) -> str | None:
+        key = _CELERY_NAMES.get(name, name)
+        value = getattr(request, key, None)
+        if value is None:
+            value = headers.get(key)
+        return None if value is None else str(value)
+
+    return get
 
 
 def flow_task(fn: Callable[..., Any]) -> Callable[..., Any]:
@@ -34,10 +190,12 @@ def flow_task(fn: Callable[..., Any]) -> Callable[..., Any]:
 
     Wraps the function so that:
 
-    1. When the task is **called** (producer side), the current correlation ID
-       is attached to the Celery message headers.
-    2. When the task **executes** (worker side), the correlation ID is restored
-       into a :class:`~penstock._context.FlowContext`.
+    1. When the task is **called** (producer side), the current correlation
+       ID, sampling decision, deadline and metadata are attached to the
+       Celery message headers.
+    2. When the task **executes** (worker side), they are restored into a
+       :class:`~penstock._context.FlowContext`, and the task fails fast if
+       the deadline has already passed.
     """
 
     @functools.wraps(fn)
@@ -45,9 +203,9 @@ def flow_task(fn: Callable[..., Any]) -> Callable[..., Any]:
         # Check for a correlation ID injected by the before_task_publish
         # signal or passed explicitly.
         headers: dict[str, Any] = kwargs.pop("__penstock_headers__", {})
-        cid: str | None = headers.get("penstock_correlation_id")
-
-        ctx = FlowContext(correlation_id=cid)
+        ctx = _context_from(_getter(headers))
+        if ctx.deadline is not None:
+            _expired(ctx, fn.__name__, "raise")
         _set_context(ctx)
         try:
             return fn(*args, **kwargs)
@@ -55,16 +213,70 @@ def flow_task(fn: Callable[..., Any]) -> Callable[..., Any]:
             _reset_context()
 
     # Attach a helper for callers to build the headers dict.
-    def _penstock_headers() -> dict[str, str]:
-        cid = current_flow_id()
-        if cid is not None:
-            return {"penstock_correlation_id": cid}
-        return {}
-
-    wrapper._penstock_headers = _penstock_headers  # type: ignore[attr-defined]
+    wrapper._penstock_headers = _headers_from_context  # type: ignore[attr-defined]
     return wrapper
 
 
+def flow_canvas(canvas: Any) -> Any:
+    """Stamp a Celery canvas with the current flow, and return it.
+
+    The penstock headers are computed once and merged into the options of
+    every signature in *canvas*, however deeply nested, so a chord's
+    callback still belongs to the flow when a worker publishes it after
+    the last member finishes, and :func:`install_celery_signals` doesn't
+    rebuild them for each of a large group's messages.  With
+    :mod:`penstock.inflight` enabled, the canvas's shape is recorded as
+    dotted DAG edges from the current step (see
+    :func:`~penstock.generate_dag`), with tasks named by the last part of
+    their dotted name.  Outside a flow *canvas* is returned unchanged.
+
+    The worker restores the flow with :func:`install_celery_signals`::
+
+        flow_canvas(chord([charge.s(o) for o in orders], notify.s())).apply_async()
+    """
+    ctx = get_flow_context()
+    if ctx is None:
+        return canvas
+    headers = _headers_for(ctx)
+    headers[_PUBLISHED_HEADER] = str(time.time_ns())
+    current = inflight.current()
+    edges: set[tuple[str, str]] = set()
+    if current is None:
+        _stamp(canvas, headers, [], edges)
+        return canvas
+    headers[_PARENT_FLOW_HEADER] = current.flow_name
+    headers[_PARENT_STEP_HEADER] = current.step
+    _stamp(canvas, headers, [current.step], edges)
+    _registry.record_edges(current.flow_name, edges)
+    return canvas
+
+
+def _stamp(
+    sig: Any,
+    headers: dict[str, str],
+    after: list[str],
+    edges: set[tuple[str, str]],
+) -> list[str]:
+    """Stamp *sig* and its members, returning the names of its last tasks."""
+    kind = getattr(sig, "subtask_type", None)
+    if kind == "chord":
+        members = list(sig.tasks)
+        last = [name for m in members for name in _stamp(m, headers, after, edges)]
+        fan_in = {**headers, _FAN_IN_HEADER: str(len(last))}
+        return _stamp(sig.body, fan_in, last, edges)
+    if kind == "group":
+        return [name for m in sig.tasks for name in _stamp(m, headers, after, edges)]
+    if kind == "chain":
+        for link in sig.tasks:
+            after = _stamp(link, headers, after, edges)
+        return after
+    options = sig.options
+    options["headers"] = {**(options.get("headers") or {}), **headers}
+    name = sig.task.rpartition(".")[2]
+    edges.update((src, name) for src in after)
+    return [name]
+
+
 def install_celery_signals() -> None:
     """Connect Celery signals for automatic header propagation.
 
@@ -72,33 +284,124 @@ def install_celery_signals() -> None:
     ``app.on_after_configure`` handler) to enable transparent
     correlation ID propagation without manual header management.
 
+    Each task published inside a flow is also stamped with its publish
+    time and, when :mod:`penstock.inflight` is enabled, the step that
+    published it.  When the task finishes, a span named after the task is
+    recorded on its flow, from publish to finish, with ``queue_wait_ms``,
+    ``run_ms`` and ``end_to_end_ms`` attributes.  The worker's flow context
+    is cleared after every task.  Tasks stamped by :func:`flow_canvas`
+    keep the headers it gave them.
+
     Requires ``celery`` to be installed.
     """
     from celery.signals import (  # type: ignore[import-not-found]
         before_task_publish,
+        task_postrun,
         task_prerun,
     )
 
-    @before_task_publish.connect  # type: ignore[untyped-decorator]
-    def _inject_penstock_headers(
-        headers: dict[str, Any] | None = None, **_kwargs: Any
-    ) -> None:
-        if headers is None:
-            return
-        cid = current_flow_id()
-        if cid is not None:
-            headers["penstock_correlation_id"] = cid
-
-    @task_prerun.connect  # type: ignore[untyped-decorator]
-    def _restore_penstock_context(sender: Any = None, **_kwargs: Any) -> None:
-        request = getattr(sender, "request", None)
-        if request is None:
-            return
-        cid: str | None = getattr(request, "penstock_correlation_id", None)
-        if cid is None:
-            # Try headers dict
-            req_headers: dict[str, Any] | None = getattr(request, "headers", None)
-            if isinstance(req_headers, dict):
-                cid = req_headers.get("penstock_correlation_id")
-        if cid is not None:
-            _set_context(FlowContext(correlation_id=cid))
+    # Module-level receivers: Celery holds them by weak reference.
+    before_task_publish.connect(_on_publish)
+    task_prerun.connect(_on_prerun)
+    task_postrun.connect(_on_postrun)
+
+
+class _Run:
+    """A task restored into a flow by the signals, until it finishes."""
+
+    __slots__ = (
+        "ctx",
+        "fan_in",
+        "parent_flow",
+        "parent_step",
+        "perf",
+        "published",
+        "started",
+    )
+
+    def __init__(self, ctx: FlowContext, get: propagation.HeaderGetter) -> None:
+        self.ctx = ctx
+        self.published = _int(get(_PUBLISHED_HEADER))
+        self.fan_in = _int(get(_FAN_IN_HEADER))
+        self.parent_flow = get(_PARENT_FLOW_HEADER)
+        self.parent_step = get(_PARENT_STEP_HEADER)
+        self.started = time.time_ns()
+        self.perf = time.perf_counter_ns()
+
+
+# Task ID -> run, for tasks between task_prerun and task_postrun.  Keyed by
+# task ID so that pools running many tasks on one thread keep them apart.
+_running: dict[str, _Run] = {}
+
+
+def _on_publish(headers: dict[str, Any] | None = None, **_kwargs: Any) -> None:
+    if headers is None:
+        return
+    if _CID_HEADER in headers:
+        # Stamped by flow_canvas(); a chord callback is published only once
+        # its members finish, so its queue wait starts now, not at the
+        # canvas's publish.
+        headers[_PUBLISHED_HEADER] = str(time.time_ns())
+        return
+    ctx = get_flow_context()
+    if ctx is None:
+        return
+    headers.update(_headers_for(ctx))
+    headers[_PUBLISHED_HEADER] = str(time.time_ns())
+    current = inflight.current()
+    if current is not None:
+        headers[_PARENT_FLOW_HEADER] = current.flow_name
+        headers[_PARENT_STEP_HEADER] = current.step
+
+
+def _on_prerun(sender: Any = None, task_id: str | None = None, **_kwargs: Any) -> None:
+    request = getattr(sender, "request", None)
+    if request is None:
+        return
+    req_headers: Any = getattr(request, "headers", None)
+    get = _getter(req_headers if isinstance(req_headers, dict) else {}, request)
+    if (
+        get(propagation.CORRELATION_HEADER) is None
+        and get(propagation.TRACEPARENT_HEADER) is None
+    ):
+        return
+    ctx = _context_from(get)
+    _set_context(ctx)
+    _running[task_id or ""] = _Run(ctx, get)
+
+
+def _on_postrun(sender: Any = None, task_id: str | None = None, **_kwargs: Any) -> None:
+    run = _running.pop(task_id or "", None)
+    if run is None:
+        return
+    try:
+        if run.ctx.sampled is not False:
+            # The task body may have replaced or cleared the context; log
+            # the span under the one prerun set up.
+            _set_context(run.ctx)
+            _record_task(getattr(sender, "name", None) or "task", task_id, run)
+    finally:
+        _reset_context()
+
+
+def _record_task(task_name: str, task_id: str | None, run: _Run) -> None:
+    run_ns = time.perf_counter_ns() - run.perf
+    attrs: dict[str, Any] = {"task_id": task_id, "run_ms": run_ns / 1e6}
+    start, duration_ns = run.started, run_ns
+    if run.published is not None:
+        # Publisher and worker clocks may disagree; never report a negative wait.
+        wait_ns = max(run.started - run.published, 0)
+        attrs["queue_wait_ms"] = wait_ns / 1e6
+        attrs["end_to_end_ms"] = (wait_ns + run_ns) / 1e6
+        start, duration_ns = run.started - wait_ns, wait_ns + run_ns
+    if run.parent_step is not None:
+        attrs["parent_step"] = run.parent_step
+    if run.fan_in is not None:
+        attrs["fan_in"] = run.fan_in
+    get_backend().record_span(
+        task_name, run.parent_flow or "celery", start, duration_ns, **attrs
+    )
+
+
+def _int(value: str | None) -> int | None:
+    return int(value) if value is not None and value.isdigit() else None
@@ -7,32 +7,131 @@ Add to your ``MIDDLEWARE`` setting::
         ...
     ]
 
-Each incoming request gets a :class:`~penstock._context.FlowContext` with a
-fresh correlation ID.  The ID is available throughout the request via
-:func:`~penstock.current_flow_id` and is attached as the
+Each incoming request gets a :class:`~penstock._context.FlowContext`.  Its
+correlation ID is taken from the request's ``X-Correlation-ID`` or
+``traceparent`` header, or freshly generated, is available throughout the
+request via :func:`~penstock.current_flow_id`, and is attached as the
 ``X-Correlation-ID`` response header.
+
+An upstream sampling decision sent as ``X-Penstock-Sampled: 1`` (or ``0``) is
+adopted, so ``@entrypoint`` calls made while handling the request follow it
+instead of sampling again.  Likewise, a deadline sent as
+``X-Penstock-Deadline: <unix timestamp>`` is adopted; see
+:mod:`penstock.deadlines`.  See :mod:`penstock.propagation` for every
+header read.
+
+The middleware is both sync and async capable, so under ASGI async views
+run without a thread hop.  For streaming responses the context stays set
+while the body is produced.  For ASGI applications outside Django, see
+:mod:`penstock.contrib.asgi`.
 """
 
 from __future__ import annotations
 
-from collections.abc import Callable
+import inspect
+from collections.abc import AsyncIterator, Callable, Iterator
 from typing import Any
 
+from penstock import propagation
 from penstock._context import FlowContext, _reset_context, _set_context
 
+# Header name -> request.META key.
+_META_KEYS = {
+    name: "HTTP_" + name.upper().replace("-", "_")
+    for name in (
+        propagation.CORRELATION_HEADER,
+        propagation.SAMPLED_HEADER,
+        propagation.DEADLINE_HEADER,
+        propagation.TRACEPARENT_HEADER,
+        propagation.TRACESTATE_HEADER,
+        propagation.BAGGAGE_HEADER,
+    )
+}
+
 
 class FlowMiddleware:
-    """WSGI middleware that wraps each request in a penstock flow context."""
+    """Django middleware that wraps each request in a penstock flow context."""
+
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response: Callable[..., Any]) -> None:
         self.get_response = get_response
+        self._async = inspect.iscoroutinefunction(get_response)
+        if self._async:
+            # Tells Django to await this middleware instead of adapting it.
+            inspect.markcoroutinefunction(self)
 
     def __call__(self, request: Any) -> Any:
-        ctx = FlowContext()
+        if self._async:
+            return self.__acall__(request)
+        ctx = _context_for(request)
         _set_context(ctx)
         try:
             response = self.get_response(request)
             response["X-Correlation-ID"] = ctx.correlation_id
-            return response
         finally:
             _reset_context()
+        return _bind_streaming(response, ctx)
+
+    async def __acall__(self, request: Any) -> Any:
+        ctx = _context_for(request)
+        _set_context(ctx)
+        try:
+            response = await self.get_response(request)
+            response["X-Correlation-ID"] = ctx.correlation_id
+        finally:
+            _reset_context()
+        return _bind_streaming(response, ctx)
+
+
+def _context_for(request: Any) -> FlowContext:
+    meta: dict[str, Any] = getattr(request, "META", None) or {}
+    return propagation.extract(lambda name: meta.get(_META_KEYS[name]))
+
+
+def _bind_streaming(response: Any, ctx: FlowContext) -> Any:
+    """Make a streaming response produce its body inside *ctx*."""
+    if getattr(response, "streaming", False):
+        content = response.streaming_content
+        if getattr(response, "is_async", False):
+            response.streaming_content = _bind_async(content, ctx)
+        else:
+            response.streaming_content = _bind_sync(content, ctx)
+    return response
+
+
+def _bind_sync(chunks: Any, ctx: FlowContext) -> Iterator[Any]:
+    iterator = iter(chunks)
+    try:
+        while True:
+            _set_context(ctx)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _reset_context()
+            yield chunk
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+async def _bind_async(chunks: Any, ctx: FlowContext) -> AsyncIterator[Any]:
+    iterator = aiter(chunks)
+    try:
+        while True:
+            _set_context(ctx)
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            finally:
+                _reset_context()
+            yield chunk
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
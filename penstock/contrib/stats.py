@@ -0,0 +1,284 @@
+"""Embedded WSGI/ASGI app serving live flow statistics of this process.
+
+Mount it next to your application, behind your own authentication::
+
+    from penstock.contrib.stats import StatsApp
+
+    stats = StatsApp()
+
+    # WSGI, e.g. with werkzeug's DispatcherMiddleware:
+    app = DispatcherMiddleware(app, {"/_penstock": stats})
+
+    # ASGI, e.g. Starlette:
+    routes = [Mount("/_penstock", app=stats.asgi)]
+
+It answers ``GET`` requests with:
+
+``/flows``
+    Per-flow gauges and per-step call counts and latency percentiles (JSON).
+``/inflight``
+    Flows running right now, oldest first; ``?stuck=<seconds>`` keeps only
+    those that have spent that long in one step (JSON).
+``/spans/<correlation id>``
+    The most recent step calls of one flow (JSON).
+``/dag/<flow>``
+    The flow's Mermaid diagram labelled with latency and cache hit rates.
+
+Creating the app enables :mod:`penstock.histograms` and
+:mod:`penstock.inflight` and starts keeping the last *recent_spans* step
+calls in memory.  Each response is cached for *cache_s* seconds, and at
+most *max_renders_per_s* responses a second are rendered; beyond that a
+stale copy is served, or ``429`` when there is none, so scraping never
+competes with the application for long.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING, Any
+from urllib.parse import parse_qs, unquote
+
+from penstock import histograms, inflight
+from penstock._bucket import TokenBucket
+from penstock._dag import generate_dag
+from penstock._instrument import (
+    WallTimer,
+    add_observer_factory,
+    remove_observer_factory,
+)
+from penstock._registry import _registry
+
+if TYPE_CHECKING:
+    from penstock._context import FlowContext
+
+# status line, content type, body
+_Response = tuple[str, str, bytes]
+
+_JSON = "application/json"
+_TEXT = "text/plain; charset=utf-8"
+_PERCENTILES = (50, 90, 99, 99.9)
+_MAX_CACHED = 256
+
+
+class StatsApp:
+    """WSGI application (and ASGI via :attr:`asgi`) exposing flow statistics."""
+
+    def __init__(
+        self,
+        *,
+        recent_spans: int = 10_000,
+        cache_s: float = 1.0,
+        max_renders_per_s: float = 5.0,
+    ) -> None:
+        if recent_spans <= 0:
+            raise ValueError(f"recent_spans must be positive, got {recent_spans!r}")
+        if max_renders_per_s <= 0:
+            raise ValueError(
+                f"max_renders_per_s must be positive, got {max_renders_per_s!r}"
+            )
+        self.cache_s = cache_s
+        self.max_renders_per_s = max_renders_per_s
+        # (correlation id, flow, step, start time, duration ns)
+        self._spans: deque[tuple[str, str, str, float, int]] = deque(
+            maxlen=recent_spans
+        )
+        self._lock = threading.Lock()
+        # target -> (expires at, response)
+        self._cache: dict[str, tuple[float, _Response]] = {}
+        # Holds at least one render, so rates below one a second still render.
+        self._renders = TokenBucket(max_renders_per_s, max(max_renders_per_s, 1.0))
+        histograms.enable()
+        inflight.enable()
+        add_observer_factory(self._observe, include_sync=True)
+
+    def close(self) -> None:
+        """Stop recording spans.  Histograms and in-flight tracking stay on."""
+        remove_observer_factory(self._observe)
+
+    # -- serving ---------------------------------------------------------------
+
+    def __call__(
+        self, environ: dict[str, Any], start_response: Callable[..., Any]
+    ) -> Iterable[bytes]:
+        status, content_type, body = self.respond(
+            environ.get("REQUEST_METHOD", "GET"),
+            environ.get("PATH_INFO", ""),
+            environ.get("QUERY_STRING", ""),
+        )
+        start_response(status, _headers(status, content_type, body))
+        return [body]
+
+    async def asgi(
+        self,
+        scope: dict[str, Any],
+        receive: Callable[[], Any],
+        send: Callable[[dict[str, Any]], Any],
+    ) -> None:
+        """ASGI entry point."""
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        path: str = scope["path"]
+        root: str = scope.get("root_path", "")
+        if root and path.startswith(root):
+            path = path[len(root) :]
+        status, content_type, body = self.respond(
+            scope["method"], path, scope.get("query_string", b"").decode("latin-1")
+        )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in _headers(status, content_type, body)
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    def respond(self, method: str, path: str, query: str = "") -> _Response:
+        """Return ``(status, content type, body)`` for a request."""
+        if method != "GET":
+            return _error("405 Method Not Allowed", f"{method} not allowed")
+        target = f"{path.rstrip('/') or '/'}?{query}"
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(target)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+            if not self._renders.take():
+                if cached is not None:
+                    return cached[1]
+                return _error("429 Too Many Requests", "Rate limited, retry later")
+        response = self._render(unquote(path), query)
+        with self._lock:
+            self._cache.pop(target, None)
+            if len(self._cache) >= _MAX_CACHED:
+                del self._cache[next(iter(self._cache))]
+            self._cache[target] = (time.monotonic() + self.cache_s, response)
+        return response
+
+    # -- rendering -------------------------------------------------------------
+
+    def _render(self, path: str, query: str) -> _Response:
+        parts = [part for part in path.split("/") if part]
+        if not parts:
+            return _json(
+                {"endpoints": ["/flows", "/inflight", "/spans/<id>", "/dag/<flow>"]}
+            )
+        match parts:
+            case ["flows"]:
+                return _json({"flows": _flows()})
+            case ["inflight"]:
+                stuck = parse_qs(query).get("stuck")
+                try:
+                    threshold = float(stuck[0]) if stuck else 0.0
+                except ValueError:
+                    return _error("400 Bad Request", "stuck must be a number")
+                return _json({"in_flight": _in_flight(threshold)})
+            case ["spans", correlation_id]:
+                return _json(
+                    {
+                        "correlation_id": correlation_id,
+                        "spans": self._recent(correlation_id),
+                    }
+                )
+            case ["dag", flow_name]:
+                try:
+                    diagram = generate_dag(flow_name, cache_stats=True, latency=True)
+                except KeyError:
+                    return _error("404 Not Found", f"Unknown flow {flow_name!r}")
+                return "200 OK", _TEXT, diagram.encode()
+        return _error("404 Not Found", f"No such endpoint: {path}")
+
+    def _recent(self, correlation_id: str) -> list[dict[str, Any]]:
+        spans = [span for span in list(self._spans) if span[0] == correlation_id]
+        spans.sort(key=lambda span: span[3])
+        return [
+            {
+                "flow": flow_name,
+                "step": step_name,
+                "start": started,
+                "duration_ms": duration_ns / 1e6,
+            }
+            for _, flow_name, step_name, started, duration_ns in spans
+        ]
+
+    def _observe(self, flow_name: str, step_name: str, ctx: FlowContext) -> WallTimer:
+        span = (ctx.correlation_id, flow_name, step_name, time.time())
+        # deque.append is atomic, and maxlen drops the oldest span.
+        return WallTimer(lambda duration_ns: self._spans.append((*span, duration_ns)))
+
+
+def _flows() -> dict[str, Any]:
+    snapshot = histograms.snapshot()
+    gauges = inflight.gauges()
+    flows: dict[str, Any] = {}
+    for flow_name in sorted(_registry.get_all_flow_names()):
+        gauge = gauges.get(flow_name)
+        steps: dict[str, Any] = {}
+        for step_name in sorted(_registry.get_flow(flow_name).steps):
+            histogram = snapshot.get((flow_name, step_name))
+            if histogram is None:
+                continue
+            steps[step_name] = {
+                "count": histogram.count,
+                "mean_ms": round(histogram.mean_ms, 3),
+                "max_ms": round(histogram.max_ms, 3),
+                **{
+                    f"p{p:g}_ms": round(histogram.percentile(p), 3)
+                    for p in _PERCENTILES
+                },
+            }
+        flows[flow_name] = {
+            "in_flight": gauge.in_flight if gauge else 0,
+            "oldest_age_s": gauge.oldest_age_s if gauge else None,
+            "rejected": gauge.rejected if gauge else 0,
+            "limit": gauge.limit if gauge else None,
+            "steps": steps,
+        }
+    return flows
+
+
+def _in_flight(threshold_s: float) -> list[dict[str, Any]]:
+    return [
+        {
+            "flow": flow.flow_name,
+            "correlation_id": flow.correlation_id,
+            "step": flow.step,
+            "age_s": round(flow.age_s, 3),
+            "step_age_s": round(flow.step_age_s, 3),
+        }
+        for flow in inflight.stuck(threshold_s)
+    ]
+
+
+def _json(payload: Any) -> _Response:
+    return "200 OK", _JSON, json.dumps(payload).encode()
+
+
+def _error(status: str, message: str) -> _Response:
+    return status, _JSON, json.dumps({"error": message}).encode()
+
+
+def _headers(status: str, content_type: str, body: bytes) -> list[tuple[str, str]]:
+    headers = [
+        ("Content-Type", content_type),
+        ("Content-Length", str(len(body))),
+        ("Cache-Control", "no-store"),
+    ]
+    if status.startswith("429"):
+        headers.append(("Retry-After", "1"))
+    return headers
@@ -0,0 +1,73 @@
+"""Flow deadlines: stop working on requests nobody is waiting for any more.
+
+Give an entrypoint a time budget, or adopt one from the incoming request::
+
+    @entrypoint("checkout", deadline=2.0)
+    def checkout(order_id: str) -> None: ...
+
+The deadline is stored in the :class:`~penstock._context.FlowContext` as an
+absolute Unix timestamp, so it follows the flow into threads, worker
+processes and Celery tasks.  A step called once it has passed raises
+:class:`DeadlineExceeded` without running, or is skipped and returns
+``None`` with ``@step(..., on_deadline="skip")``.  Use :func:`remaining` to
+pass what is left of the budget on to a downstream call.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Literal
+
+from penstock._context import FlowContext, get_flow_context
+
+OnDeadline = Literal["raise", "skip"]
+
+
+class DeadlineExceeded(TimeoutError):
+    """A step or task was about to start after its flow's deadline."""
+
+
+def remaining() -> float | None:
+    """Return the seconds left in the current flow's budget.
+
+    ``None`` outside a flow or when the flow has no deadline, and negative
+    once the deadline has passed.
+    """
+    ctx = get_flow_context()
+    return ctx.time_left() if ctx is not None else None
+
+
+def _combine(outer: float | None, budget: float | None, now: float) -> float | None:
+    """Return the earlier of an inherited deadline and *budget* from *now*."""
+    if budget is None:
+        return outer
+    own = now + budget
+    return own if outer is None else min(outer, own)
+
+
+def _expired(ctx: FlowContext, name: str, on_deadline: OnDeadline) -> bool:
+    """Raise, or return True to skip, if *ctx*'s deadline has passed."""
+    left = ctx.time_left()
+    if left is None or left > 0:
+        return False
+    if on_deadline == "skip":
+        return True
+    raise DeadlineExceeded(
+        f"'{name}' not started: flow {ctx.correlation_id} is "
+        f"{-left:.3f}s past its deadline"
+    )
+
+
+def _encode(deadline: float) -> str:
+    return repr(deadline)
+
+
+def _decode(value: Any) -> float | None:
+    """Parse a deadline header value; malformed values are ignored."""
+    if value is None:
+        return None
+    try:
+        deadline = float(str(value))
+    except ValueError:
+        return None
+    return deadline if math.isfinite(deadline) else None
@@ -0,0 +1,215 @@
+"""In-process latency histograms per ``(flow, step)``.
+
+Switch it on to get accurate tail latencies per business step without
+shipping every span::
+
+    from penstock import histograms
+
+    histograms.enable()
+    ...
+    for (flow, step), h in histograms.snapshot(reset=True).items():
+        print(flow, step, h.count, h.percentile(99), h.percentile(99.9))
+
+Every step call's wall time is recorded into a :class:`LatencyHistogram`,
+a fixed array of log-linear buckets in the style of HdrHistogram: one per
+microsecond up to 32µs, then 16 per power of two, each 1/16 of its lower
+bound wide.  Reporting a bucket's midpoint puts any percentile within
+about 3% of the true value, from 1µs up to about 19 hours, in 4 KiB per
+step.  :func:`enable` allocates one for every step registered at that
+point.  ``generate_dag(..., latency=True)`` labels the diagram with them.
+"""
+
+from __future__ import annotations
+
+import threading
+from array import array
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from penstock._instrument import (
+    WallTimer,
+    add_observer_factory,
+    remove_observer_factory,
+)
+from penstock._registry import _registry
+
+if TYPE_CHECKING:
+    from penstock._context import FlowContext
+
+# Durations are bucketed in units of 1024ns (about 1µs).
+_UNIT_SHIFT = 10
+_SUB_BITS = 5
+_SUB = 1 << _SUB_BITS
+_HALF = _SUB // 2
+_MAX_UNITS = (1 << 36) - 1
+_BUCKETS = (_MAX_UNITS.bit_length() - _SUB_BITS) * _HALF + _SUB
+
+
+def _index(duration_ns: int) -> int:
+    units = min(max(duration_ns, 0) >> _UNIT_SHIFT, _MAX_UNITS)
+    if units < _SUB:
+        return units
+    magnitude = units.bit_length() - _SUB_BITS
+    return magnitude * _HALF + (units >> magnitude)
+
+
+def _midpoint_ns(index: int) -> float:
+    """Return the middle of bucket *index* in nanoseconds."""
+    if index < _SUB:
+        low, width = index, 1
+    else:
+        magnitude = index // _HALF - 1
+        low, width = (index - magnitude * _HALF) << magnitude, 1 << magnitude
+    return (low + width / 2) * (1 << _UNIT_SHIFT)
+
+
+@dataclass(slots=True)
+class _Totals:
+    count: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+
+
+class LatencyHistogram:
+    """Log-linear histogram of durations, safe to record into from threads."""
+
+    __slots__ = ("_counts", "_lock", "_totals")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts = array("q", bytes(8 * _BUCKETS))
+        self._totals = _Totals()
+
+    def record(self, duration_ns: int) -> None:
+        """Add one duration."""
+        index = _index(duration_ns)
+        with self._lock:
+            self._counts[index] += 1
+            totals = self._totals
+            totals.count += 1
+            totals.total_ns += duration_ns
+            if duration_ns > totals.max_ns:
+                totals.max_ns = duration_ns
+
+    @property
+    def count(self) -> int:
+        return self._totals.count
+
+    @property
+    def mean_ms(self) -> float:
+        totals = self._totals
+        return totals.total_ns / totals.count / 1e6 if totals.count else 0.0
+
+    @property
+    def max_ms(self) -> float:
+        return self._totals.max_ns / 1e6
+
+    def percentile(self, p: float) -> float:
+        """Return the *p*-th percentile (0-100) in milliseconds, or 0.0 if empty."""
+        if not 0 <= p <= 100:
+            raise ValueError(f"p must be between 0 and 100, got {p!r}")
+        with self._lock:
+            total = self._totals.count
+            if not total:
+                return 0.0
+            rank = max(1, -(-total * p // 100))
+            if rank >= total:
+                return self._totals.max_ns / 1e6
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    value = min(_midpoint_ns(index), self._totals.max_ns)
+                    return value / 1e6
+        return self.max_ms
+
+    def merge(self, other: LatencyHistogram) -> None:
+        """Add the counts of *other* into this histogram."""
+        with other._lock:
+            counts = array("q", other._counts)
+            totals = _Totals(
+                other._totals.count, other._totals.total_ns, other._totals.max_ns
+            )
+        with self._lock:
+            mine = self._counts
+            for index, count in enumerate(counts):
+                if count:
+                    mine[index] += count
+            self._totals.count += totals.count
+            self._totals.total_ns += totals.total_ns
+            self._totals.max_ns = max(self._totals.max_ns, totals.max_ns)
+
+    def copy(self, *, reset: bool = False) -> LatencyHistogram:
+        """Return a copy, optionally clearing this histogram in the same step."""
+        clone = LatencyHistogram()
+        with self._lock:
+            if reset:
+                clone._counts, self._counts = self._counts, clone._counts
+                clone._totals, self._totals = self._totals, clone._totals
+            else:
+                clone._counts = array("q", self._counts)
+                totals = self._totals
+                clone._totals = _Totals(totals.count, totals.total_ns, totals.max_ns)
+        return clone
+
+
+_lock = threading.Lock()
+_enabled = False
+_histograms: dict[tuple[str, str], LatencyHistogram] = {}
+
+
+def enable() -> None:
+    """Start recording, allocating histograms for the registered steps."""
+    global _enabled
+    with _lock:
+        for flow_name in _registry.get_all_flow_names():
+            for step_name in _registry.get_flow(flow_name).steps:
+                _histograms.setdefault((flow_name, step_name), LatencyHistogram())
+        add_observer_factory(_timer, include_sync=True)
+        _enabled = True
+
+
+def disable() -> None:
+    """Stop recording.  The histograms are kept until :func:`reset`."""
+    global _enabled
+    with _lock:
+        remove_observer_factory(_timer)
+        _enabled = False
+
+
+def is_enabled() -> bool:
+    """Return whether step durations are currently being recorded."""
+    return _enabled
+
+
+def snapshot(*, reset: bool = False) -> dict[tuple[str, str], LatencyHistogram]:
+    """Return a copy of every histogram keyed by ``(flow, step)``.
+
+    With *reset*, each histogram is cleared as it is copied, so no duration
+    is counted twice or lost between two snapshots.
+    """
+    with _lock:
+        items = list(_histograms.items())
+    return {key: h.copy(reset=reset) for key, h in items}
+
+
+def reset() -> None:
+    """Discard every histogram."""
+    with _lock:
+        _histograms.clear()
+
+
+def _histogram(key: tuple[str, str]) -> LatencyHistogram:
+    histogram = _histograms.get(key)
+    if histogram is None:
+        # A step registered after enable(), or called before registering.
+        with _lock:
+            histogram = _histograms.setdefault(key, LatencyHistogram())
+    return histogram
+
+
+def _timer(flow_name: str, step_name: str, _ctx: FlowContext) -> WallTimer:
+    key = (flow_name, step_name)
+    # Look the histogram up when the call finishes, so a call running across
+    # snapshot(reset=True) lands in the new one.
+    return WallTimer(lambda elapsed_ns: _histogram(key).record(elapsed_ns))
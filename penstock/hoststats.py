@@ -0,0 +1,306 @@
+"""Host-wide step statistics in shared memory for prefork servers.
+
+With gunicorn or Celery prefork, every worker process keeps its own
+counters.  :class:`HostStats` puts per-``(flow, step)`` call counts and
+latency histograms in one :mod:`multiprocessing.shared_memory` block, so any
+process on the host can read the totals without a network exporter::
+
+    # Parent process, after the application is imported (e.g. gunicorn's
+    # ``when_ready`` hook or Celery's ``worker_init`` signal):
+    stats = HostStats.create("penstock-web")
+
+    # Each worker, right after the fork (``post_fork`` /
+    # ``worker_process_init``):
+    stats.attach()
+
+    # Anywhere on the host, e.g. a sidecar:
+    for (flow, step), s in HostStats.open("penstock-web").snapshot().items():
+        print(flow, step, s.calls, s.mean_ms, s.percentile(99))
+
+The layout is fixed when the block is created: one slot per step
+registered at that point, in sorted order, and one row of slots per worker.
+A worker only ever writes to its own row, so processes never contend;
+threads within a worker share its row and take a process-local lock to
+update it.  Readers add the rows up.  A row left by a worker that exited is
+taken over by the next one to attach, keeping its counts.
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import multiprocessing
+import os
+import struct
+import threading
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any
+
+from penstock._instrument import (
+    NULL_OBSERVER,
+    WallTimer,
+    add_observer_factory,
+    remove_observer_factory,
+)
+from penstock._registry import _registry
+
+if TYPE_CHECKING:
+    from multiprocessing.synchronize import Lock
+
+    from penstock._context import FlowContext
+
+DEFAULT_BUCKETS_MS: tuple[float, ...] = (
+    1,
+    2,
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+)
+
+_MAGIC = b"PNSTK001"
+# magic, keys, rows, buckets
+_HEADER = struct.Struct("8sqqq")
+_NAME_SIZE = 128
+_SEP = "\x1f"
+# Per-slot counters ahead of the bucket counts.
+_CALLS, _TOTAL_NS, _FIRST_BUCKET = 0, 1, 2
+
+
+@dataclass(frozen=True, slots=True)
+class StepSnapshot:
+    """Host-wide totals of one step."""
+
+    calls: int
+    total_ns: int
+    buckets: tuple[tuple[float, int], ...]
+    """``(upper bound in ms, calls)`` pairs; the last bound is ``inf``."""
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ns / self.calls / 1e6 if self.calls else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Return the upper bound of the bucket holding the *p*-th percentile."""
+        rank = self.calls * p / 100
+        seen = 0
+        for bound, count in self.buckets:
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return 0.0
+
+
+class HostStats:
+    """Shared-memory block of per-step counters, one row per worker process.
+
+    Use :meth:`create` in the parent process and :meth:`open` elsewhere;
+    the constructor is internal.
+    """
+
+    def __init__(self, shm: SharedMemory, claim_lock: Lock | None) -> None:
+        buf = _buffer(shm)
+        magic, n_keys, n_rows, n_buckets = _HEADER.unpack_from(buf)
+        if magic != _MAGIC:
+            shm.close()
+            raise ValueError(f"{shm.name!r} is not a penstock stats block")
+        self._shm = shm
+        self._claim_lock = claim_lock
+        # Serialises this process's threads updating its row.
+        self._lock = threading.Lock()
+        self._rows = n_rows
+        offset = _HEADER.size
+        keys: list[tuple[str, str]] = []
+        for i in range(n_keys):
+            start = offset + i * _NAME_SIZE
+            raw = bytes(buf[start : start + _NAME_SIZE])
+            flow, step = raw.rstrip(b"\0").decode().split(_SEP)
+            keys.append((flow, step))
+        offset += n_keys * _NAME_SIZE
+        self._keys = keys
+        self._index = {key: i for i, key in enumerate(keys)}
+        self._bounds_ms: tuple[float, ...] = struct.unpack_from(
+            f"{n_buckets}d", buf, offset
+        )
+        self._bounds_ns = [int(b * 1e6) for b in self._bounds_ms]
+        offset += n_buckets * 8
+        # Row layout: owner pid, then per key: calls, total_ns, buckets + 1.
+        self._slot_size = _FIRST_BUCKET + n_buckets + 1
+        self._row_size = 1 + n_keys * self._slot_size
+        self._counters = buf[offset:].cast("q")
+        self._row: int | None = None
+
+    # -- construction ----------------------------------------------------------
+
+    @classmethod
+    def create(
+        cls,
+        name: str | None = None,
+        *,
+        workers: int = 64,
+        flows: Iterable[str] | None = None,
+        buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS,
+    ) -> HostStats:
+        """Create the block for the steps registered so far.
+
+        *workers* bounds how many processes can record at once.  *flows*
+        restricts the layout to those flows.  Call it in the parent before
+        forking the workers, since :meth:`attach` relies on a lock they
+        inherit.
+        """
+        if workers <= 0:
+            raise ValueError(f"workers must be positive, got {workers!r}")
+        bounds = sorted(buckets_ms)
+        if not bounds or bounds[0] <= 0:
+            raise ValueError("buckets_ms must be a non-empty list of positive bounds")
+        names = flows if flows is not None else _registry.get_all_flow_names()
+        keys = sorted(
+            (flow_name, step_name)
+            for flow_name in names
+            for step_name in _registry.get_flow(flow_name).steps
+        )
+        encoded: list[bytes] = []
+        for flow_name, step_name in keys:
+            raw = f"{flow_name}{_SEP}{step_name}".encode()
+            if len(raw) > _NAME_SIZE:
+                raise ValueError(f"Step name too long: {flow_name}.{step_name}")
+            encoded.append(raw.ljust(_NAME_SIZE, b"\0"))
+        row_size = 1 + len(keys) * (_FIRST_BUCKET + len(bounds) + 1)
+        size = (
+            _HEADER.size
+            + len(keys) * _NAME_SIZE
+            + len(bounds) * 8
+            + workers * row_size * 8
+        )
+        shm = SharedMemory(name, create=True, size=size)
+        buf = _buffer(shm)
+        _HEADER.pack_into(buf, 0, _MAGIC, len(keys), workers, len(bounds))
+        offset = _HEADER.size
+        buf[offset : offset + len(encoded) * _NAME_SIZE] = b"".join(encoded)
+        offset += len(encoded) * _NAME_SIZE
+        struct.pack_into(f"{len(bounds)}d", buf, offset, *bounds)
+        return cls(shm, multiprocessing.Lock())
+
+    @classmethod
+    def open(cls, name: str) -> HostStats:
+        """Open an existing block, e.g. from a sidecar, to read it."""
+        return cls(SharedMemory(name, track=False), None)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def steps(self) -> list[tuple[str, str]]:
+        """The ``(flow, step)`` pairs in the layout."""
+        return list(self._keys)
+
+    # -- recording -------------------------------------------------------------
+
+    def attach(self) -> None:
+        """Claim a row for this process and start recording its steps.
+
+        Call it in each worker right after the fork.  Raises
+        ``RuntimeError`` if every row belongs to a live process.
+        """
+        if self._claim_lock is None:
+            raise RuntimeError(
+                "attach() needs the HostStats created by the parent process"
+            )
+        pid = os.getpid()
+        counters = self._counters
+        with self._claim_lock:
+            free = None
+            for row in range(self._rows):
+                owner = counters[row * self._row_size]
+                if owner == pid:
+                    free = row
+                    break
+                if free is None and (owner == 0 or not _alive(owner)):
+                    free = row
+            if free is None:
+                raise RuntimeError(f"All {self._rows} worker rows are in use")
+            counters[free * self._row_size] = pid
+        self._row = free
+        # A lock copied from the parent mid-update would never be released.
+        self._lock = threading.Lock()
+        add_observer_factory(self._observe, include_sync=True)
+
+    def detach(self) -> None:
+        """Stop recording in this process; its row keeps its counts."""
+        remove_observer_factory(self._observe)
+        self._row = None
+
+    def _observe(self, flow_name: str, step_name: str, _ctx: FlowContext) -> Any:
+        slot = self._index.get((flow_name, step_name))
+        row = self._row
+        if slot is None or row is None:
+            return NULL_OBSERVER
+        base = row * self._row_size + 1 + slot * self._slot_size
+        return WallTimer(functools.partial(self._record, base))
+
+    def _record(self, base: int, elapsed_ns: int) -> None:
+        counters = self._counters
+        bucket = bisect.bisect_left(self._bounds_ns, elapsed_ns)
+        with self._lock:
+            counters[base + _CALLS] += 1
+            counters[base + _TOTAL_NS] += elapsed_ns
+            counters[base + _FIRST_BUCKET + bucket] += 1
+
+    # -- reading ---------------------------------------------------------------
+
+    def snapshot(self) -> dict[tuple[str, str], StepSnapshot]:
+        """Return the totals of every step, summed over all rows."""
+        counters = self._counters
+        bounds = (*self._bounds_ms, float("inf"))
+        result: dict[tuple[str, str], StepSnapshot] = {}
+        for slot, key in enumerate(self._keys):
+            totals = [0] * self._slot_size
+            for row in range(self._rows):
+                base = row * self._row_size + 1 + slot * self._slot_size
+                for i in range(self._slot_size):
+                    totals[i] += counters[base + i]
+            result[key] = StepSnapshot(
+                totals[_CALLS],
+                totals[_TOTAL_NS],
+                tuple(zip(bounds, totals[_FIRST_BUCKET:], strict=True)),
+            )
+        return result
+
+    # -- teardown --------------------------------------------------------------
+
+    def close(self) -> None:
+        """Stop recording and release this process's mapping of the block."""
+        self.detach()
+        self._counters.release()
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Remove the block from the host.  Call once, from the parent."""
+        self._shm.unlink()
+
+
+def _buffer(shm: SharedMemory) -> memoryview:
+    buf = shm.buf
+    if buf is None:
+        raise ValueError(f"Shared memory block {shm.name!r} is closed")
+    return buf
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
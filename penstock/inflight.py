@@ -0,0 +1,273 @@
+"""Live view of the flows running in this process.
+
+Switch the tracker on to ask a worker what it is doing right now::
+
+    from penstock import inflight
+
+    inflight.enable()
+    ...
+    for flow_name, gauge in inflight.gauges().items():
+        print(flow_name, gauge.in_flight, gauge.oldest_age_s)
+    for flow in inflight.stuck(threshold_s=30):
+        print(flow.correlation_id, flow.step, flow.step_age_s)
+
+Every ``@entrypoint`` call, or :func:`~penstock.run_flow` run, adds its
+flow to the table and removes it when it returns or raises, and every
+``@step`` call marks itself as running in its flow until it finishes.  A
+flow's current step is the most recently started of its steps still
+running, so steps running concurrently, e.g. under ``run_flow``, are
+handled.  The table is split into stripes, each with its own lock, so
+flows starting and finishing on different threads rarely contend.
+
+:func:`set_limit` adds admission control: once a flow has that many calls
+in flight, further entrypoint calls raise :class:`FlowRejected` before
+running.  Flows already running when :func:`enable` is called are not
+tracked.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+
+from penstock._context import FlowContext, get_flow_context
+from penstock._instrument import (
+    BaseObserver,
+    add_observer_factory,
+    remove_observer_factory,
+)
+
+
+class FlowRejected(RuntimeError):
+    """An entrypoint call was refused because its flow is at its limit."""
+
+
+@dataclass(frozen=True, slots=True)
+class InFlightFlow:
+    """Snapshot of one running flow."""
+
+    flow_name: str
+    correlation_id: str
+    step: str
+    """Most recently started step still running (the entrypoint if none is)."""
+    age_s: float
+    step_age_s: float
+    """Time since that step started, or since the last step finished."""
+
+
+@dataclass(frozen=True, slots=True)
+class FlowGauge:
+    """Live counters of one flow."""
+
+    in_flight: int
+    oldest_age_s: float | None
+    rejected: int
+    limit: int | None
+
+
+class _Gauge:
+    __slots__ = ("in_flight", "limit", "lock", "rejected")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.limit: int | None = None
+        self.rejected = 0
+
+
+class _Flow:
+    """Mutable table entry for one running flow."""
+
+    __slots__ = (
+        "correlation_id",
+        "entrypoint",
+        "flow_name",
+        "gauge",
+        "idle_since",
+        "running",
+        "started",
+    )
+
+    def __init__(
+        self, flow_name: str, correlation_id: str, entrypoint: str, gauge: _Gauge
+    ) -> None:
+        self.flow_name = flow_name
+        self.correlation_id = correlation_id
+        self.entrypoint = entrypoint
+        self.gauge = gauge
+        # (step, started) of every step call running, in the order they started.
+        self.running: list[tuple[str, float]] = []
+        self.started = self.idle_since = time.monotonic()
+
+
+_STRIPES = 16
+# Keyed by the flow's context, which its steps share, rather than by
+# correlation ID, which nested entrypoints inherit.
+_stripes: tuple[tuple[threading.Lock, dict[FlowContext, _Flow]], ...] = tuple(
+    (threading.Lock(), {}) for _ in range(_STRIPES)
+)
+_gauges: dict[str, _Gauge] = {}
+_enabled = False
+
+
+def _stripe(ctx: FlowContext) -> tuple[threading.Lock, dict[FlowContext, _Flow]]:
+    return _stripes[hash(ctx) % _STRIPES]
+
+
+def _gauge(flow_name: str) -> _Gauge:
+    gauge = _gauges.get(flow_name)
+    if gauge is None:
+        # setdefault is atomic, so racing threads end up with the same one.
+        gauge = _gauges.setdefault(flow_name, _Gauge())
+    return gauge
+
+
+def enable() -> None:
+    """Start tracking entrypoint and step calls."""
+    global _enabled
+    add_observer_factory(_Tracker, include_sync=True)
+    _enabled = True
+
+
+def disable() -> None:
+    """Stop tracking and forget the flows in flight.  Limits are kept."""
+    global _enabled
+    remove_observer_factory(_Tracker)
+    _enabled = False
+    for lock, flows in _stripes:
+        with lock:
+            flows.clear()
+    for gauge in list(_gauges.values()):
+        with gauge.lock:
+            gauge.in_flight = 0
+
+
+def reset() -> None:
+    """Discard the limits and rejection counts."""
+    for gauge in list(_gauges.values()):
+        with gauge.lock:
+            gauge.limit = None
+            gauge.rejected = 0
+
+
+def is_enabled() -> bool:
+    """Return whether flows are currently being tracked."""
+    return _enabled
+
+
+def set_limit(flow_name: str, max_in_flight: int | None) -> None:
+    """Refuse entrypoint calls of *flow_name* beyond *max_in_flight* in flight.
+
+    ``None`` removes the limit.  Only enforced while the tracker is enabled.
+    """
+    if max_in_flight is not None and max_in_flight <= 0:
+        raise ValueError(f"max_in_flight must be positive, got {max_in_flight!r}")
+    gauge = _gauge(flow_name)
+    with gauge.lock:
+        gauge.limit = max_in_flight
+
+
+def in_flight() -> list[InFlightFlow]:
+    """Return the running flows, oldest first."""
+    now = time.monotonic()
+    snapshot: list[InFlightFlow] = []
+    for lock, flows in _stripes:
+        with lock:
+            snapshot.extend(_view(f, now) for f in flows.values())
+    snapshot.sort(key=lambda f: f.age_s, reverse=True)
+    return snapshot
+
+
+def current() -> InFlightFlow | None:
+    """Return the flow the caller is running in, if it is tracked."""
+    ctx = get_flow_context()
+    if ctx is None:
+        return None
+    lock, flows = _stripe(ctx)
+    with lock:
+        flow = flows.get(ctx)
+        return _view(flow, time.monotonic()) if flow is not None else None
+
+
+def _view(flow: _Flow, now: float) -> InFlightFlow:
+    # Called with the flow's stripe lock held.
+    if flow.running:
+        step, since = flow.running[-1]
+    else:
+        step, since = flow.entrypoint, flow.idle_since
+    return InFlightFlow(
+        flow.flow_name, flow.correlation_id, step, now - flow.started, now - since
+    )
+
+
+def stuck(threshold_s: float) -> list[InFlightFlow]:
+    """Return the running flows that have been in one step for *threshold_s*."""
+    return [f for f in in_flight() if f.step_age_s >= threshold_s]
+
+
+def gauges() -> dict[str, FlowGauge]:
+    """Return the live counters of every flow seen or limited, keyed by name."""
+    oldest: dict[str, float] = {}
+    for flow in in_flight():
+        oldest.setdefault(flow.flow_name, flow.age_s)
+    result: dict[str, FlowGauge] = {}
+    for flow_name, gauge in list(_gauges.items()):
+        with gauge.lock:
+            result[flow_name] = FlowGauge(
+                gauge.in_flight, oldest.get(flow_name), gauge.rejected, gauge.limit
+            )
+    return result
+
+
+def _admit(flow_name: str, entrypoint: str, ctx: FlowContext) -> None:
+    """Add a flow starting at *entrypoint* to the table, or refuse it."""
+    gauge = _gauge(flow_name)
+    with gauge.lock:
+        if gauge.limit is not None and gauge.in_flight >= gauge.limit:
+            gauge.rejected += 1
+            raise FlowRejected(
+                f"Flow '{flow_name}' already has {gauge.in_flight} calls "
+                f"in flight (limit {gauge.limit})"
+            )
+        gauge.in_flight += 1
+    lock, flows = _stripe(ctx)
+    with lock:
+        flows[ctx] = _Flow(flow_name, ctx.correlation_id, entrypoint, gauge)
+
+
+def _release(ctx: FlowContext) -> None:
+    """Remove the flow started with *ctx*, if it is in the table."""
+    lock, flows = _stripe(ctx)
+    with lock:
+        flow = flows.pop(ctx, None)
+    if flow is not None:
+        with flow.gauge.lock:
+            flow.gauge.in_flight = max(flow.gauge.in_flight - 1, 0)
+
+
+class _Tracker(BaseObserver):
+    """Resume observer that marks one step call as running in its flow."""
+
+    __slots__ = ("_call", "_flow", "_lock")
+
+    def __init__(self, _flow_name: str, step_name: str, ctx: FlowContext) -> None:
+        self._lock, flows = _stripe(ctx)
+        self._call = (step_name, time.monotonic())
+        with self._lock:
+            flow = self._flow = flows.get(ctx)
+            if flow is not None:
+                flow.running.append(self._call)
+
+    def finished(self) -> None:
+        flow = self._flow
+        if flow is None:
+            return
+        with self._lock:
+            running = flow.running
+            for i, call in enumerate(running):
+                if call is self._call:
+                    del running[i]
+                    break
+            if not running:
+                flow.idle_since = time.monotonic()
@@ -0,0 +1,276 @@
+"""Per-step concurrency limits and timeouts (bulkheads).
+
+Give a step that calls a slow dependency its own limits, so it can't take
+all of a worker's capacity::
+
+    @step("checkout", after="validate", max_concurrency=8, timeout=2.0)
+    async def reserve_stock(order: Order) -> Reservation: ...
+
+At most *max_concurrency* calls of the step run at once; further calls
+queue, threads and asyncio tasks alike.  *timeout* is a deadline in seconds
+for the whole call.  A call that is still queued when it passes raises
+:class:`StepRejected`, and an async step still running raises
+:class:`TimeoutError`.  A sync step can't be interrupted, so for it the
+timeout only bounds the queue wait.
+
+The step's span gets ``queue_wait_ms`` and, when the limits kicked in,
+``rejected`` or ``timed_out``.  :func:`report` exposes the live in-flight
+and queued counts, and :func:`set_limits` changes the limits at runtime.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any
+
+from penstock._config import get_backend
+from penstock._context import get_flow_context
+
+
+class StepRejected(TimeoutError):
+    """A step call waited for a free slot past its timeout."""
+
+
+@dataclass(slots=True)
+class LimitStats:
+    """Limits and live counters of one step."""
+
+    max_concurrency: int | None
+    timeout: float | None
+    in_flight: int = 0
+    queued: int = 0
+    rejected: int = 0
+    """Calls that gave up waiting for a slot."""
+    timed_out: int = 0
+    """Async calls cancelled for running past the timeout."""
+
+
+_UNSET: Any = object()
+_lock = threading.Lock()
+_limiters: dict[tuple[str, str], _Limiter] = {}
+
+
+def _check(max_concurrency: int | None, timeout: float | None) -> None:
+    if max_concurrency is not None and max_concurrency <= 0:
+        raise ValueError(f"max_concurrency must be positive, got {max_concurrency!r}")
+    if timeout is not None and timeout <= 0:
+        raise ValueError(f"timeout must be positive, got {timeout!r}")
+
+
+def _annotate(**attrs: Any) -> None:
+    ctx = get_flow_context()
+    if ctx is not None and ctx.sampled is not False:
+        get_backend().set_span_attributes(**attrs)
+
+
+class _Limiter:
+    """Counting semaphore shared by threads and event loops.
+
+    Waiters queue in FIFO order on :class:`concurrent.futures.Future`
+    objects, and a released slot is handed straight to the next one.
+    """
+
+    def __init__(self, max_concurrency: int | None, timeout: float | None) -> None:
+        self._lock = threading.Lock()
+        self._waiters: deque[Future[None]] = deque()
+        self._stats = LimitStats(max_concurrency, timeout)
+
+    @property
+    def timeout(self) -> float | None:
+        return self._stats.timeout
+
+    def configure(self, max_concurrency: int | None, timeout: float | None) -> None:
+        with self._lock:
+            self._stats.max_concurrency = max_concurrency
+            self._stats.timeout = timeout
+            self._grant()
+
+    def stats(self) -> LimitStats:
+        with self._lock:
+            s = self._stats
+            return LimitStats(
+                s.max_concurrency,
+                s.timeout,
+                s.in_flight,
+                len(self._waiters),
+                s.rejected,
+                s.timed_out,
+            )
+
+    def _grant(self) -> None:
+        # Called with the lock held.  Lowering the limit leaves calls that
+        # are already running alone; it takes effect as they finish.
+        limit = self._stats.max_concurrency
+        while self._waiters and (limit is None or self._stats.in_flight < limit):
+            self._stats.in_flight += 1
+            self._waiters.popleft().set_result(None)
+
+    def _enqueue(self) -> Future[None] | None:
+        """Take a slot and return None, or return a future to wait on."""
+        with self._lock:
+            limit = self._stats.max_concurrency
+            if not self._waiters and (limit is None or self._stats.in_flight < limit):
+                self._stats.in_flight += 1
+                return None
+            waiter: Future[None] = Future()
+            # Running futures can't be cancelled, so only _grant settles it.
+            waiter.set_running_or_notify_cancel()
+            self._waiters.append(waiter)
+            return waiter
+
+    def _abandon(self, waiter: Future[None], timed_out: bool) -> None:
+        """Withdraw *waiter*, giving back the slot if it was granted meanwhile."""
+        with self._lock:
+            self._stats.rejected += timed_out
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                return
+        self.release()
+
+    def release(self) -> None:
+        with self._lock:
+            self._stats.in_flight -= 1
+            self._grant()
+
+    def count_timeout(self) -> None:
+        with self._lock:
+            self._stats.timed_out += 1
+
+    def acquire(self, deadline: float | None) -> None:
+        waiter = self._enqueue()
+        if waiter is None:
+            return
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            waiter.result(timeout)
+        except TimeoutError:
+            self._abandon(waiter, timed_out=True)
+            raise StepRejected("no free slot before the timeout") from None
+        except BaseException:
+            self._abandon(waiter, timed_out=False)
+            raise
+
+    async def aacquire(self, deadline: float | None) -> None:
+        waiter = self._enqueue()
+        if waiter is None:
+            return
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(waiter), timeout)
+        except TimeoutError:
+            self._abandon(waiter, timed_out=True)
+            raise StepRejected("no free slot before the timeout") from None
+        except BaseException:
+            self._abandon(waiter, timed_out=False)
+            raise
+
+    def wrap(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Return *fn* limited by this limiter, annotating the current span."""
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_limited(*args: Any, **kwargs: Any) -> Any:
+                start = time.monotonic()
+                timeout = self.timeout
+                deadline = None if timeout is None else start + timeout
+                try:
+                    await self.aacquire(deadline)
+                except StepRejected:
+                    _annotate(rejected=True)
+                    raise
+                _annotate(queue_wait_ms=round((time.monotonic() - start) * 1000, 3))
+                try:
+                    if deadline is None:
+                        return await fn(*args, **kwargs)
+                    loop_deadline = asyncio.get_running_loop().time() + (
+                        deadline - time.monotonic()
+                    )
+                    expiry = asyncio.timeout_at(loop_deadline)
+                    try:
+                        async with expiry:
+                            return await fn(*args, **kwargs)
+                    except TimeoutError:
+                        if not expiry.expired():
+                            raise
+                        self.count_timeout()
+                        _annotate(timed_out=True)
+                        raise
+                finally:
+                    self.release()
+
+            return async_limited
+
+        @functools.wraps(fn)
+        def limited(*args: Any, **kwargs: Any) -> Any:
+            start = time.monotonic()
+            timeout = self.timeout
+            deadline = None if timeout is None else start + timeout
+            try:
+                self.acquire(deadline)
+            except StepRejected:
+                _annotate(rejected=True)
+                raise
+            _annotate(queue_wait_ms=round((time.monotonic() - start) * 1000, 3))
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.release()
+
+        return limited
+
+
+def _bind(
+    flow_name: str,
+    step_name: str,
+    max_concurrency: int | None,
+    timeout: float | None,
+) -> _Limiter:
+    _check(max_concurrency, timeout)
+    limiter = _Limiter(max_concurrency, timeout)
+    with _lock:
+        _limiters[flow_name, step_name] = limiter
+    return limiter
+
+
+def set_limits(
+    flow_name: str,
+    step_name: str,
+    *,
+    max_concurrency: int | None = _UNSET,
+    timeout: float | None = _UNSET,
+) -> None:
+    """Change the limits of a step declared with ``max_concurrency`` or ``timeout``.
+
+    Arguments that aren't passed keep their current value; ``None`` removes
+    that limit.  Raising the concurrency limit lets queued calls start right
+    away, and calls already running are never interrupted.
+    """
+    with _lock:
+        limiter = _limiters.get((flow_name, step_name))
+    if limiter is None:
+        raise KeyError(
+            f"Step '{step_name}' in flow '{flow_name}' has no limits; "
+            "declare it with max_concurrency= or timeout="
+        )
+    current = limiter.stats()
+    if max_concurrency is _UNSET:
+        max_concurrency = current.max_concurrency
+    if timeout is _UNSET:
+        timeout = current.timeout
+    _check(max_concurrency, timeout)
+    limiter.configure(max_concurrency, timeout)
+
+
+def report() -> dict[tuple[str, str], LimitStats]:
+    """Return the limits and live counters of every limited step."""
+    with _lock:
+        limiters = list(_limiters.items())
+    return {owner: limiter.stats() for owner, limiter in limiters}
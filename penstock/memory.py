@@ -0,0 +1,170 @@
+"""Per-step memory allocation accounting via ``tracemalloc``.
+
+Switch it on for a few minutes on one worker to find which business step
+is growing its memory::
+
+    from penstock import memory
+
+    memory.enable()
+    ...
+    for (flow, step), stats in memory.report().items():
+        print(flow, step, stats.calls, stats.net_bytes, stats.peak_bytes)
+    memory.disable()
+
+While enabled, every step reads the ``tracemalloc`` counters when it starts
+or resumes and when it returns or suspends, so async steps are only charged
+for the allocations made while they run.  Each sampled step span gets
+``mem_net_bytes`` (bytes still allocated when the step finished) and
+``mem_peak_bytes`` (the highest point above its starting usage) attributes,
+and :func:`report` aggregates both per ``(flow, step)``.
+
+``tracemalloc`` counts allocations process-wide, so steps running
+concurrently in other threads are charged for each other's allocations.
+Steps that are running when accounting is switched off or on again are
+left out of the report.
+"""
+
+from __future__ import annotations
+
+import threading
+import tracemalloc
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from penstock._instrument import (
+    BaseObserver,
+    add_observer_factory,
+    remove_observer_factory,
+)
+
+if TYPE_CHECKING:
+    from penstock._context import FlowContext
+
+
+@dataclass(slots=True)
+class MemoryStats:
+    """Aggregated allocations of one ``(flow, step)`` pair."""
+
+    calls: int = 0
+    net_bytes: int = 0
+    """Sum of the bytes each call left allocated."""
+    peak_bytes: int = 0
+    """Largest peak above its starting usage seen in a single call."""
+
+
+_lock = threading.Lock()
+_enabled = False
+_started_tracing = False
+# Bumped by enable() and disable(), so a step measured across a switch can
+# tell that its counters are no longer comparable.
+_generation = 0
+_stats: dict[tuple[str, str], MemoryStats] = {}
+# Thread ident -> innermost step being measured on that thread.
+_running: dict[int, _MemoryWatch] = {}
+
+
+def enable(*, frames: int = 1) -> None:
+    """Start accounting.  Starts ``tracemalloc`` with *frames* if needed."""
+    global _enabled, _started_tracing, _generation
+    with _lock:
+        _generation += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            _started_tracing = True
+        add_observer_factory(_MemoryWatch, include_sync=True)
+        _enabled = True
+
+
+def disable() -> None:
+    """Stop accounting, and ``tracemalloc`` if :func:`enable` started it.
+
+    The aggregated report is kept until :func:`reset`.
+    """
+    global _enabled, _started_tracing, _generation
+    with _lock:
+        _generation += 1
+        remove_observer_factory(_MemoryWatch)
+        _enabled = False
+        if _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+def is_enabled() -> bool:
+    """Return whether steps are currently being measured."""
+    return _enabled
+
+
+def report() -> dict[tuple[str, str], MemoryStats]:
+    """Return a copy of the aggregated stats keyed by ``(flow, step)``."""
+    with _lock:
+        return {
+            key: MemoryStats(s.calls, s.net_bytes, s.peak_bytes)
+            for key, s in _stats.items()
+        }
+
+
+def reset() -> None:
+    """Discard the aggregated stats."""
+    with _lock:
+        _stats.clear()
+
+
+class _MemoryWatch(BaseObserver):
+    """Resume observer that accumulates one step call's allocations."""
+
+    __slots__ = ("_base", "_generation", "_key", "_outer", "_stale", "net", "peak")
+
+    def __init__(self, flow_name: str, step_name: str, _ctx: FlowContext) -> None:
+        self._key = (flow_name, step_name)
+        self._outer: _MemoryWatch | None = None
+        self._generation = _generation
+        self._stale = False
+        self._base = 0
+        self.net = 0
+        self.peak = 0
+
+    def _check(self) -> bool:
+        """Return whether the counters still measure this step's stretch."""
+        if self._generation != _generation or not tracemalloc.is_tracing():
+            self._stale = True
+        return not self._stale
+
+    def resumed(self) -> None:
+        tid = threading.get_ident()
+        if not self._check():
+            self._outer = _running.get(tid)
+            _running[tid] = self
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        outer = self._outer = _running.get(tid)
+        _running[tid] = self
+        if outer is not None and not outer._stale:
+            # The peak counter is about to be reset; fold what it saw so far
+            # into the enclosing step first.
+            outer.peak = max(outer.peak, peak - outer._base)
+        tracemalloc.reset_peak()
+        self._base = current
+
+    def suspended(self, run_ns: int) -> None:  # noqa: ARG002
+        if self._check():
+            current, peak = tracemalloc.get_traced_memory()
+            self.net += current - self._base
+            self.peak = max(self.peak, peak - self._base)
+        tid = threading.get_ident()
+        if self._outer is None:
+            _running.pop(tid, None)
+        else:
+            _running[tid] = self._outer
+
+    def finished(self) -> dict[str, Any] | None:
+        if not self._check():
+            return None
+        with _lock:
+            stats = _stats.get(self._key)
+            if stats is None:
+                stats = _stats[self._key] = MemoryStats()
+            stats.calls += 1
+            stats.net_bytes += self.net
+            stats.peak_bytes = max(stats.peak_bytes, self.peak)
+        return {"mem_net_bytes": self.net, "mem_peak_bytes": self.peak}
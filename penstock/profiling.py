@@ -0,0 +1,179 @@
+"""Flow-aware sampling profiler.
+
+A background thread walks ``sys._current_frames()`` at a fixed rate and
+attributes each stack sample to the flow and step running on that thread.
+The decorators publish a per-thread marker for this while the profiler
+runs; threads outside any step are not sampled.  Samples are aggregated
+into collapsed stacks (the input format of ``flamegraph.pl`` and
+speedscope), one file per flow::
+
+    from penstock.profiling import FlowProfiler
+
+    with FlowProfiler(hz=200) as profiler:
+        run_load_test()
+    profiler.write("profiles/")  # profiles/order_processing.collapsed
+
+Each collapsed stack starts with a ``step:<name>`` frame so the flamegraph
+groups time by business step before showing the code underneath.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import TYPE_CHECKING
+
+from penstock._instrument import (
+    BaseObserver,
+    add_observer_factory,
+    remove_observer_factory,
+)
+
+if TYPE_CHECKING:
+    from penstock._context import FlowContext
+
+# Thread ident -> (flow_name, step_name) of the step running on that thread.
+_current: dict[int, tuple[str, str]] = {}
+_active: FlowProfiler | None = None
+_lock = threading.Lock()
+
+
+class _StepMarker(BaseObserver):
+    """Publishes the running step in ``_current`` for the sampler thread."""
+
+    __slots__ = ("_marker", "_previous")
+
+    def __init__(self, flow_name: str, step_name: str, _ctx: FlowContext) -> None:
+        self._marker = (flow_name, step_name)
+        self._previous: tuple[str, str] | None = None
+
+    def resumed(self) -> None:
+        tid = threading.get_ident()
+        self._previous = _current.get(tid)
+        _current[tid] = self._marker
+
+    def suspended(self, run_ns: int) -> None:  # noqa: ARG002
+        tid = threading.get_ident()
+        if self._previous is None:
+            _current.pop(tid, None)
+        else:
+            _current[tid] = self._previous
+
+
+class FlowProfiler:
+    """Samples the stacks of threads running flow steps at *hz* per second.
+
+    Only one profiler can run at a time.  Stacks deeper than *max_depth*
+    frames keep their innermost frames.
+    """
+
+    def __init__(self, hz: float = 100.0, *, max_depth: int = 128) -> None:
+        if hz <= 0:
+            raise ValueError(f"hz must be positive, got {hz!r}")
+        self.hz = hz
+        self.max_depth = max_depth
+        self._samples: dict[str, Counter[str]] = {}
+        self._names: dict[CodeType, str] = {}
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # -- lifecycle ------------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the sampler thread.  Raises if another profiler is running."""
+        global _active
+        with _lock:
+            if _active is not None:
+                raise RuntimeError("A FlowProfiler is already running")
+            _active = self
+            self._stopped.clear()
+            add_observer_factory(_StepMarker, include_sync=True)
+            self._thread = threading.Thread(
+                target=self._run, name="penstock-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling.  Collected samples are kept."""
+        global _active
+        with _lock:
+            if _active is not self:
+                return
+            remove_observer_factory(_StepMarker)
+            self._stopped.set()
+            _active = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> FlowProfiler:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+    # -- results --------------------------------------------------------------
+
+    def flows(self) -> list[str]:
+        """Return the names of flows with at least one sample."""
+        return sorted(self._samples)
+
+    def collapsed(self, flow_name: str) -> dict[str, int]:
+        """Return ``{collapsed_stack: sample_count}`` for *flow_name*."""
+        return dict(self._samples.get(flow_name, {}))
+
+    def write(self, directory: str | Path) -> list[Path]:
+        """Write one ``<flow>.collapsed`` file per flow into *directory*."""
+        out = Path(directory)
+        out.mkdir(parents=True, exist_ok=True)
+        paths: list[Path] = []
+        for flow_name in self.flows():
+            path = out / f"{flow_name}.collapsed"
+            lines = [
+                f"{stack} {count}"
+                for stack, count in sorted(self._samples[flow_name].items())
+            ]
+            path.write_text("\n".join(lines) + "\n")
+            paths.append(path)
+        return paths
+
+    def clear(self) -> None:
+        """Discard all collected samples."""
+        self._samples.clear()
+
+    # -- sampling -------------------------------------------------------------
+
+    def _run(self) -> None:
+        interval = 1.0 / self.hz
+        own = threading.get_ident()
+        while not self._stopped.wait(interval):
+            markers = list(_current.items())
+            if not markers:
+                continue
+            frames = sys._current_frames()
+            for tid, (flow_name, step_name) in markers:
+                frame = frames.get(tid)
+                if frame is None or tid == own:
+                    continue
+                stack = self._collapse(frame)
+                counter = self._samples.setdefault(flow_name, Counter())
+                counter[f"step:{step_name};{stack}"] += 1
+
+    def _collapse(self, frame: FrameType) -> str:
+        """Render *frame* and its callers root-first, ``;``-separated."""
+        names: list[str] = []
+        current: FrameType | None = frame
+        while current is not None and len(names) < self.max_depth:
+            code = current.f_code
+            name = self._names.get(code)
+            if name is None:
+                label = f"{code.co_qualname} ({Path(code.co_filename).name})"
+                name = self._names[code] = label.replace(";", ":")
+            names.append(name)
+            current = current.f_back
+        names.reverse()
+        return ";".join(names)
@@ -0,0 +1,98 @@
+"""Head-based samplers that decide, once per flow, whether to emit spans.
+
+The decision is made by ``@entrypoint`` when a flow starts and stored on the
+:class:`~penstock._context.FlowContext`.  Every ``@step`` in an unsampled
+flow skips the backend entirely, and the decision is propagated through the
+Celery and Django integrations so distributed flows are sampled consistently.
+
+Usage::
+
+    from penstock import configure
+    from penstock.sampling import RateSampler
+
+    configure("logging", sampler=RateSampler(0.01, per_flow={"checkout": 1.0}))
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from typing import override
+
+from penstock._bucket import TokenBucket
+
+
+class Sampler(ABC):
+    """Interface for head-based sampling decisions."""
+
+    @abstractmethod
+    def should_sample(self, flow_name: str) -> bool:
+        """Return ``True`` if a new execution of *flow_name* should be traced."""
+
+
+class AlwaysOnSampler(Sampler):
+    """Samples every flow.  Equivalent to not configuring a sampler."""
+
+    @override
+    def should_sample(self, flow_name: str) -> bool:
+        return True
+
+
+class RateSampler(Sampler):
+    """Samples a fixed fraction of flows, optionally overridden per flow.
+
+    *rate* is the default probability in ``[0.0, 1.0]``; *per_flow* maps flow
+    names to their own probability.
+    """
+
+    def __init__(
+        self, rate: float, *, per_flow: Mapping[str, float] | None = None
+    ) -> None:
+        _check_rate(rate)
+        for value in (per_flow or {}).values():
+            _check_rate(value)
+        self.rate = rate
+        self.per_flow: dict[str, float] = dict(per_flow or {})
+
+    def should_sample(self, flow_name: str) -> bool:
+        rate = self.per_flow.get(flow_name, self.rate)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        return random.random() < rate
+
+
+class RateLimitingSampler(Sampler):
+    """Token-bucket sampler that caps sampled flows per second.
+
+    Each flow name gets its own bucket holding up to *burst* tokens (defaults
+    to *per_second*, and at least one), refilled continuously at *per_second*
+    tokens a second.  A flow is sampled when a token is available, so
+    ``RateLimitingSampler(0.1)`` samples one flow every ten seconds.
+    """
+
+    def __init__(self, per_second: float, *, burst: float | None = None) -> None:
+        if per_second <= 0:
+            raise ValueError(f"per_second must be positive, got {per_second!r}")
+        if burst is not None and burst < 1:
+            raise ValueError(f"burst must be at least 1, got {burst!r}")
+        self.per_second = per_second
+        self.burst = burst if burst is not None else max(per_second, 1.0)
+        self._lock = threading.Lock()
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def should_sample(self, flow_name: str) -> bool:
+        with self._lock:
+            bucket = self._buckets.get(flow_name)
+            if bucket is None:
+                bucket = TokenBucket(self.per_second, self.burst)
+                self._buckets[flow_name] = bucket
+            return bucket.take()
+
+
+def _check_rate(rate: float) -> None:
+    if not 0.0 <= rate <= 1.0:
+        raise ValueError(f"Sampling rate must be between 0 and 1, got {rate!r}")
@@ -0,0 +1,197 @@
+"""Event-loop blocking detector for async steps.
+
+A synchronous call inside an ``async def`` step stalls every other task on
+the event loop.  Once enabled, the watchdog times every stretch an async
+``@step`` or ``@entrypoint`` runs between two suspension points and reports
+the stretches longer than a threshold, naming the flow, step and correlation
+ID::
+
+    from penstock import watchdog
+
+    watchdog.enable(threshold_ms=50, capture_stack=True)
+
+Reports go to the ``penstock`` logger as ``loop.blocked`` warnings unless a
+custom *handler* is given.  When a step awaits another step, only the
+innermost one is reported for a given stretch.
+
+With *capture_stack* set, a daemon thread polls the running stretches and
+grabs the stack of any thread still blocked past the threshold, so the
+report shows the code that was blocking rather than where it returned.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from penstock._instrument import (
+    BaseObserver,
+    add_observer_factory,
+    remove_observer_factory,
+)
+
+if TYPE_CHECKING:
+    from penstock._context import FlowContext
+
+logger = logging.getLogger("penstock")
+
+
+@dataclass(frozen=True, slots=True)
+class LoopBlock:
+    """A stretch during which an async step blocked the event loop."""
+
+    flow_name: str
+    step_name: str
+    correlation_id: str
+    duration_ms: float
+    stack: str | None = None
+
+
+_lock = threading.Lock()
+_threshold_ns = 0
+_handler: Callable[[LoopBlock], None] | None = None
+_monitor: _StackMonitor | None = None
+# Thread ident -> innermost stretch currently running on that thread.
+_running: dict[int, _LoopWatch] = {}
+
+
+def enable(
+    threshold_ms: float = 100.0,
+    *,
+    capture_stack: bool = False,
+    handler: Callable[[LoopBlock], None] | None = None,
+) -> None:
+    """Start reporting async step stretches longer than *threshold_ms*.
+
+    Calling it again replaces the previous settings.
+    """
+    global _threshold_ns, _handler, _monitor
+    with _lock:
+        _threshold_ns = int(threshold_ms * 1_000_000)
+        _handler = handler
+        if _monitor is not None:
+            _monitor.stop()
+            _monitor = None
+        if capture_stack:
+            _monitor = _StackMonitor(_threshold_ns)
+            _monitor.start()
+        add_observer_factory(_LoopWatch)
+
+
+def disable() -> None:
+    """Stop reporting.  Steps already running finish unobserved."""
+    global _monitor
+    with _lock:
+        remove_observer_factory(_LoopWatch)
+        if _monitor is not None:
+            _monitor.stop()
+            _monitor = None
+
+
+def _report(block: LoopBlock) -> None:
+    handler = _handler
+    if handler is not None:
+        handler(block)
+        return
+    logger.warning(
+        "loop.blocked",
+        extra={
+            "flow": block.flow_name,
+            "step": block.step_name,
+            "correlation_id": block.correlation_id,
+            "duration_ms": block.duration_ms,
+            "stack": block.stack,
+        },
+    )
+
+
+class _LoopWatch(BaseObserver):
+    """Resume observer for one async step call."""
+
+    __slots__ = (
+        "_outer",
+        "_stack",
+        "_start",
+        "_suppressed",
+        "correlation_id",
+        "flow_name",
+        "step_name",
+    )
+
+    def __init__(self, flow_name: str, step_name: str, ctx: FlowContext) -> None:
+        self.flow_name = flow_name
+        self.step_name = step_name
+        self.correlation_id = ctx.correlation_id
+        self._outer: _LoopWatch | None = None
+        self._start = 0
+        self._stack: tuple[int, str] | None = None
+        self._suppressed = False
+
+    def resumed(self) -> None:
+        tid = threading.get_ident()
+        self._outer = _running.get(tid)
+        _running[tid] = self
+        self._start = time.perf_counter_ns()
+
+    def suspended(self, run_ns: int) -> None:
+        tid = threading.get_ident()
+        if self._outer is None:
+            _running.pop(tid, None)
+        else:
+            _running[tid] = self._outer
+        if self._suppressed:
+            self._suppressed = False
+            return
+        if run_ns < _threshold_ns:
+            return
+        outer = self._outer
+        while outer is not None:
+            outer._suppressed = True
+            outer = outer._outer
+        stack = None
+        if self._stack is not None and self._stack[0] == self._start:
+            stack = self._stack[1]
+        _report(
+            LoopBlock(
+                flow_name=self.flow_name,
+                step_name=self.step_name,
+                correlation_id=self.correlation_id,
+                duration_ms=run_ns / 1e6,
+                stack=stack,
+            )
+        )
+
+
+class _StackMonitor(threading.Thread):
+    """Daemon thread that captures the stack of stretches past the threshold."""
+
+    def __init__(self, threshold_ns: int) -> None:
+        super().__init__(name="penstock-watchdog", daemon=True)
+        self._threshold_ns = threshold_ns
+        self._stopped = threading.Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self) -> None:
+        interval = max(self._threshold_ns / 2e9, 0.001)
+        while not self._stopped.wait(interval):
+            now = time.perf_counter_ns()
+            frames = None
+            for tid, watch in list(_running.items()):
+                start = watch._start
+                if now - start < self._threshold_ns:
+                    continue
+                if watch._stack is not None and watch._stack[0] == start:
+                    continue
+                if frames is None:
+                    frames = sys._current_frames()
+                frame = frames.get(tid)
+                if frame is not None:
+                    watch._stack = (start, "".join(traceback.format_stack(frame)))
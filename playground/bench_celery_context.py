@@ -0,0 +1,55 @@
+"""Benchmark: the Celery ``penstock_context`` header against plain JSON.
+
+Run with ``python -m playground.bench_celery_context``.
+"""
+
+import json
+import timeit
+
+from penstock.contrib.celery import _decode_metadata, _encode_metadata
+
+PAYLOADS = {
+    "small": {"tenant": "acme", "user_id": 42},
+    "typical": {
+        "tenant": "acme",
+        "user_id": 421337,
+        "locale": "de-DE",
+        "plan": "enterprise",
+        "feature_flags": ["new_checkout", "fast_search"],
+        "request_path": "/api/v2/orders/8f3a2c/confirm",
+        "client": "ios/5.12.1",
+    },
+    "large": {f"key_{i}": f"value number {i} for München" for i in range(40)},
+}
+
+
+def per_call_ns(stmt: object, number: int = 50_000) -> float:
+    best = min(timeit.repeat(stmt, number=number, repeat=5))  # type: ignore[call-overload]
+    return best / number * 1e9
+
+
+def main() -> None:
+    print(f"{'payload':<10}{'codec':<10}{'bytes':>7}{'encode':>10}{'decode':>10}")
+    for name, payload in PAYLOADS.items():
+        plain = json.dumps(payload)
+        compact = _encode_metadata(payload)
+        assert compact is not None
+        rows = [
+            ("json", plain, lambda p=payload: json.dumps(p), json.loads),
+            (
+                "penstock",
+                compact,
+                lambda p=payload: _encode_metadata(p),
+                _decode_metadata,
+            ),
+        ]
+        for codec, encoded, encode, decode in rows:
+            print(
+                f"{name:<10}{codec:<10}{len(encoded.encode()):>7}"
+                f"{per_call_ns(encode):>8.0f}ns"
+                f"{per_call_ns(lambda e=encoded, d=decode: d(e)):>8.0f}ns"
+            )
+
+
+if __name__ == "__main__":
+    main()
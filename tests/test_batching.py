@@ -0,0 +1,179 @@
+"""Tests for penstock._batching.batch_step."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from penstock._batching import batch_step
+from penstock._config import configure
+from penstock._context import current_flow_id
+from penstock._decorators import entrypoint
+
+
+class TestAsyncBatchStep:
+    def test_same_tick_calls_share_one_batch(self) -> None:
+        batches: list[list[str]] = []
+
+        @batch_step("parts", after="start")
+        async def fetch_part(part_numbers: list[str]) -> list[str]:
+            batches.append(part_numbers)
+            return [p.lower() for p in part_numbers]
+
+        @entrypoint("parts")
+        async def start(part: str) -> str:
+            result: str = await fetch_part(part)
+            return result
+
+        async def main() -> list[str]:
+            return list(await asyncio.gather(*(start(p) for p in "ABC")))
+
+        assert asyncio.run(main()) == ["a", "b", "c"]
+        assert batches == [["A", "B", "C"]]
+
+    def test_max_batch(self) -> None:
+        batches: list[list[int]] = []
+
+        @batch_step("capped", after="start", max_batch=2)
+        async def double(values: list[int]) -> list[int]:
+            batches.append(values)
+            return [v * 2 for v in values]
+
+        @entrypoint("capped")
+        async def start() -> list[int]:
+            return list(await asyncio.gather(*(double(v) for v in range(5))))
+
+        assert asyncio.run(start()) == [0, 2, 4, 6, 8]
+        assert batches == [[0, 1], [2, 3], [4]]
+
+    def test_window(self) -> None:
+        batches: list[list[int]] = []
+
+        @batch_step("windowed", after="start", window_ms=50)
+        async def load(values: list[int]) -> list[int]:
+            batches.append(values)
+            return values
+
+        @entrypoint("windowed")
+        async def start(v: int, delay: float) -> int:
+            await asyncio.sleep(delay)
+            result: int = await load(v)
+            return result
+
+        async def main() -> list[int]:
+            return list(await asyncio.gather(start(1, 0), start(2, 0.01)))
+
+        assert asyncio.run(main()) == [1, 2]
+        assert batches == [[1, 2]]
+
+    def test_exception_fans_out(self) -> None:
+        @batch_step("failing", after="start")
+        async def load(values: list[int]) -> list[int]:
+            raise ValueError("boom")
+
+        @entrypoint("failing")
+        async def start() -> list[int | BaseException]:
+            return list(await asyncio.gather(load(1), load(2), return_exceptions=True))
+
+        results = asyncio.run(start())
+        assert all(isinstance(r, ValueError) for r in results)
+
+    def test_wrong_result_count(self) -> None:
+        @batch_step("short", after="start")
+        async def load(values: list[int]) -> list[int]:
+            return []
+
+        @entrypoint("short")
+        async def start() -> None:
+            await load(1)
+
+        with pytest.raises(ValueError, match="returned 0 results for 1 keys"):
+            asyncio.run(start())
+
+    def test_spans_linked_to_batch(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging")
+
+        @batch_step("batch_spans", after="start")
+        async def load(values: list[int]) -> list[int]:
+            return values
+
+        @entrypoint("batch_spans")
+        async def start(v: int) -> str | None:
+            await load(v)
+            return current_flow_id()
+
+        async def main() -> list[str | None]:
+            return list(await asyncio.gather(start(1), start(2)))
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            flow_ids = asyncio.run(main())
+
+        ends = [
+            r
+            for r in caplog.records
+            if r.getMessage() == "step.end" and r.step == "load"  # type: ignore[attr-defined]
+        ]
+        callers = [r for r in ends if hasattr(r, "batch_id")]
+        batches = [r for r in ends if not hasattr(r, "batch_id")]
+        assert len(batches) == 1
+        assert batches[0].batch_size == 2  # type: ignore[attr-defined]
+        batch_id = batches[0].correlation_id  # type: ignore[attr-defined]
+        caller_ids = {r.correlation_id for r in callers}  # type: ignore[attr-defined]
+        assert caller_ids == set(flow_ids)
+        assert all(r.batch_id == batch_id for r in callers)
+
+    def test_requires_flow(self) -> None:
+        @batch_step("no_flow")
+        async def load(values: list[int]) -> list[int]:
+            return values
+
+        with pytest.raises(RuntimeError, match="outside of a flow context"):
+            asyncio.run(load(1))
+
+
+class TestThreadBatchStep:
+    def test_threads_share_batch_within_window(self) -> None:
+        batches: list[list[int]] = []
+
+        @batch_step("threaded", after="start", window_ms=100)
+        def square(values: list[int]) -> list[int]:
+            batches.append(values)
+            return [v * v for v in values]
+
+        @entrypoint("threaded")
+        def start(v: int) -> int:
+            result: int = square(v)
+            return result
+
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(start, range(4)))
+
+        assert results == [0, 1, 4, 9]
+        assert len(batches) == 1
+        assert sorted(batches[0]) == [0, 1, 2, 3]
+
+    def test_max_batch_flushes_early(self) -> None:
+        batches: list[list[int]] = []
+
+        @batch_step("threaded_cap", after="start", max_batch=2, window_ms=5000)
+        def load(values: list[int]) -> list[int]:
+            batches.append(values)
+            return values
+
+        @entrypoint("threaded_cap")
+        def start(v: int) -> int:
+            result: int = load(v)
+            return result
+
+        with ThreadPoolExecutor(2) as pool:
+            assert sorted(pool.map(start, [1, 2])) == [1, 2]
+        assert [sorted(b) for b in batches] == [[1, 2]]
+
+    def test_invalid_arguments(self) -> None:
+        with pytest.raises(ValueError, match="max_batch"):
+            batch_step("bad", max_batch=0)
+        with pytest.raises(ValueError, match="window_ms"):
+            batch_step("bad", window_ms=-1)
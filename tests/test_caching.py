@@ -0,0 +1,276 @@
+"""Tests for penstock.caching.StepCache and @step(cache=...)."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from penstock._config import configure
+from penstock._dag import generate_dag
+from penstock._decorators import entrypoint, step
+from penstock.caching import CacheStats, StepCache, report
+
+
+class TestStepCache:
+    def test_hits_and_misses(self) -> None:
+        calls: list[str] = []
+        cache = StepCache()
+
+        @step("cached", after="start", cache=cache)
+        def lookup(sku: str) -> str:
+            calls.append(sku)
+            return sku.upper()
+
+        @entrypoint("cached")
+        def start() -> list[str]:
+            return [lookup("a"), lookup("b"), lookup("a"), lookup(sku="a")]
+
+        assert start() == ["A", "B", "A", "A"]
+        assert start() == ["A", "B", "A", "A"]
+        assert calls == ["a", "b", "a"]
+        assert cache.stats() == CacheStats(hits=5, misses=3)
+        assert report()["cached", "lookup"] == cache.stats()
+
+    def test_lru_eviction(self) -> None:
+        cache = StepCache(maxsize=2)
+
+        @step("lru", after="start", cache=cache)
+        def lookup(n: int) -> int:
+            return n
+
+        @entrypoint("lru")
+        def start() -> None:
+            lookup(1)
+            lookup(2)
+            lookup(1)  # 1 is now the most recently used
+            lookup(3)  # evicts 2
+            lookup(1)
+            lookup(2)
+
+        start()
+        stats = cache.stats()
+        assert (stats.hits, stats.misses, stats.evictions) == (2, 4, 2)
+        assert len(cache) == 2
+
+    def test_ttl(self) -> None:
+        cache = StepCache(ttl=0.05)
+
+        @step("ttl", after="start", cache=cache)
+        def lookup() -> float:
+            return time.monotonic()
+
+        @entrypoint("ttl")
+        def start() -> tuple[float, float, float]:
+            first, second = lookup(), lookup()
+            time.sleep(0.06)
+            return first, second, lookup()
+
+        first, second, third = start()
+        assert first == second
+        assert third > first
+
+    def test_per_flow(self) -> None:
+        calls = 0
+        cache = StepCache(per_flow=True)
+
+        @step("per_flow", after="start", cache=cache)
+        def lookup() -> int:
+            nonlocal calls
+            calls += 1
+            return calls
+
+        @entrypoint("per_flow")
+        def start() -> tuple[int, int]:
+            return lookup(), lookup()
+
+        assert start() == (1, 1)
+        assert start() == (2, 2)
+
+    def test_custom_key(self) -> None:
+        cache = StepCache(key=lambda order: order["id"])
+
+        @step("keyed", after="start", cache=cache)
+        def lookup(order: dict[str, str]) -> str:
+            return order["note"]
+
+        @entrypoint("keyed")
+        def start() -> tuple[str, str]:
+            return lookup({"id": "1", "note": "x"}), lookup({"id": "1", "note": "y"})
+
+        assert start() == ("x", "x")
+
+    def test_exceptions_not_cached(self) -> None:
+        calls = 0
+        cache = StepCache()
+
+        @step("errors", after="start", cache=cache)
+        def lookup() -> None:
+            nonlocal calls
+            calls += 1
+            raise ValueError("boom")
+
+        @entrypoint("errors")
+        def start() -> None:
+            lookup()
+
+        for _ in range(2):
+            with pytest.raises(ValueError, match="boom"):
+                start()
+        assert calls == 2
+        assert len(cache) == 0
+
+    def test_threads_share_in_flight_call(self) -> None:
+        calls = 0
+        release = threading.Event()
+        cache = StepCache()
+
+        @step("threads", after="start", cache=cache)
+        def lookup() -> int:
+            nonlocal calls
+            calls += 1
+            release.wait(2)
+            return 42
+
+        @entrypoint("threads")
+        def start() -> int:
+            return lookup()
+
+        with ThreadPoolExecutor(3) as pool:
+            futures = [pool.submit(start) for _ in range(3)]
+            time.sleep(0.1)
+            release.set()
+            assert [f.result() for f in futures] == [42, 42, 42]
+        assert calls == 1
+        assert cache.stats().shared == 2
+
+    def test_shared_error_raised_as_copies(self) -> None:
+        calls = 0
+        release = threading.Event()
+        cache = StepCache()
+
+        @step("shared_errors", after="start", cache=cache)
+        def lookup() -> None:
+            nonlocal calls
+            calls += 1
+            release.wait(2)
+            raise ValueError("boom")
+
+        @entrypoint("shared_errors")
+        def start() -> BaseException:
+            with pytest.raises(ValueError, match="boom") as info:
+                lookup()
+            return info.value
+
+        with ThreadPoolExecutor(3) as pool:
+            futures = [pool.submit(start) for _ in range(3)]
+            time.sleep(0.1)
+            release.set()
+            errors = [f.result() for f in futures]
+        assert calls == 1
+        assert len({id(e) for e in errors}) == 3
+
+    def test_async_tasks_share_in_flight_call(self) -> None:
+        calls = 0
+        cache = StepCache()
+
+        @step("async_cached", after="start", cache=cache)
+        async def lookup(n: int) -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.02)
+            return n * 2
+
+        @entrypoint("async_cached")
+        async def start() -> list[int]:
+            return list(await asyncio.gather(lookup(1), lookup(1), lookup(2)))
+
+        assert asyncio.run(start()) == [2, 2, 4]
+        assert asyncio.run(start()) == [2, 2, 4]
+        assert calls == 2
+        assert cache.stats() == CacheStats(hits=3, misses=2, shared=1)
+
+    def test_cancelled_leader_not_shared(self) -> None:
+        cache = StepCache()
+
+        @step("cancel_cached", after="start", cache=cache)
+        async def lookup(n: int) -> int:
+            await asyncio.sleep(0.05)
+            return n * 2
+
+        @entrypoint("cancel_cached")
+        async def start() -> int:
+            leader = asyncio.create_task(lookup(1))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(lookup(1))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        assert asyncio.run(start()) == 2
+        assert cache.stats() == CacheStats(hits=0, misses=2, shared=0)
+
+    def test_span_attribute(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging")
+
+        @step("cache_spans", after="start", cache=StepCache())
+        def lookup() -> None:
+            pass
+
+        @entrypoint("cache_spans")
+        def start() -> None:
+            lookup()
+            lookup()
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            start()
+
+        ends = [
+            r
+            for r in caplog.records
+            if r.getMessage() == "step.end" and r.step == "lookup"  # type: ignore[attr-defined]
+        ]
+        assert [r.cache for r in ends] == ["miss", "hit"]  # type: ignore[attr-defined]
+
+    def test_dag_shows_hit_rate(self) -> None:
+        @step("cache_dag", after="start", cache=StepCache())
+        def lookup() -> None:
+            pass
+
+        @entrypoint("cache_dag")
+        def start() -> None:
+            for _ in range(4):
+                lookup()
+
+        start()
+        diagram = generate_dag("cache_dag", cache_stats=True)
+        assert 'lookup["lookup<br/>cache 75% hit (3/4)"]' in diagram
+        assert "cache" not in generate_dag("cache_dag")
+
+    def test_cache_cannot_be_shared(self) -> None:
+        cache = StepCache()
+        step("shared", cache=cache)(lambda: None)
+        with pytest.raises(ValueError, match="already used"):
+
+            @step("shared", cache=cache)
+            def other() -> None:
+                pass
+
+    def test_not_with_process_executor(self) -> None:
+        with pytest.raises(ValueError, match="executor="):
+
+            @step("proc", cache=StepCache(), executor="process")
+            def lookup() -> None:
+                pass
+
+    def test_invalid_arguments(self) -> None:
+        with pytest.raises(ValueError, match="maxsize"):
+            StepCache(maxsize=0)
+        with pytest.raises(ValueError, match="ttl"):
+            StepCache(ttl=0)
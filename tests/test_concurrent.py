@@ -0,0 +1,321 @@
+"""Tests for penstock.concurrent."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterator
+
+import pytest
+
+from penstock._config import configure
+from penstock._context import current_flow_id, get_flow_context
+from penstock._decorators import entrypoint, step
+from penstock._instrument import (
+    WallTimer,
+    add_observer_factory,
+    remove_observer_factory,
+)
+from penstock.backends.logging import LoggingBackend
+from penstock.concurrent import (
+    FlowProcessPoolExecutor,
+    FlowThreadPoolExecutor,
+    carry_context,
+    configure_offload_pool,
+    configure_process_pool,
+    shutdown_offload_pool,
+    shutdown_process_pool,
+)
+
+
+def _flow_state() -> tuple[str | None, object, bool | None]:
+    ctx = get_flow_context()
+    if ctx is None:
+        return (None, None, None)
+    return (ctx.correlation_id, ctx.get_value("tenant"), ctx.sampled)
+
+
+@step("offloaded", after="render")
+def checksum(data: bytes) -> int:
+    return sum(data)
+
+
+@step("offloaded", after="start", executor="process")
+def render(size: int) -> tuple[int, str | None, int]:
+    return checksum(bytes(size)) + size, current_flow_id(), os.getpid()
+
+
+@step("offloaded", after="start", executor="process")
+def explode() -> None:
+    checksum(b"x")
+    raise ValueError("boom")
+
+
+@step("offloaded", after="start", executor="process", offload=True)
+def render_async(size: int) -> tuple[int, str | None, int]:
+    return checksum(bytes(size)) + size, current_flow_id(), os.getpid()
+
+
+class TestFlowThreadPoolExecutor:
+    def test_worker_sees_flow(self) -> None:
+        @entrypoint("threads")
+        def start() -> tuple[str | None, str | None]:
+            with FlowThreadPoolExecutor(max_workers=2) as pool:
+                return current_flow_id(), pool.submit(current_flow_id).result()
+
+        outer, inner = start()
+        assert outer is not None
+        assert inner == outer
+
+    def test_worker_steps_emit_spans(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging")
+
+        @step("threads_spans", after="start")
+        def charge(n: int) -> int:
+            return n * 2
+
+        @entrypoint("threads_spans")
+        def start() -> list[int]:
+            with FlowThreadPoolExecutor(max_workers=2) as pool:
+                return list(pool.map(charge, [1, 2, 3]))
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            assert start() == [2, 4, 6]
+
+        ends = [r for r in caplog.records if r.getMessage() == "step.end"]
+        charged = [r for r in ends if r.step == "charge"]  # type: ignore[attr-defined]
+        assert len(charged) == 3
+        cids = {r.correlation_id for r in ends}  # type: ignore[attr-defined]
+        assert len(cids) == 1
+
+    def test_no_flow_outside_entrypoint(self) -> None:
+        with FlowThreadPoolExecutor(max_workers=1) as pool:
+            assert pool.submit(current_flow_id).result() is None
+
+
+class TestFlowProcessPoolExecutor:
+    def test_worker_sees_flow(self) -> None:
+        @entrypoint("processes")
+        def start() -> tuple[tuple[str | None, object, bool | None], str | None]:
+            get_flow_context().set_value("tenant", "acme")  # type: ignore[union-attr]
+            with FlowProcessPoolExecutor(max_workers=1) as pool:
+                return pool.submit(_flow_state).result(), current_flow_id()
+
+        (cid, tenant, sampled), outer = start()
+        assert cid == outer
+        assert tenant == "acme"
+        assert sampled is True
+
+    def test_no_flow_outside_entrypoint(self) -> None:
+        with FlowProcessPoolExecutor(max_workers=1) as pool:
+            assert pool.submit(_flow_state).result() == (None, None, None)
+
+
+class TestCarryContext:
+    def test_run_in_executor(self) -> None:
+        @entrypoint("executor")
+        async def start() -> tuple[str | None, str | None]:
+            loop = asyncio.get_running_loop()
+            inner = await loop.run_in_executor(None, carry_context(current_flow_id))
+            return current_flow_id(), inner
+
+        outer, inner = asyncio.run(start())
+        assert inner == outer
+
+
+class TestProcessStep:
+    @pytest.fixture(autouse=True)
+    def _pool(self) -> Iterator[None]:
+        configure_process_pool(1, prestart=True)
+        yield
+        shutdown_process_pool()
+
+    def test_runs_in_worker_with_flow(self) -> None:
+        @entrypoint("offloaded")
+        def start() -> tuple[tuple[int, str | None, int], str | None]:
+            return render(3), current_flow_id()
+
+        (total, cid, pid), outer = start()
+        assert total == 3
+        assert cid == outer
+        assert pid != os.getpid()
+
+    def test_worker_spans_merged(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure(LoggingBackend(summary=True))
+
+        @entrypoint("offloaded")
+        def start() -> None:
+            render(3)
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            start()
+
+        summary = caplog.records[-1]
+        assert summary.step_count == 2  # type: ignore[attr-defined]
+        names = [s.split(":")[0] for s in summary.steps.split(";")]  # type: ignore[attr-defined]
+        assert names == ["checksum", "render"]
+
+    def test_worker_attributes(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging")
+
+        @entrypoint("offloaded")
+        def start() -> None:
+            render(3)
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            start()
+
+        end = next(
+            r
+            for r in caplog.records
+            if r.getMessage() == "step.end" and r.step == "render"  # type: ignore[attr-defined]
+        )
+        assert end.worker_pid != os.getpid()  # type: ignore[attr-defined]
+        assert end.worker_run_ns > 0  # type: ignore[attr-defined]
+
+    def test_exception_propagates_with_spans(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        configure("logging")
+
+        @entrypoint("offloaded")
+        def start() -> None:
+            explode()
+
+        with (
+            caplog.at_level(logging.INFO, logger="penstock"),
+            pytest.raises(ValueError, match="boom"),
+        ):
+            start()
+        steps = [r.step for r in caplog.records if r.getMessage() == "step.end"]  # type: ignore[attr-defined]
+        assert steps == ["checksum", "explode", "start"]
+
+    def test_exception_keeps_worker_traceback(self) -> None:
+        @entrypoint("offloaded")
+        def start() -> None:
+            explode()
+
+        with pytest.raises(ValueError, match="boom") as info:
+            start()
+        [note] = info.value.__notes__
+        assert "Raised in step worker" in note
+        assert 'raise ValueError("boom")' in note
+
+    def test_observers_see_the_call(self) -> None:
+        seen: list[tuple[str, int]] = []
+
+        def factory(_flow: str, step_name: str, _ctx: object) -> WallTimer:
+            return WallTimer(lambda ns: seen.append((step_name, ns)))
+
+        @entrypoint("offloaded")
+        def start() -> None:
+            render(3)
+
+        add_observer_factory(factory, include_sync=True)
+        try:
+            start()
+        finally:
+            remove_observer_factory(factory)
+        # checksum ran in the worker, where the parent's factories aren't set.
+        assert [name for name, _ in seen] == ["render", "start"]
+        assert all(ns > 0 for _, ns in seen)
+
+    def test_async_rejected(self) -> None:
+        with pytest.raises(TypeError, match="sync function"):
+
+            @step("offloaded", executor="process")
+            async def nope() -> None:
+                pass
+
+    def test_unknown_executor(self) -> None:
+        with pytest.raises(ValueError, match="Unknown executor"):
+            step("offloaded", executor="gpu")(checksum)  # type: ignore[call-overload]
+
+
+class TestOffloadStep:
+    @pytest.fixture(autouse=True)
+    def _pool(self) -> Iterator[None]:
+        configure_offload_pool(2)
+        yield
+        shutdown_offload_pool()
+
+    def test_does_not_block_loop(self) -> None:
+        @step("offload", after="start", offload=True)
+        def fetch() -> tuple[str | None, int]:
+            time.sleep(0.2)
+            return current_flow_id(), threading.get_ident()
+
+        @entrypoint("offload")
+        async def start() -> tuple[tuple[str | None, int], str | None, int]:
+            ticks = 0
+
+            async def tick() -> None:
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.create_task(tick())
+            result = await fetch()
+            ticker.cancel()
+            return result, current_flow_id(), ticks
+
+        (cid, tid), outer, ticks = asyncio.run(start())
+        assert cid == outer
+        assert tid != threading.get_ident()
+        assert ticks >= 5
+
+    def test_inline_without_loop(self) -> None:
+        @step("offload_sync", after="start", offload=True)
+        def fetch() -> int:
+            return threading.get_ident()
+
+        @entrypoint("offload_sync")
+        def start() -> int:
+            ident: int = fetch()
+            return ident
+
+        assert start() == threading.get_ident()
+
+    def test_span_in_flow(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging")
+
+        @step("offload_spans", after="start", offload=True)
+        def fetch() -> None:
+            pass
+
+        @entrypoint("offload_spans")
+        async def start() -> None:
+            await fetch()
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            asyncio.run(start())
+
+        ends = [r for r in caplog.records if r.getMessage() == "step.end"]
+        assert [r.step for r in ends] == ["fetch", "start"]  # type: ignore[attr-defined]
+        assert len({r.correlation_id for r in ends}) == 1  # type: ignore[attr-defined]
+
+    def test_combined_with_process_executor(self) -> None:
+        configure_process_pool(1)
+
+        @entrypoint("offloaded")
+        async def start() -> tuple[tuple[int, str | None, int], str | None]:
+            return await render_async(2), current_flow_id()
+
+        try:
+            (total, cid, pid), outer = asyncio.run(start())
+        finally:
+            shutdown_process_pool()
+        assert total == 2
+        assert cid == outer
+        assert pid != os.getpid()
+
+    def test_async_rejected(self) -> None:
+        with pytest.raises(TypeError, match="offload= requires a sync function"):
+
+            @step("offload", offload=True)
+            async def nope() -> None:
+                pass
@@ -0,0 +1,136 @@
+"""Tests for penstock.contrib.asgi.FlowASGIMiddleware."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import Any
+
+from penstock import entrypoint, step
+from penstock._context import current_flow_id, get_flow_context
+from penstock.contrib.asgi import FlowASGIMiddleware, Message, Receive, Scope, Send
+
+
+async def _receive() -> Message:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def _call(app: Any, headers: list[tuple[bytes, bytes]] | None = None) -> list[Message]:
+    sent: list[Message] = []
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": headers or []}
+
+    async def run() -> None:
+        await FlowASGIMiddleware(app)(scope, _receive, send)
+        assert get_flow_context() is None
+
+    asyncio.run(run())
+    return sent
+
+
+class TestFlowASGIMiddleware:
+    def test_context_kept_until_body_is_sent(self) -> None:
+        seen: list[str | None] = []
+
+        async def app(_scope: Scope, _receive: Receive, send: Send) -> None:
+            seen.append(current_flow_id())
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            for chunk in (b"a", b"b"):
+                await asyncio.sleep(0)
+                seen.append(current_flow_id())
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+            await send({"type": "http.response.body", "body": b""})
+
+        sent = _call(app)
+        cid = dict(sent[0]["headers"])[b"x-correlation-id"].decode()
+        assert seen == [cid] * 3
+        assert len(sent) == 4
+
+    def test_each_request_gets_unique_id(self) -> None:
+        seen: list[str | None] = []
+
+        async def app(_scope: Scope, _receive: Receive, _send: Send) -> None:
+            seen.append(current_flow_id())
+
+        _call(app)
+        _call(app)
+        assert seen[0] != seen[1]
+
+    def test_adopts_inbound_headers(self) -> None:
+        seen: list[tuple[bool | None, float | None]] = []
+
+        async def app(_scope: Scope, _receive: Receive, _send: Send) -> None:
+            ctx = get_flow_context()
+            assert ctx is not None
+            seen.append((ctx.sampled, ctx.deadline))
+
+        _call(
+            app,
+            [(b"x-penstock-sampled", b"0"), (b"x-penstock-deadline", b"1700000000.5")],
+        )
+        _call(app, [(b"x-penstock-deadline", b"soon")])
+        assert seen == [(False, 1700000000.5), (None, None)]
+
+    def test_adopts_correlation_id(self) -> None:
+        seen: list[str | None] = []
+
+        async def app(_scope: Scope, _receive: Receive, send: Send) -> None:
+            seen.append(current_flow_id())
+            await send({"type": "http.response.start", "status": 200})
+
+        sent = _call(app, [(b"X-Correlation-ID", b"gateway-1")])
+        assert seen == ["gateway-1"]
+        assert dict(sent[0]["headers"])[b"x-correlation-id"] == b"gateway-1"
+
+    def test_entrypoint_inherits_request_context(self) -> None:
+        seen: list[tuple[str | None, str | None]] = []
+        traceparent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+        @step("request")
+        def load() -> None:
+            ctx = get_flow_context()
+            assert ctx is not None
+            seen.append((ctx.correlation_id, ctx.traceparent))
+
+        @entrypoint("request")
+        def handle() -> None:
+            load()
+
+        async def app(_scope: Scope, _receive: Receive, _send: Send) -> None:
+            handle()
+            ctx = get_flow_context()
+            assert ctx is not None
+            seen.append((ctx.correlation_id, ctx.traceparent))
+
+        headers = [(b"x-correlation-id", b"gateway-1")]
+        _call(app, [*headers, (b"traceparent", traceparent.encode())])
+        assert seen == [("gateway-1", traceparent)] * 2
+
+    def test_resets_context_on_exception(self) -> None:
+        async def app(_scope: Scope, _receive: Receive, _send: Send) -> None:
+            raise ValueError
+
+        async def run() -> None:
+            with contextlib.suppress(ValueError):
+                await FlowASGIMiddleware(app)({"type": "http"}, _receive, _noop)
+            assert get_flow_context() is None
+
+        asyncio.run(run())
+
+    def test_lifespan_passes_through(self) -> None:
+        seen: list[str | None] = []
+
+        async def app(_scope: Scope, _receive: Receive, _send: Send) -> None:
+            seen.append(current_flow_id())
+
+        asyncio.run(FlowASGIMiddleware(app)({"type": "lifespan"}, _receive, _noop))
+        assert seen == [None]
+
+
+async def _noop(_message: Message) -> None:
+    pass
@@ -1,16 +1,38 @@
-"""Tests for penstock.contrib.celery.flow_task."""
+"""Tests for penstock.contrib.celery."""
 
 from __future__ import annotations
 
 import contextlib
+import json
+import logging
+import time
+from collections.abc import Iterator
+from typing import Any
 
+import pytest
+
+from penstock import inflight
+from penstock._config import configure
 from penstock._context import (
     FlowContext,
+    _reset_context,
     _set_context,
     current_flow_id,
     get_flow_context,
 )
-from penstock.contrib.celery import flow_task
+from penstock._dag import generate_dag
+from penstock._decorators import entrypoint, step
+from penstock.backends.logging import LoggingBackend
+from penstock.contrib.celery import (
+    _on_postrun,
+    _on_prerun,
+    _on_publish,
+    _running,
+    configure_context,
+    flow_canvas,
+    flow_task,
+)
+from penstock.deadlines import DeadlineExceeded
 
 
 class TestFlowTask:
@@ -78,6 +100,87 @@ class TestFlowTask:
         headers = my_task._penstock_headers()  # type: ignore[attr-defined]
         assert headers == {"penstock_correlation_id": "test-cid"}
 
+    def test_restores_sampling_decision_from_headers(self) -> None:
+        captured: list[bool | None] = []
+
+        @flow_task
+        def my_task() -> None:
+            ctx = get_flow_context()
+            assert ctx is not None
+            captured.append(ctx.sampled)
+
+        my_task(
+            __penstock_headers__={
+                "penstock_correlation_id": "cid",
+                "penstock_sampled": "0",
+            }
+        )
+        my_task(__penstock_headers__={"penstock_correlation_id": "cid"})
+        assert captured == [False, None]
+
+    def test_penstock_headers_include_sampling_decision(self) -> None:
+        @flow_task
+        def my_task() -> None:
+            pass
+
+        _set_context(FlowContext(correlation_id="cid", sampled=True))
+        headers = my_task._penstock_headers()  # type: ignore[attr-defined]
+        assert headers == {
+            "penstock_correlation_id": "cid",
+            "penstock_sampled": "1",
+        }
+
+    def test_deadline_round_trip(self) -> None:
+        captured: list[float | None] = []
+
+        @flow_task
+        def my_task() -> None:
+            ctx = get_flow_context()
+            assert ctx is not None
+            captured.append(ctx.deadline)
+
+        deadline = time.time() + 60
+        _set_context(FlowContext(correlation_id="cid", deadline=deadline))
+        headers = my_task._penstock_headers()  # type: ignore[attr-defined]
+        assert headers["penstock_deadline"] == repr(deadline)
+        my_task(__penstock_headers__=headers)
+        assert captured == [deadline]
+
+    def test_fails_fast_after_deadline(self) -> None:
+        calls: list[int] = []
+
+        @flow_task
+        def my_task() -> None:
+            calls.append(1)
+
+        headers = {
+            "penstock_correlation_id": "cid",
+            "penstock_deadline": repr(time.time() - 1),
+        }
+        with pytest.raises(DeadlineExceeded, match="my_task"):
+            my_task(__penstock_headers__=headers)
+        assert calls == []
+
+    def test_trace_context_round_trip(self) -> None:
+        captured: list[tuple[str, str | None, str | None]] = []
+
+        @flow_task
+        def my_task() -> None:
+            ctx = get_flow_context()
+            assert ctx is not None
+            captured.append((ctx.correlation_id, ctx.traceparent, ctx.tracestate))
+
+        traceparent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+        _set_context(
+            FlowContext(
+                correlation_id="cid", traceparent=traceparent, tracestate="rojo=1"
+            )
+        )
+        headers = my_task._penstock_headers()  # type: ignore[attr-defined]
+        assert headers["traceparent"] == traceparent
+        my_task(__penstock_headers__=headers)
+        assert captured == [("cid", traceparent, "rojo=1")]
+
     def test_preserves_return_value(self) -> None:
         @flow_task
         def my_task() -> str:
@@ -91,3 +194,357 @@ class TestFlowTask:
             pass
 
         assert my_task.__name__ == "my_task"
+
+
+class TestContextHeader:
+    @pytest.fixture(autouse=True)
+    def _default_config(self) -> Iterator[None]:
+        yield
+        configure_context()
+
+    @staticmethod
+    def _task() -> tuple[Any, list[dict[str, Any]]]:
+        captured: list[dict[str, Any]] = []
+
+        @flow_task
+        def my_task() -> None:
+            ctx = get_flow_context()
+            assert ctx is not None
+            captured.append(ctx.metadata)
+
+        return my_task, captured
+
+    def test_metadata_round_trip(self) -> None:
+        my_task, captured = self._task()
+        metadata = {"tenant": "acme", "user_id": 42, "flags": ["beta"], "ü": "ö"}
+        _set_context(FlowContext(correlation_id="cid", metadata=dict(metadata)))
+        headers = my_task._penstock_headers()
+        assert headers["penstock_context"] == json.dumps(
+            metadata, separators=(",", ":"), ensure_ascii=False
+        )
+        my_task(__penstock_headers__=headers)
+        assert captured == [metadata]
+
+    def test_metadata_reaches_entrypoints_in_the_task(self) -> None:
+        captured: list[tuple[str | None, dict[str, Any]]] = []
+
+        @entrypoint("report")
+        def handle() -> None:
+            ctx = get_flow_context()
+            assert ctx is not None
+            captured.append((ctx.correlation_id, dict(ctx.metadata)))
+
+        @flow_task
+        def my_task() -> None:
+            handle()
+
+        _set_context(FlowContext(correlation_id="cid", metadata={"tenant": "acme"}))
+        headers = my_task._penstock_headers()  # type: ignore[attr-defined]
+        _reset_context()
+        my_task(__penstock_headers__=headers)
+        assert captured == [("cid", {"tenant": "acme"})]
+
+    def test_no_header_without_metadata(self) -> None:
+        my_task, _ = self._task()
+        _set_context(FlowContext(correlation_id="cid"))
+        assert "penstock_context" not in my_task._penstock_headers()
+
+    def test_allow_list(self) -> None:
+        my_task, captured = self._task()
+        configure_context(["tenant"])
+        _set_context(
+            FlowContext(correlation_id="cid", metadata={"tenant": "a", "pii": "b"})
+        )
+        my_task(__penstock_headers__=my_task._penstock_headers())
+        assert captured == [{"tenant": "a"}]
+
+    def test_unserialisable_values_are_left_out(self) -> None:
+        my_task, captured = self._task()
+        _set_context(
+            FlowContext(correlation_id="cid", metadata={"obj": object(), "ok": 1})
+        )
+        my_task(__penstock_headers__=my_task._penstock_headers())
+        assert captured == [{"ok": 1}]
+
+    def test_size_cap(self) -> None:
+        my_task, captured = self._task()
+        configure_context(max_bytes=40)
+        _set_context(
+            FlowContext(
+                correlation_id="cid",
+                metadata={"a": "x" * 10, "big": "y" * 100, "b": "z" * 10},
+            )
+        )
+        headers = my_task._penstock_headers()
+        assert len(headers["penstock_context"]) <= 40
+        my_task(__penstock_headers__=headers)
+        assert captured == [{"a": "x" * 10, "b": "z" * 10}]
+
+    def test_malformed_header_is_ignored(self) -> None:
+        my_task, captured = self._task()
+        my_task(__penstock_headers__={"penstock_context": "{not json"})
+        my_task(__penstock_headers__={"penstock_context": "[1, 2]"})
+        assert captured == [{}, {}]
+
+    def test_invalid_max_bytes(self) -> None:
+        with pytest.raises(ValueError, match="max_bytes"):
+            configure_context(max_bytes=0)
+
+
+class _RecordingBackend(LoggingBackend):
+    def __init__(self) -> None:
+        super().__init__()
+        self.spans: list[tuple[str, str, int, int, dict[str, Any]]] = []
+
+    def record_span(
+        self,
+        step_name: str,
+        flow_name: str,
+        start_time_ns: int,
+        duration_ns: int,
+        **attrs: Any,
+    ) -> None:
+        self.spans.append((step_name, flow_name, start_time_ns, duration_ns, attrs))
+
+
+class _Request:
+    def __init__(self, headers: dict[str, Any]) -> None:
+        self.headers = headers
+        for name, value in headers.items():
+            setattr(self, name, value)
+
+
+class _Task:
+    name = "app.tasks.charge"
+
+    def __init__(self, headers: dict[str, Any]) -> None:
+        self.request = _Request(headers)
+
+
+class TestSignals:
+    @pytest.fixture(autouse=True)
+    def _backend(self) -> Iterator[_RecordingBackend]:
+        backend = _RecordingBackend()
+        configure(backend)
+        yield backend
+        _running.clear()
+        inflight.disable()
+        inflight.reset()
+
+    @staticmethod
+    def _publish() -> dict[str, Any]:
+        headers: dict[str, Any] = {}
+        _on_publish(headers=headers)
+        return headers
+
+    @staticmethod
+    def _run(headers: dict[str, Any], task_id: str = "t1") -> FlowContext | None:
+        task = _Task(headers)
+        _on_prerun(sender=task, task_id=task_id)
+        ctx = get_flow_context()
+        _on_postrun(sender=task, task_id=task_id)
+        return ctx
+
+    def test_no_headers_outside_flow(self) -> None:
+        assert self._publish() == {}
+
+    def test_stamps_publish_time(self) -> None:
+        _set_context(FlowContext(correlation_id="cid-1"))
+        before = time.time_ns()
+        headers = self._publish()
+        assert headers["penstock_correlation_id"] == "cid-1"
+        assert before <= int(headers["penstock_published_at"]) <= time.time_ns()
+        assert "penstock_parent_step" not in headers
+
+    def test_stamps_parent_step(self) -> None:
+        inflight.enable()
+
+        @step("checkout", after="start")
+        def enqueue() -> dict[str, Any]:
+            return self._publish()
+
+        @entrypoint("checkout")
+        def start() -> dict[str, Any]:
+            return enqueue()
+
+        headers = start()
+        assert headers["penstock_parent_flow"] == "checkout"
+        assert headers["penstock_parent_step"] == "enqueue"
+
+    def test_restores_and_clears_context(self, _backend: _RecordingBackend) -> None:
+        ctx = self._run({"penstock_correlation_id": "cid-1"})
+        assert ctx is not None
+        assert ctx.correlation_id == "cid-1"
+        assert get_flow_context() is None
+        assert _running == {}
+        [(name, flow, _, _, attrs)] = _backend.spans
+        assert (name, flow) == ("app.tasks.charge", "celery")
+        assert attrs["task_id"] == "t1"
+        assert "queue_wait_ms" not in attrs
+
+    def test_logs_under_task_context_after_body_resets_it(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        configure(LoggingBackend())
+        task = _Task({"penstock_correlation_id": "cid-1"})
+        _on_prerun(sender=task, task_id="t1")
+        _reset_context()
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            _on_postrun(sender=task, task_id="t1")
+        ends = [r for r in caplog.records if r.getMessage() == "step.end"]
+        assert [r.correlation_id for r in ends] == ["cid-1"]  # type: ignore[attr-defined]
+        assert get_flow_context() is None
+
+    def test_records_queue_wait(self, _backend: _RecordingBackend) -> None:
+        published = time.time_ns() - 50_000_000
+        self._run(
+            {
+                "penstock_correlation_id": "cid-1",
+                "penstock_published_at": str(published),
+                "penstock_parent_flow": "checkout",
+                "penstock_parent_step": "enqueue",
+            }
+        )
+        [(_, flow, start, duration, attrs)] = _backend.spans
+        assert flow == "checkout"
+        assert attrs["parent_step"] == "enqueue"
+        assert start == published
+        assert attrs["queue_wait_ms"] >= 50
+        assert attrs["end_to_end_ms"] == pytest.approx(
+            attrs["queue_wait_ms"] + attrs["run_ms"]
+        )
+        assert duration == pytest.approx(attrs["end_to_end_ms"] * 1e6, abs=1)
+
+    def test_clock_skew_clamps_queue_wait(self, _backend: _RecordingBackend) -> None:
+        future = time.time_ns() + 10_000_000_000
+        headers = {
+            "penstock_correlation_id": "cid-1",
+            "penstock_published_at": str(future),
+        }
+        self._run(headers)
+        assert _backend.spans[0][4]["queue_wait_ms"] == 0
+
+    def test_unsampled_flow_records_nothing(self, _backend: _RecordingBackend) -> None:
+        self._run({"penstock_correlation_id": "cid-1", "penstock_sampled": "0"})
+        assert _backend.spans == []
+        assert get_flow_context() is None
+
+    def test_tasks_without_penstock_headers_are_ignored(
+        self, _backend: _RecordingBackend
+    ) -> None:
+        assert self._run({}) is None
+        assert _backend.spans == []
+
+
+class _Signature:
+    subtask_type: str | None = None
+
+    def __init__(self, task: str, **options: Any) -> None:
+        self.task = task
+        self.options = options
+
+
+class _Group:
+    subtask_type = "group"
+
+    def __init__(self, *tasks: Any) -> None:
+        self.tasks = tasks
+
+
+class _Chain(_Group):
+    subtask_type = "chain"
+
+
+class _Chord:
+    subtask_type = "chord"
+
+    def __init__(self, tasks: list[Any], body: Any) -> None:
+        self.tasks = tasks
+        self.body = body
+
+
+class TestFlowCanvas:
+    @pytest.fixture(autouse=True)
+    def _backend(self) -> Iterator[_RecordingBackend]:
+        backend = _RecordingBackend()
+        configure(backend)
+        inflight.enable()
+        yield backend
+        _running.clear()
+        inflight.disable()
+        inflight.reset()
+
+    def test_unchanged_outside_flow(self) -> None:
+        sig = _Signature("app.tasks.charge")
+        assert flow_canvas(sig) is sig
+        assert sig.options == {}
+
+    def test_stamps_every_signature_once(self) -> None:
+        members = [_Signature(f"app.tasks.charge{i}") for i in range(3)]
+        body = _Signature("app.tasks.notify", headers={"custom": "x"})
+        _set_context(FlowContext(correlation_id="cid-1"))
+        flow_canvas(_Chord([_Group(*members[:2]), members[2]], body))
+        stamped = [m.options["headers"] for m in members]
+        assert stamped[0] == stamped[1] == stamped[2]
+        assert stamped[0]["penstock_correlation_id"] == "cid-1"
+        assert "penstock_fan_in" not in stamped[0]
+        headers = body.options["headers"]
+        assert headers["custom"] == "x"
+        assert headers["penstock_fan_in"] == "3"
+        assert headers["penstock_published_at"] == stamped[0]["penstock_published_at"]
+
+    def test_publish_keeps_stamped_headers_but_restamps_time(self) -> None:
+        sig = _Signature("app.tasks.charge")
+        _set_context(FlowContext(correlation_id="cid-1"))
+        flow_canvas(sig)
+        stamped = sig.options["headers"]
+        headers = {**stamped, "penstock_published_at": "1"}
+        _set_context(FlowContext(correlation_id="cid-2"))
+        before = time.time_ns()
+        _on_publish(headers=headers)
+        assert int(headers.pop("penstock_published_at")) >= before
+        assert headers == {
+            k: v for k, v in stamped.items() if k != "penstock_published_at"
+        }
+
+    def test_records_edges(self) -> None:
+        @step("fan", after="start")
+        def dispatch() -> None:
+            flow_canvas(
+                _Chord(
+                    [
+                        _Chain(_Signature("t.fetch"), _Signature("t.parse")),
+                        _Signature("t.resize"),
+                    ],
+                    _Signature("t.merge"),
+                )
+            )
+
+        @entrypoint("fan")
+        def start() -> None:
+            dispatch()
+
+        start()
+        diagram = generate_dag("fan")
+        assert "start --> dispatch" in diagram
+        for edge in [
+            "dispatch -.-> fetch",
+            "fetch -.-> parse",
+            "dispatch -.-> resize",
+            "parse -.-> merge",
+            "resize -.-> merge",
+        ]:
+            assert edge in diagram
+        assert "dispatch -.-> parse" not in diagram
+
+    def test_chord_callback_span(self, _backend: _RecordingBackend) -> None:
+        body = _Signature("app.tasks.notify")
+        _set_context(FlowContext(correlation_id="cid-1"))
+        flow_canvas(_Chord([_Signature("app.tasks.charge")], body))
+        _reset_context()
+        task = _Task(dict(body.options["headers"]))
+        _on_prerun(sender=task, task_id="t1")
+        assert current_flow_id() == "cid-1"
+        _on_postrun(sender=task, task_id="t1")
+        [(_, _, _, _, attrs)] = _backend.spans
+        assert attrs["fan_in"] == 1
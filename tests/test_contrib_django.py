@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
+import asyncio
 import contextlib
+import inspect
+from collections.abc import AsyncIterator, Iterator
 from typing import Any
 
 from penstock._context import current_flow_id, get_flow_context
@@ -64,3 +67,167 @@ class TestFlowMiddleware:
         mw(object())
         assert len(captured) == 2
         assert captured[0] != captured[1]
+
+    def test_adopts_inbound_sampling_decision(self) -> None:
+        captured: list[bool | None] = []
+
+        def get_response(_request: Any) -> _FakeResponse:
+            ctx = get_flow_context()
+            assert ctx is not None
+            captured.append(ctx.sampled)
+            return _FakeResponse()
+
+        class _Request:
+            def __init__(self, meta: dict[str, str]) -> None:
+                self.META = meta
+
+        mw = FlowMiddleware(get_response)
+        mw(_Request({"HTTP_X_PENSTOCK_SAMPLED": "0"}))
+        mw(_Request({"HTTP_X_PENSTOCK_SAMPLED": "1"}))
+        mw(_Request({}))
+        assert captured == [False, True, None]
+
+    def test_adopts_inbound_deadline(self) -> None:
+        captured: list[float | None] = []
+
+        def get_response(_request: Any) -> _FakeResponse:
+            ctx = get_flow_context()
+            assert ctx is not None
+            captured.append(ctx.deadline)
+            return _FakeResponse()
+
+        class _Request:
+            def __init__(self, meta: dict[str, str]) -> None:
+                self.META = meta
+
+        mw = FlowMiddleware(get_response)
+        mw(_Request({"HTTP_X_PENSTOCK_DEADLINE": "1700000000.5"}))
+        mw(_Request({"HTTP_X_PENSTOCK_DEADLINE": "soon"}))
+        mw(_Request({}))
+        assert captured == [1700000000.5, None, None]
+
+
+class _StreamingResponse(_FakeResponse):
+    streaming = True
+
+    def __init__(self, content: Any, *, is_async: bool = False) -> None:
+        super().__init__()
+        self.streaming_content = content
+        self.is_async = is_async
+
+
+class TestAsyncFlowMiddleware:
+    def test_marked_async_only_for_async_get_response(self) -> None:
+        async def get_response(_request: Any) -> _FakeResponse:
+            return _FakeResponse()
+
+        assert inspect.iscoroutinefunction(FlowMiddleware(get_response))
+        assert not inspect.iscoroutinefunction(_make_middleware()[0])
+        assert FlowMiddleware.async_capable
+        assert FlowMiddleware.sync_capable
+
+    def test_sets_context_without_thread_hop(self) -> None:
+        captured: list[str | None] = []
+
+        async def get_response(_request: Any) -> _FakeResponse:
+            captured.append(current_flow_id())
+            return _FakeResponse()
+
+        async def handle() -> Any:
+            response = await FlowMiddleware(get_response)(object())
+            assert get_flow_context() is None
+            return response
+
+        response = asyncio.run(handle())
+        assert response["X-Correlation-ID"] == captured[0]
+
+    def test_resets_context_on_exception(self) -> None:
+        async def get_response(_request: Any) -> _FakeResponse:
+            raise ValueError
+
+        async def handle() -> None:
+            with contextlib.suppress(ValueError):
+                await FlowMiddleware(get_response)(object())
+            assert get_flow_context() is None
+
+        asyncio.run(handle())
+
+
+class TestStreamingResponses:
+    def test_sync_stream_runs_in_context(self) -> None:
+        seen: list[str | None] = []
+
+        def body() -> Iterator[bytes]:
+            seen.append(current_flow_id())
+            yield b"a"
+            seen.append(current_flow_id())
+            yield b"b"
+
+        mw = FlowMiddleware(lambda _request: _StreamingResponse(body()))
+        response = mw(object())
+        assert get_flow_context() is None
+        assert list(response.streaming_content) == [b"a", b"b"]
+        assert seen == [response["X-Correlation-ID"]] * 2
+        assert get_flow_context() is None
+
+    def test_async_stream_runs_in_context(self) -> None:
+        seen: list[str | None] = []
+
+        async def body() -> AsyncIterator[bytes]:
+            seen.append(current_flow_id())
+            yield b"a"
+            await asyncio.sleep(0)
+            seen.append(current_flow_id())
+            yield b"b"
+
+        async def get_response(_request: Any) -> _StreamingResponse:
+            return _StreamingResponse(body(), is_async=True)
+
+        async def handle() -> tuple[Any, list[bytes]]:
+            response = await FlowMiddleware(get_response)(object())
+            return response, [chunk async for chunk in response.streaming_content]
+
+        response, chunks = asyncio.run(handle())
+        assert chunks == [b"a", b"b"]
+        assert seen == [response["X-Correlation-ID"]] * 2
+
+    def test_closing_stream_closes_body(self) -> None:
+        closed: list[bool] = []
+
+        def body() -> Iterator[bytes]:
+            try:
+                yield b"a"
+                yield b"b"
+            finally:
+                closed.append(True)
+
+        response = FlowMiddleware(lambda _request: _StreamingResponse(body()))(object())
+        stream = response.streaming_content
+        assert next(stream) == b"a"
+        stream.close()
+        assert closed == [True]
+
+
+class TestInboundIdentity:
+    def test_adopts_correlation_id_and_traceparent(self) -> None:
+        captured: list[tuple[str, str | None]] = []
+
+        def get_response(_request: Any) -> _FakeResponse:
+            ctx = get_flow_context()
+            assert ctx is not None
+            captured.append((ctx.correlation_id, ctx.traceparent))
+            return _FakeResponse()
+
+        class _Request:
+            def __init__(self, meta: dict[str, str]) -> None:
+                self.META = meta
+
+        traceparent = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+        mw = FlowMiddleware(get_response)
+        response = mw(_Request({"HTTP_X_CORRELATION_ID": "gateway-1"}))
+        mw(_Request({"HTTP_TRACEPARENT": traceparent}))
+        assert response["X-Correlation-ID"] == "gateway-1"
+        assert captured == [
+            ("gateway-1", None),
+            ("4bf92f3577b34da6a3ce929d0e0e4736", traceparent),
+        ]
@@ -0,0 +1,189 @@
+"""Tests for penstock.contrib.stats.StatsApp."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+
+from penstock import histograms, inflight
+from penstock._context import current_flow_id
+from penstock._decorators import entrypoint, step
+from penstock.contrib.stats import StatsApp
+
+
+@pytest.fixture(autouse=True)
+def _recorders() -> Iterator[None]:
+    yield
+    histograms.disable()
+    histograms.reset()
+    inflight.disable()
+    inflight.reset()
+
+
+@pytest.fixture
+def app() -> Iterator[StatsApp]:
+    stats = StatsApp(cache_s=0.0, max_renders_per_s=1000)
+    yield stats
+    stats.close()
+
+
+def _get(
+    app: StatsApp, path: str, query: str = ""
+) -> tuple[str, dict[str, str], bytes]:
+    captured: dict[str, Any] = {}
+
+    def start_response(status: str, headers: list[tuple[str, str]]) -> None:
+        captured["status"] = status
+        captured["headers"] = dict(headers)
+
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query}
+    body = b"".join(app(environ, start_response))
+    return captured["status"], captured["headers"], body
+
+
+def _register_checkout() -> tuple[Any, list[str]]:
+    ids: list[str] = []
+
+    @step("checkout", after="start")
+    def charge() -> None:
+        pass
+
+    @entrypoint("checkout")
+    def start() -> None:
+        ids.append(current_flow_id() or "")
+        charge()
+
+    return start, ids
+
+
+class TestEndpoints:
+    def test_flows(self, app: StatsApp) -> None:
+        start, _ = _register_checkout()
+        start()
+        start()
+        status, headers, body = _get(app, "/flows")
+        assert status == "200 OK"
+        assert headers["Content-Type"] == "application/json"
+        flow = json.loads(body)["flows"]["checkout"]
+        assert flow["in_flight"] == 0
+        assert flow["steps"]["charge"]["count"] == 2
+        assert set(flow["steps"]["charge"]) >= {"p50_ms", "p99_ms", "p99.9_ms"}
+
+    def test_inflight(self, app: StatsApp) -> None:
+        entered = threading.Event()
+        release = threading.Event()
+
+        @entrypoint("slow")
+        def start() -> None:
+            entered.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=start)
+        worker.start()
+        entered.wait(5)
+        try:
+            _, _, body = _get(app, "/inflight")
+            assert [f["flow"] for f in json.loads(body)["in_flight"]] == ["slow"]
+            _, _, body = _get(app, "/inflight", "stuck=60")
+            assert json.loads(body)["in_flight"] == []
+        finally:
+            release.set()
+            worker.join()
+
+    def test_spans_for_correlation_id(self, app: StatsApp) -> None:
+        start, ids = _register_checkout()
+        start()
+        start()
+        _, _, body = _get(app, f"/spans/{ids[0]}")
+        spans = json.loads(body)["spans"]
+        assert [s["step"] for s in spans] == ["start", "charge"]
+        assert all(s["duration_ms"] >= 0 for s in spans)
+
+    def test_dag_with_latency(self, app: StatsApp) -> None:
+        start, _ = _register_checkout()
+        start()
+        status, headers, body = _get(app, "/dag/checkout")
+        assert status == "200 OK"
+        assert headers["Content-Type"].startswith("text/plain")
+        assert 'charge["charge<br/>p50 ' in body.decode()
+
+    def test_errors(self, app: StatsApp) -> None:
+        assert _get(app, "/dag/unknown")[0] == "404 Not Found"
+        assert _get(app, "/nope")[0] == "404 Not Found"
+        assert _get(app, "/inflight", "stuck=x")[0] == "400 Bad Request"
+        assert app.respond("POST", "/flows")[0] == "405 Method Not Allowed"
+
+    def test_asgi(self, app: StatsApp) -> None:
+        start, _ = _register_checkout()
+        start()
+        sent: list[dict[str, Any]] = []
+
+        async def receive() -> dict[str, Any]:
+            return {"type": "http.request"}
+
+        async def send(message: dict[str, Any]) -> None:
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/_penstock/flows",
+            "root_path": "/_penstock",
+            "query_string": b"",
+        }
+        asyncio.run(app.asgi(scope, receive, send))
+        assert sent[0]["status"] == 200
+        assert (b"content-type", b"application/json") in sent[0]["headers"]
+        assert "checkout" in json.loads(sent[1]["body"])["flows"]
+
+
+class TestCachingAndRateLimit:
+    def test_response_is_cached(self) -> None:
+        app = StatsApp(cache_s=60)
+        try:
+            start, _ = _register_checkout()
+            first = _get(app, "/flows")[2]
+            start()
+            assert _get(app, "/flows")[2] == first
+        finally:
+            app.close()
+
+    def test_rate_limited_without_cached_copy(self) -> None:
+        app = StatsApp(cache_s=60, max_renders_per_s=1)
+        try:
+            assert _get(app, "/flows")[0] == "200 OK"
+            status, headers, _ = _get(app, "/inflight")
+            assert status == "429 Too Many Requests"
+            assert headers["Retry-After"] == "1"
+        finally:
+            app.close()
+
+    def test_serves_stale_copy_when_limited(self) -> None:
+        app = StatsApp(cache_s=0.0, max_renders_per_s=1)
+        try:
+            first = _get(app, "/flows")
+            assert _get(app, "/flows") == first
+        finally:
+            app.close()
+
+    def test_renders_below_one_per_second(self) -> None:
+        app = StatsApp(cache_s=0.0, max_renders_per_s=0.5)
+        try:
+            assert _get(app, "/flows")[0] == "200 OK"
+            assert _get(app, "/inflight")[0] == "429 Too Many Requests"
+            # Two seconds later the bucket has refilled one render.
+            app._renders._refilled -= 2
+            assert _get(app, "/inflight")[0] == "200 OK"
+        finally:
+            app.close()
+
+    def test_invalid_arguments(self) -> None:
+        with pytest.raises(ValueError, match="recent_spans"):
+            StatsApp(recent_spans=0)
+        with pytest.raises(ValueError, match="max_renders_per_s"):
+            StatsApp(max_renders_per_s=0)
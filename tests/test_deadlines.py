@@ -0,0 +1,145 @@
+"""Tests for penstock.deadlines and @entrypoint(deadline=...)."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from penstock._context import FlowContext, _set_context, get_flow_context
+from penstock._decorators import entrypoint, step
+from penstock.concurrent import FlowProcessPoolExecutor, FlowThreadPoolExecutor
+from penstock.deadlines import DeadlineExceeded, remaining
+
+
+def _current_deadline() -> float | None:
+    ctx = get_flow_context()
+    return ctx.deadline if ctx is not None else None
+
+
+class TestEntrypointDeadline:
+    def test_sets_budget(self) -> None:
+        @entrypoint("budget", deadline=5)
+        def start() -> float | None:
+            return remaining()
+
+        left = start()
+        assert left is not None
+        assert 4 < left <= 5
+        assert remaining() is None
+
+    def test_no_deadline_by_default(self) -> None:
+        @entrypoint("unbounded")
+        def start() -> float | None:
+            return _current_deadline()
+
+        assert start() is None
+
+    def test_inherits_earlier_deadline(self) -> None:
+        @entrypoint("inherited", deadline=60)
+        def start() -> float | None:
+            return _current_deadline()
+
+        outer = time.time() + 5
+        _set_context(FlowContext(deadline=outer))
+        assert start() == outer
+
+    def test_own_budget_can_bring_deadline_forward(self) -> None:
+        @entrypoint("forward", deadline=1)
+        def start() -> float | None:
+            return _current_deadline()
+
+        outer = time.time() + 60
+        _set_context(FlowContext(deadline=outer))
+        deadline = start()
+        assert deadline is not None
+        assert deadline < outer
+
+    def test_fails_fast_on_expired_inherited_deadline(self) -> None:
+        calls: list[int] = []
+
+        @entrypoint("abandoned")
+        def start() -> None:
+            calls.append(1)
+
+        _set_context(FlowContext(deadline=time.time() - 1))
+        with pytest.raises(DeadlineExceeded, match="'abandoned' not started"):
+            start()
+        assert calls == []
+
+    def test_invalid_deadline(self) -> None:
+        with pytest.raises(ValueError, match="deadline"):
+            entrypoint("bad", deadline=0)
+
+
+class TestStepDeadline:
+    def test_step_raises_once_exhausted(self) -> None:
+        calls: list[str] = []
+
+        @step("exhausted", after="start")
+        def charge() -> None:
+            calls.append("charge")
+
+        @entrypoint("exhausted", deadline=0.01)
+        def start() -> None:
+            time.sleep(0.02)
+            charge()
+
+        with pytest.raises(DeadlineExceeded, match="'charge' not started"):
+            start()
+        assert calls == []
+
+    def test_step_skipped_once_exhausted(self) -> None:
+        @step("skipped", after="start", on_deadline="skip")
+        async def recommend() -> list[str]:
+            return ["upsell"]
+
+        @entrypoint("skipped", deadline=0.01)
+        async def start() -> list[str] | None:
+            await asyncio.sleep(0.02)
+            return await recommend()
+
+        assert asyncio.run(start()) is None
+
+    def test_step_runs_within_budget(self) -> None:
+        @step("in_budget", after="start")
+        def charge() -> str:
+            return "ok"
+
+        @entrypoint("in_budget", deadline=5)
+        def start() -> str:
+            return charge()
+
+        assert start() == "ok"
+
+    def test_invalid_on_deadline(self) -> None:
+        with pytest.raises(ValueError, match="on_deadline"):
+            step("bad", on_deadline="ignore")(lambda: None)  # type: ignore[call-overload]
+
+
+class TestPropagation:
+    def test_thread_executor(self) -> None:
+        @entrypoint("threaded", deadline=5)
+        def start() -> tuple[float | None, float | None]:
+            with FlowThreadPoolExecutor(1) as pool:
+                return _current_deadline(), pool.submit(_current_deadline).result()
+
+        own, in_thread = start()
+        assert own is not None
+        assert in_thread == own
+
+    def test_process_executor(self) -> None:
+        @entrypoint("processes", deadline=5)
+        def start() -> tuple[float | None, float | None]:
+            with FlowProcessPoolExecutor(1) as pool:
+                return _current_deadline(), pool.submit(_current_deadline).result()
+
+        own, in_worker = start()
+        assert own is not None
+        assert in_worker == own
+
+    def test_fork_and_state_keep_deadline(self) -> None:
+        ctx = FlowContext(deadline=123.5)
+        assert ctx.fork().deadline == 123.5
+        assert FlowContext._from_state(ctx._to_state()).deadline == 123.5
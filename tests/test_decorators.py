@@ -3,16 +3,28 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
-from penstock._context import current_flow_id, get_flow_context
+from penstock._config import configure
+from penstock._context import (
+    FlowContext,
+    _set_context,
+    current_flow_id,
+    get_flow_context,
+)
 from penstock._decorators import (
     _normalize_after,
     entrypoint,
     step,
 )
 from penstock._registry import _registry
+from penstock.deadlines import DeadlineExceeded
 
 # ---------------------------------------------------------------------------
 # @entrypoint
@@ -238,3 +250,198 @@ class TestMethodsInClass:
         cid = OrderFlow().receive("ORD-1")
         assert isinstance(cid, str)
         assert len(cid) == 32
+
+
+# ---------------------------------------------------------------------------
+# @entrypoint(coalesce=...)
+# ---------------------------------------------------------------------------
+
+
+class TestCoalesce:
+    def test_threads_share_one_execution(self) -> None:
+        calls: list[str] = []
+        release = threading.Event()
+
+        @entrypoint("coalesced", coalesce=lambda key: key)
+        def load(key: str) -> tuple[str, str | None]:
+            calls.append(key)
+            release.wait(2)
+            return key.upper(), current_flow_id()
+
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(load, "a") for _ in range(3)]
+            time.sleep(0.1)
+            other = pool.submit(load, "b")
+            release.set()
+            results = [f.result() for f in futures]
+
+        assert calls.count("a") == 1
+        assert other.result()[0] == "B"
+        # The leader's correlation ID is in its result, shared with followers.
+        assert len(set(results)) == 1
+
+    def test_async_tasks_share_result(self) -> None:
+        calls = 0
+
+        @entrypoint("coalesced_async", coalesce=lambda key: key)
+        async def load(key: str) -> str:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return key
+
+        async def main() -> list[str]:
+            return await asyncio.gather(*(load("k") for _ in range(5)))
+
+        assert asyncio.run(main()) == ["k"] * 5
+        assert calls == 1
+
+    def test_exception_shared(self) -> None:
+        calls = 0
+
+        @entrypoint("coalesced_error", coalesce=lambda: "same")
+        async def fail() -> None:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def main() -> tuple[BaseException | None, ...]:
+            return await asyncio.gather(fail(), fail(), return_exceptions=True)
+
+        errors = asyncio.run(main())
+        assert calls == 1
+        assert all(isinstance(e, ValueError) for e in errors)
+
+    def test_cancelled_leader_not_shared(self) -> None:
+        calls = 0
+
+        @entrypoint("coalesced_cancel", coalesce=lambda: "same")
+        async def load() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return calls
+
+        async def main() -> int:
+            leader = asyncio.create_task(load())
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(load())
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        # The follower runs the call itself rather than inherit the
+        # leader's cancellation.
+        assert asyncio.run(main()) == 2
+        assert calls == 2
+
+    def test_followers_raise_their_own_copy(self) -> None:
+        release = threading.Event()
+
+        @entrypoint("coalesced_copies", coalesce=lambda: "same")
+        def fail() -> None:
+            release.wait(2)
+            raise ValueError("boom")
+
+        def call() -> BaseException:
+            with pytest.raises(ValueError, match="boom") as info:
+                fail()
+            return info.value
+
+        with ThreadPoolExecutor(3) as pool:
+            futures = [pool.submit(call) for _ in range(3)]
+            time.sleep(0.1)
+            release.set()
+            errors = [f.result() for f in futures]
+
+        assert len({id(e) for e in errors}) == 3
+        [leader] = [e for e in errors if e.__cause__ is None]
+        assert all(e.__cause__ is leader for e in errors if e is not leader)
+
+    def test_follower_gives_up_at_its_deadline(self) -> None:
+        release = threading.Event()
+
+        @entrypoint("coalesced_deadline", coalesce=lambda: "same")
+        def load() -> str:
+            release.wait(2)
+            return "done"
+
+        def follow() -> None:
+            _set_context(FlowContext(deadline=time.time() + 0.05))
+            load()
+
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(load)
+            time.sleep(0.05)
+            started = time.monotonic()
+            follower = pool.submit(follow)
+            with pytest.raises(DeadlineExceeded, match="stopped waiting"):
+                follower.result()
+            assert time.monotonic() - started < 1
+            release.set()
+            assert leader.result() == "done"
+
+    def test_retried_follower_has_one_span(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        configure("logging")
+
+        @entrypoint("coalesced_retry", coalesce=lambda: "same")
+        async def load() -> None:
+            await asyncio.sleep(0.05)
+
+        async def main() -> None:
+            leader = asyncio.create_task(load())
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(load())
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await leader
+            await follower
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            asyncio.run(main())
+
+        ends = [r for r in caplog.records if r.getMessage() == "step.end"]
+        assert len(ends) == 2
+
+    def test_sequential_calls_not_coalesced(self) -> None:
+        calls = 0
+
+        @entrypoint("coalesced_seq", coalesce=lambda: "same")
+        def run() -> int:
+            nonlocal calls
+            calls += 1
+            return calls
+
+        assert run() == 1
+        assert run() == 2
+
+    def test_follower_spans_link_to_leader(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        configure("logging")
+
+        @entrypoint("coalesced_spans", coalesce=lambda: "same")
+        async def load() -> None:
+            await asyncio.sleep(0.05)
+
+        async def main() -> None:
+            await asyncio.gather(load(), load(), load())
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            asyncio.run(main())
+
+        ends = [r for r in caplog.records if r.getMessage() == "step.end"]
+        leaders = [r for r in ends if not hasattr(r, "coalesced_with")]
+        followers = [r for r in ends if hasattr(r, "coalesced_with")]
+        assert len(leaders) == 1
+        assert leaders[0].coalesced_followers == 2  # type: ignore[attr-defined]
+        assert len(followers) == 2
+        leader_id = leaders[0].correlation_id  # type: ignore[attr-defined]
+        assert all(r.coalesced_with == leader_id for r in followers)
+        assert len({r.correlation_id for r in ends}) == 3  # type: ignore[attr-defined]
@@ -0,0 +1,165 @@
+"""Tests for penstock.histograms."""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from penstock import histograms
+from penstock._dag import generate_dag
+from penstock._decorators import entrypoint, step
+from penstock.histograms import LatencyHistogram
+
+
+@pytest.fixture(autouse=True)
+def _recording() -> Iterator[None]:
+    histograms.enable()
+    yield
+    histograms.disable()
+    histograms.reset()
+
+
+def _filled(values_ms: list[float]) -> LatencyHistogram:
+    h = LatencyHistogram()
+    for value in values_ms:
+        h.record(int(value * 1e6))
+    return h
+
+
+class TestLatencyHistogram:
+    def test_empty(self) -> None:
+        h = LatencyHistogram()
+        assert h.count == 0
+        assert h.mean_ms == 0.0
+        assert h.percentile(99) == 0.0
+
+    def test_percentiles_within_relative_error(self) -> None:
+        rng = random.Random(7)
+        values = [rng.lognormvariate(2, 1.5) for _ in range(20_000)]
+        h = _filled(values)
+        values.sort()
+        for p in (50, 90, 99, 99.9):
+            exact = values[int(len(values) * p / 100) - 1]
+            assert h.percentile(p) == pytest.approx(exact, rel=0.04)
+        assert h.percentile(100) == pytest.approx(values[-1])
+        assert h.count == len(values)
+        assert h.mean_ms == pytest.approx(sum(values) / len(values))
+
+    def test_extreme_values_are_clamped(self) -> None:
+        h = _filled([0, 1e9])
+        assert h.count == 2
+        assert h.percentile(0) == pytest.approx(0.0005, abs=0.001)
+        assert h.max_ms == 1e9
+
+    def test_merge(self) -> None:
+        a = _filled([1, 2, 3])
+        b = _filled([100, 200])
+        a.merge(b)
+        assert a.count == 5
+        assert a.percentile(100) == pytest.approx(200)
+        assert b.count == 2
+
+    def test_copy_with_reset(self) -> None:
+        h = _filled([5, 5])
+        clone = h.copy(reset=True)
+        assert clone.count == 2
+        assert clone.percentile(50) == pytest.approx(5, rel=0.04)
+        assert h.count == 0
+        assert h.percentile(50) == 0.0
+
+    def test_invalid_percentile(self) -> None:
+        with pytest.raises(ValueError, match="between 0 and 100"):
+            LatencyHistogram().percentile(101)
+
+    def test_concurrent_records_are_not_lost(self) -> None:
+        h = LatencyHistogram()
+
+        def record() -> None:
+            for _ in range(2_000):
+                h.record(1_000_000)
+
+        with ThreadPoolExecutor(8) as pool:
+            for _ in range(8):
+                pool.submit(record)
+        assert h.count == 16_000
+
+
+class TestAggregator:
+    def test_records_steps_and_entrypoint(self) -> None:
+        @step("timed", after="start")
+        def charge() -> None:
+            time.sleep(0.01)
+
+        @entrypoint("timed")
+        def start() -> None:
+            charge()
+            charge()
+
+        start()
+        snap = histograms.snapshot()
+        assert snap[("timed", "charge")].count == 2
+        assert snap[("timed", "start")].count == 1
+        assert snap[("timed", "charge")].percentile(50) >= 10
+
+    def test_async_steps(self) -> None:
+        @step("timed_async", after="start")
+        async def fetch() -> None:
+            await asyncio.sleep(0.01)
+
+        @entrypoint("timed_async")
+        async def start() -> None:
+            await asyncio.gather(fetch(), fetch())
+
+        asyncio.run(start())
+        h = histograms.snapshot()[("timed_async", "fetch")]
+        assert h.count == 2
+        assert h.percentile(99) >= 10
+
+    def test_preallocates_registered_steps(self) -> None:
+        @step("prealloc")
+        def idle() -> None:
+            pass
+
+        histograms.enable()
+        assert histograms.snapshot()[("prealloc", "idle")].count == 0
+
+    def test_snapshot_and_reset(self) -> None:
+        @entrypoint("windowed")
+        def start() -> None:
+            pass
+
+        start()
+        assert histograms.snapshot(reset=True)[("windowed", "start")].count == 1
+        assert histograms.snapshot()[("windowed", "start")].count == 0
+
+    def test_disable_stops_recording(self) -> None:
+        @entrypoint("paused")
+        def start() -> None:
+            pass
+
+        histograms.disable()
+        assert not histograms.is_enabled()
+        start()
+        assert ("paused", "start") not in histograms.snapshot()
+
+    def test_dag_shows_latency(self) -> None:
+        @step("latency_dag", after="start")
+        def lookup() -> None:
+            pass
+
+        @entrypoint("latency_dag")
+        def start() -> None:
+            lookup()
+
+        histograms.reset()
+        histograms.enable()
+        start()
+        diagram = generate_dag("latency_dag", latency=True)
+        assert 'lookup["lookup<br/>p50 ' in diagram
+        assert "p99 " in diagram
+        assert "p50" not in generate_dag("latency_dag")
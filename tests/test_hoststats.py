@@ -0,0 +1,146 @@
+"""Tests for penstock.hoststats.HostStats."""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import uuid
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from penstock._decorators import entrypoint, step
+from penstock.hoststats import HostStats, StepSnapshot
+
+
+@pytest.fixture
+def stats() -> Iterator[HostStats]:
+    @step("host", after="start")
+    def charge(n: int) -> int:
+        return n
+
+    @entrypoint("host")
+    def start(n: int) -> int:
+        return charge(n)
+
+    block = HostStats.create(f"penstock-test-{uuid.uuid4().hex[:8]}", workers=4)
+    yield block
+    block.close()
+    block.unlink()
+
+
+def _run_flow(n: int) -> None:
+    from penstock._registry import _registry
+
+    _registry.get_callable("host", "start")(n)
+
+
+class TestHostStats:
+    def test_layout_from_registry(self, stats: HostStats) -> None:
+        assert stats.steps == [("host", "charge"), ("host", "start")]
+
+    def test_records_calls_and_latency(self, stats: HostStats) -> None:
+        stats.attach()
+        for n in range(3):
+            _run_flow(n)
+
+        snapshot = stats.snapshot()
+        charge = snapshot["host", "charge"]
+        assert charge.calls == 3
+        assert sum(count for _, count in charge.buckets) == 3
+        assert charge.buckets[-1][0] == float("inf")
+        assert charge.percentile(99) == 1
+        assert snapshot["host", "start"].calls == 3
+
+    def test_threads_share_the_row(self, stats: HostStats) -> None:
+        stats.attach()
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(_run_flow, range(2000)))
+        assert stats.snapshot()["host", "charge"].calls == 2000
+
+    def test_reader_sees_worker_counts(self, stats: HostStats) -> None:
+        stats.attach()
+        _run_flow(1)
+
+        reader = HostStats.open(stats.name)
+        try:
+            assert reader.snapshot()["host", "start"].calls == 1
+            with pytest.raises(RuntimeError, match="parent process"):
+                reader.attach()
+        finally:
+            reader.close()
+
+    def test_forked_workers_add_up(self, stats: HostStats) -> None:
+        def worker() -> None:
+            stats.attach()
+            for n in range(5):
+                _run_flow(n)
+
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=worker) for _ in range(3)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(10)
+            assert p.exitcode == 0
+
+        assert stats.snapshot()["host", "charge"].calls == 15
+
+    def test_dead_worker_row_reused(self, stats: HostStats) -> None:
+        def worker() -> None:
+            stats.attach()
+            _run_flow(1)
+
+        ctx = multiprocessing.get_context("fork")
+        for _ in range(6):  # more workers over time than rows
+            p = ctx.Process(target=worker)
+            p.start()
+            p.join(10)
+            assert p.exitcode == 0
+        assert stats.snapshot()["host", "start"].calls == 6
+
+    def test_rows_exhausted(self) -> None:
+        block = HostStats.create(workers=1)
+        try:
+            block._counters[0] = os.getppid()
+            with pytest.raises(RuntimeError, match="rows are in use"):
+                block.attach()
+        finally:
+            block.close()
+            block.unlink()
+
+    def test_steps_outside_layout_ignored(self, stats: HostStats) -> None:
+        stats.attach()
+
+        @entrypoint("later")
+        def later() -> None:
+            pass
+
+        later()
+        assert ("later", "later") not in stats.snapshot()
+
+    def test_detach_stops_recording(self, stats: HostStats) -> None:
+        stats.attach()
+        stats.detach()
+        _run_flow(1)
+        assert stats.snapshot()["host", "start"].calls == 0
+
+
+class TestStepSnapshot:
+    def test_mean_and_percentile(self) -> None:
+        snap = StepSnapshot(
+            calls=4,
+            total_ns=40_000_000,
+            buckets=((1, 0), (10, 3), (100, 1), (float("inf"), 0)),
+        )
+        assert snap.mean_ms == 10
+        assert snap.percentile(50) == 10
+        assert snap.percentile(99) == 100
+        assert StepSnapshot(0, 0, ()).percentile(50) == 0.0
+
+    def test_invalid_arguments(self) -> None:
+        with pytest.raises(ValueError, match="workers"):
+            HostStats.create(workers=0)
+        with pytest.raises(ValueError, match="buckets_ms"):
+            HostStats.create(buckets_ms=[])
@@ -0,0 +1,234 @@
+"""Tests for penstock.inflight."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from penstock import inflight
+from penstock._decorators import entrypoint, step
+from penstock._runner import run_flow
+from penstock.concurrent import FlowThreadPoolExecutor
+from penstock.inflight import FlowGauge, FlowRejected
+
+
+@pytest.fixture(autouse=True)
+def _tracker() -> Iterator[None]:
+    inflight.enable()
+    yield
+    inflight.disable()
+    inflight.reset()
+
+
+class TestTracking:
+    def test_tracks_current_step(self) -> None:
+        seen: list[list[tuple[str, str]]] = []
+
+        def snapshot() -> None:
+            seen.append([(f.flow_name, f.step) for f in inflight.in_flight()])
+
+        @step("tracked", after="start")
+        def charge() -> None:
+            snapshot()
+
+        @entrypoint("tracked")
+        def start() -> None:
+            snapshot()
+            charge()
+            snapshot()
+
+        start()
+        assert seen == [
+            [("tracked", "start")],
+            [("tracked", "charge")],
+            [("tracked", "start")],
+        ]
+        assert inflight.in_flight() == []
+
+    def test_gauges_and_stuck_flows(self) -> None:
+        release = threading.Event()
+        started = threading.Barrier(3)
+
+        @step("gauged", after="start")
+        def wait_for_bank() -> None:
+            started.wait(2)
+            release.wait(2)
+
+        @entrypoint("gauged")
+        def start() -> None:
+            wait_for_bank()
+
+        with ThreadPoolExecutor(2) as pool:
+            futures = [pool.submit(start) for _ in range(2)]
+            started.wait(2)
+            time.sleep(0.02)
+            gauge = inflight.gauges()["gauged"]
+            assert gauge.in_flight == 2
+            assert gauge.oldest_age_s is not None
+            assert gauge.oldest_age_s >= 0.02
+            stuck = inflight.stuck(threshold_s=0.01)
+            assert [f.step for f in stuck] == ["wait_for_bank"] * 2
+            assert inflight.stuck(threshold_s=60) == []
+            release.set()
+            for f in futures:
+                f.result()
+
+        assert inflight.gauges()["gauged"] == FlowGauge(0, None, 0, None)
+
+    def test_async_flows(self) -> None:
+        steps: list[str] = []
+
+        @step("async_tracked", after="start")
+        async def lookup() -> None:
+            await asyncio.sleep(0)
+            steps.extend(f.step for f in inflight.in_flight())
+
+        @entrypoint("async_tracked")
+        async def start() -> None:
+            await lookup()
+
+        async def main() -> None:
+            await asyncio.gather(start(), start())
+
+        asyncio.run(main())
+        assert steps[-2:] == ["lookup", "lookup"]
+        assert inflight.in_flight() == []
+
+    def test_concurrent_steps(self) -> None:
+        a_entered = threading.Event()
+        b_entered = threading.Event()
+        a_done = threading.Event()
+
+        @step("parallel", after="start")
+        def a() -> None:
+            a_entered.set()
+            b_entered.wait(2)
+
+        @step("parallel", after="start")
+        def b() -> None:
+            b_entered.set()
+            a_done.wait(2)
+
+        @entrypoint("parallel")
+        def start() -> list[str]:
+            seen: list[str] = []
+            with FlowThreadPoolExecutor(2) as pool:
+                fa = pool.submit(a)
+                a_entered.wait(2)
+                fb = pool.submit(b)
+                fa.result()
+                seen.extend(f.step for f in inflight.in_flight())
+                a_done.set()
+                fb.result()
+            seen.extend(f.step for f in inflight.in_flight())
+            return seen
+
+        # b still running after a finished, then back in the entrypoint.
+        assert start() == ["b", "start"]
+        assert inflight.in_flight() == []
+
+    def test_run_flow(self) -> None:
+        seen: list[inflight.InFlightFlow] = []
+
+        @entrypoint("dag")
+        def start() -> None:
+            pass
+
+        @step("dag", after="start")
+        def fetch(_: None) -> None:
+            time.sleep(0.05)
+
+        @step("dag", after="fetch")
+        async def store(_: None) -> None:
+            seen.extend(inflight.in_flight())
+
+        inflight.set_limit("dag", 1)
+        run_flow("dag")
+
+        # One flow for the whole run, still there after the entrypoint and
+        # fetch finished, and never refused by its own limit.
+        [flow] = seen
+        assert (flow.flow_name, flow.step) == ("dag", "store")
+        assert flow.age_s >= 0.05
+        assert inflight.gauges()["dag"] == FlowGauge(0, None, 0, 1)
+
+    def test_nested_entrypoints(self) -> None:
+        @entrypoint("inner")
+        def inner() -> list[str]:
+            return sorted(f.flow_name for f in inflight.in_flight())
+
+        @entrypoint("outer")
+        def outer() -> list[str]:
+            return inner()
+
+        assert outer() == ["inner", "outer"]
+
+    def test_current(self) -> None:
+        @step("looked_up", after="start")
+        def charge() -> inflight.InFlightFlow | None:
+            return inflight.current()
+
+        @entrypoint("looked_up")
+        def start() -> inflight.InFlightFlow | None:
+            return charge()
+
+        found = start()
+        assert found is not None
+        assert (found.flow_name, found.step) == ("looked_up", "charge")
+        assert inflight.current() is None
+
+    def test_removed_on_error(self) -> None:
+        @entrypoint("failing")
+        def start() -> None:
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError, match="boom"):
+            start()
+        assert inflight.gauges()["failing"].in_flight == 0
+
+    def test_disabled(self) -> None:
+        inflight.disable()
+
+        @entrypoint("untracked")
+        def start() -> list[inflight.InFlightFlow]:
+            return inflight.in_flight()
+
+        assert start() == []
+        assert not inflight.is_enabled()
+
+
+class TestAdmission:
+    def test_rejects_beyond_limit(self) -> None:
+        inflight.set_limit("admitted", 1)
+        calls: list[str] = []
+
+        @entrypoint("admitted")
+        def start(name: str) -> None:
+            calls.append(name)
+            if name == "outer":
+                start("inner")
+
+        @entrypoint("other")
+        def other() -> None:
+            start("nested")
+
+        with pytest.raises(FlowRejected, match="limit 1"):
+            start("outer")
+        assert calls == ["outer"]
+        assert inflight.gauges()["admitted"] == FlowGauge(0, None, 1, 1)
+
+        other()
+        assert calls == ["outer", "nested"]
+
+        inflight.set_limit("admitted", None)
+        start("outer")
+        assert calls[-2:] == ["outer", "inner"]
+
+    def test_invalid_limit(self) -> None:
+        with pytest.raises(ValueError, match="max_in_flight"):
+            inflight.set_limit("bad", 0)
@@ -0,0 +1,154 @@
+"""Tests for penstock._instrument and per-step CPU timing."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+import pytest
+
+from penstock._config import configure
+from penstock._decorators import entrypoint, step
+from penstock._instrument import (
+    NULL_OBSERVER,
+    BaseObserver,
+    InstrumentedCoroutine,
+    WallTimer,
+)
+
+
+def _busy(ns: int) -> None:
+    end = time.perf_counter_ns() + ns
+    while time.perf_counter_ns() < end:
+        pass
+
+
+class TestInstrumentedCoroutine:
+    def test_splits_running_and_suspended_time(self) -> None:
+        async def work() -> str:
+            _busy(5_000_000)
+            await asyncio.sleep(0.02)
+            _busy(5_000_000)
+            return "ok"
+
+        async def run() -> tuple[str, InstrumentedCoroutine, int]:
+            instrumented = InstrumentedCoroutine(work())
+            start = time.perf_counter_ns()
+            result = await instrumented
+            return result, instrumented, time.perf_counter_ns() - start
+
+        result, instrumented, wall_ns = asyncio.run(run())
+        assert result == "ok"
+        assert instrumented.resumes == 2
+        assert 10_000_000 <= instrumented.run_ns < wall_ns
+        assert wall_ns - instrumented.run_ns >= 15_000_000
+        assert instrumented.cpu_ns > 0
+
+    def test_propagates_exceptions(self) -> None:
+        async def fail() -> None:
+            await asyncio.sleep(0)
+            raise ValueError("boom")
+
+        async def run() -> None:
+            await InstrumentedCoroutine(fail())
+
+        with pytest.raises(ValueError, match="boom"):
+            asyncio.run(run())
+
+    def test_forwards_cancellation(self) -> None:
+        cancelled: list[bool] = []
+
+        async def slow() -> None:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def run() -> None:
+            task = asyncio.ensure_future(InstrumentedCoroutine(slow()))
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        assert cancelled == [True]
+
+
+class TestCpuTimeAttributes:
+    def _records(self, caplog: pytest.LogCaptureFixture) -> dict[str, Any]:
+        return {
+            r.step: r  # type: ignore[attr-defined]
+            for r in caplog.records
+            if r.message == "step.end"
+        }
+
+    def test_sync_step_reports_cpu_ns(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging", cpu_time=True)
+
+        @step("cpu", after="start")
+        def crunch() -> None:
+            _busy(2_000_000)
+
+        @entrypoint("cpu")
+        def start() -> None:
+            crunch()
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            start()
+
+        ends = self._records(caplog)
+        assert ends["crunch"].cpu_ns > 0
+        assert ends["start"].cpu_ns >= ends["crunch"].cpu_ns
+
+    def test_async_step_reports_split(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging", cpu_time=True)
+
+        @step("cpu_async", after="start")
+        async def fetch() -> None:
+            await asyncio.sleep(0.01)
+
+        @entrypoint("cpu_async")
+        async def start() -> None:
+            await fetch()
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            asyncio.run(start())
+
+        end = self._records(caplog)["fetch"]
+        assert end.suspended_ns >= 5_000_000
+        assert end.run_ns + end.suspended_ns <= end.duration_ns
+        assert end.cpu_ns >= 0
+
+    def test_disabled_by_default(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging")
+
+        @entrypoint("no_cpu")
+        def start() -> None:
+            pass
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            start()
+
+        assert not hasattr(self._records(caplog)["start"], "cpu_ns")
+
+
+class TestWallTimer:
+    def test_reports_elapsed_once_finished(self) -> None:
+        elapsed: list[int] = []
+        timer = WallTimer(elapsed.append)
+        timer.resumed()
+        time.sleep(0.01)
+        timer.suspended(0)
+        assert elapsed == []
+        timer.finished()
+        assert elapsed[0] >= 10_000_000
+
+    def test_null_observer(self) -> None:
+        assert isinstance(NULL_OBSERVER, BaseObserver)
+        NULL_OBSERVER.resumed()
+        NULL_OBSERVER.suspended(0)
+        assert NULL_OBSERVER.finished() is None
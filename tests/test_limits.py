@@ -0,0 +1,227 @@
+"""Tests for penstock.limits and @step(max_concurrency=..., timeout=...)."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from penstock._config import configure
+from penstock._decorators import entrypoint, step
+from penstock.limits import LimitStats, StepRejected, report, set_limits
+
+
+class TestSyncLimits:
+    def test_max_concurrency(self) -> None:
+        running = 0
+        peak = 0
+        lock = threading.Lock()
+
+        @step("sync_cap", after="start", max_concurrency=2)
+        def call_dependency() -> None:
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+        @entrypoint("sync_cap")
+        def start() -> None:
+            call_dependency()
+
+        with ThreadPoolExecutor(6) as pool:
+            for f in [pool.submit(start) for _ in range(6)]:
+                f.result()
+
+        assert peak == 2
+        assert report()["sync_cap", "call_dependency"] == LimitStats(2, None)
+
+    def test_rejected_after_timeout(self) -> None:
+        release = threading.Event()
+
+        @step("sync_reject", after="start", max_concurrency=1, timeout=0.05)
+        def call_dependency() -> None:
+            release.wait(2)
+
+        @entrypoint("sync_reject")
+        def start() -> None:
+            call_dependency()
+
+        with ThreadPoolExecutor(2) as pool:
+            first = pool.submit(start)
+            time.sleep(0.02)
+            with pytest.raises(StepRejected):
+                pool.submit(start).result()
+            release.set()
+            first.result()
+
+        stats = report()["sync_reject", "call_dependency"]
+        assert (stats.rejected, stats.in_flight, stats.queued) == (1, 0, 0)
+
+    def test_live_counts_and_runtime_tuning(self) -> None:
+        release = threading.Event()
+
+        @step("tuned", after="start", max_concurrency=1)
+        def call_dependency() -> None:
+            release.wait(2)
+
+        @entrypoint("tuned")
+        def start() -> None:
+            call_dependency()
+
+        with ThreadPoolExecutor(3) as pool:
+            futures = [pool.submit(start) for _ in range(3)]
+            time.sleep(0.05)
+            stats = report()["tuned", "call_dependency"]
+            assert (stats.in_flight, stats.queued) == (1, 2)
+
+            set_limits("tuned", "call_dependency", max_concurrency=3)
+            stats = report()["tuned", "call_dependency"]
+            assert (stats.in_flight, stats.queued) == (3, 0)
+            release.set()
+            for f in futures:
+                f.result()
+
+        stats = report()["tuned", "call_dependency"]
+        assert (stats.max_concurrency, stats.in_flight) == (3, 0)
+
+    def test_span_attributes(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging")
+
+        @step("limit_spans", after="start", max_concurrency=1)
+        def call_dependency() -> None:
+            pass
+
+        @entrypoint("limit_spans")
+        def start() -> None:
+            call_dependency()
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            start()
+
+        (end,) = [
+            r
+            for r in caplog.records
+            if r.getMessage() == "step.end" and r.step == "call_dependency"  # type: ignore[attr-defined]
+        ]
+        assert end.queue_wait_ms >= 0  # type: ignore[attr-defined]
+
+
+class TestAsyncLimits:
+    def test_max_concurrency(self) -> None:
+        running = 0
+        peak = 0
+
+        @step("async_cap", after="start", max_concurrency=3)
+        async def call_dependency() -> None:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        @entrypoint("async_cap")
+        async def start() -> None:
+            await asyncio.gather(*(call_dependency() for _ in range(10)))
+
+        asyncio.run(start())
+        assert peak == 3
+
+    def test_timeout_cancels_running_step(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        configure("logging")
+
+        @step("async_timeout", after="start", timeout=0.02)
+        async def call_dependency() -> None:
+            await asyncio.sleep(1)
+
+        @entrypoint("async_timeout")
+        async def start() -> None:
+            await call_dependency()
+
+        with (
+            caplog.at_level(logging.INFO, logger="penstock"),
+            pytest.raises(TimeoutError),
+        ):
+            asyncio.run(start())
+
+        assert report()["async_timeout", "call_dependency"].timed_out == 1
+        assert any(getattr(r, "timed_out", False) for r in caplog.records)
+
+    def test_step_timeout_error_not_counted(self) -> None:
+        @step("own_timeout", after="start", timeout=5)
+        async def call_dependency() -> None:
+            raise TimeoutError("from the dependency")
+
+        @entrypoint("own_timeout")
+        async def start() -> None:
+            await call_dependency()
+
+        with pytest.raises(TimeoutError, match="from the dependency"):
+            asyncio.run(start())
+        assert report()["own_timeout", "call_dependency"].timed_out == 0
+
+    def test_rejected_while_queued(self) -> None:
+        @step("async_reject", after="start", max_concurrency=1, timeout=0.05)
+        async def call_dependency(delay: float) -> None:
+            await asyncio.sleep(delay)
+
+        @entrypoint("async_reject")
+        async def start() -> list[BaseException | None]:
+            return list(
+                await asyncio.gather(
+                    call_dependency(1),
+                    call_dependency(0),
+                    return_exceptions=True,
+                )
+            )
+
+        first, second = asyncio.run(start())
+        assert type(first) is TimeoutError
+        assert isinstance(second, StepRejected)
+        stats = report()["async_reject", "call_dependency"]
+        assert (stats.timed_out, stats.rejected) == (1, 1)
+        assert (stats.in_flight, stats.queued) == (0, 0)
+
+    def test_cancelled_waiter_frees_its_place(self) -> None:
+        @step("async_cancel", after="start", max_concurrency=1)
+        async def call_dependency() -> None:
+            await asyncio.sleep(0.02)
+
+        @entrypoint("async_cancel")
+        async def start() -> None:
+            first = asyncio.ensure_future(call_dependency())
+            waiting = asyncio.ensure_future(call_dependency())
+            await asyncio.sleep(0)
+            waiting.cancel()
+            await first
+            await call_dependency()
+
+        asyncio.run(start())
+        stats = report()["async_cancel", "call_dependency"]
+        assert (stats.in_flight, stats.queued) == (0, 0)
+
+
+class TestValidation:
+    def test_invalid_limits(self) -> None:
+        with pytest.raises(ValueError, match="max_concurrency"):
+            step("bad", max_concurrency=0)(lambda: None)
+        with pytest.raises(ValueError, match="timeout"):
+            step("bad", timeout=0)(lambda: None)
+
+    def test_set_limits_unknown_step(self) -> None:
+        with pytest.raises(KeyError, match="has no limits"):
+            set_limits("nope", "nope", max_concurrency=1)
+
+    def test_set_limits_keeps_unpassed_values(self) -> None:
+        step("kept", max_concurrency=2, timeout=1.0)(lambda: None)
+        set_limits("kept", "<lambda>", timeout=None)
+        stats = report()["kept", "<lambda>"]
+        assert (stats.max_concurrency, stats.timeout) == (2, None)
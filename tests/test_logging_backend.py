@@ -7,7 +7,7 @@ import logging
 import pytest
 
 from penstock._context import FlowContext, _set_context
-from penstock.backends.logging import LoggingBackend
+from penstock.backends.logging import LoggingBackend, StepTimings
 
 
 class TestSpan:
@@ -55,6 +55,26 @@ class TestSpan:
 
         end = caplog.records[1]
         assert isinstance(end.duration_ms, float)  # type: ignore[attr-defined]
+        assert isinstance(end.duration_ns, int)  # type: ignore[attr-defined]
+
+    def test_late_attributes_added_to_end(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        _set_context(FlowContext(correlation_id="cid"))
+        backend = LoggingBackend()
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            with backend.span("outer", "f"):
+                with backend.span("inner", "f"):
+                    backend.set_span_attributes(cpu_ns=5)
+                backend.set_span_attributes(cpu_ns=7)
+            # No open span: silently ignored.
+            backend.set_span_attributes(cpu_ns=9)
+
+        inner_end, outer_end = caplog.records[2], caplog.records[3]
+        assert inner_end.step == "inner"  # type: ignore[attr-defined]
+        assert inner_end.cpu_ns == 5  # type: ignore[attr-defined]
+        assert outer_end.cpu_ns == 7  # type: ignore[attr-defined]
 
     def test_span_logs_on_exception(self, caplog: pytest.LogCaptureFixture) -> None:
         _set_context(FlowContext(correlation_id="cid"))
@@ -83,3 +103,134 @@ class TestGetCorrelationId:
         cid = backend.get_correlation_id()
         assert isinstance(cid, str)
         assert len(cid) == 32  # uuid4 hex
+
+
+class TestSlowFlowCapture:
+    def _run(self, backend: LoggingBackend, *, fail: bool = False) -> None:
+        _set_context(FlowContext(correlation_id="cid"))
+        with backend.flow_span("start", "f"):
+            with backend.span("validate", "f"):
+                pass
+            with backend.span("charge", "f"):
+                pass
+            if fail:
+                raise ValueError("boom")
+
+    def test_fast_flow_emits_single_summary(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        backend = LoggingBackend(slow_flow_ms=10_000)
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            self._run(backend)
+
+        assert [r.message for r in caplog.records] == ["flow.summary"]
+        summary = caplog.records[0]
+        assert summary.correlation_id == "cid"  # type: ignore[attr-defined]
+        assert summary.step == "start"  # type: ignore[attr-defined]
+        assert summary.step_count == 2  # type: ignore[attr-defined]
+        assert summary.duration_ms >= 0  # type: ignore[attr-defined]
+        assert summary.failed is False  # type: ignore[attr-defined]
+
+    def test_slow_flow_flushes_buffer(self, caplog: pytest.LogCaptureFixture) -> None:
+        backend = LoggingBackend(slow_flow_ms=0)
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            self._run(backend)
+
+        steps = [(r.message, r.step) for r in caplog.records]  # type: ignore[attr-defined]
+        assert steps == [
+            ("step.start", "start"),
+            ("step.start", "validate"),
+            ("step.end", "validate"),
+            ("step.start", "charge"),
+            ("step.end", "charge"),
+            ("step.end", "start"),
+        ]
+
+    def test_failing_flow_flushes_buffer(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        backend = LoggingBackend(slow_flow_ms=10_000)
+        with (
+            caplog.at_level(logging.INFO, logger="penstock"),
+            pytest.raises(ValueError, match="boom"),
+        ):
+            self._run(backend, fail=True)
+
+        assert len(caplog.records) == 6
+
+    def test_buffer_size_caps_records(self, caplog: pytest.LogCaptureFixture) -> None:
+        backend = LoggingBackend(slow_flow_ms=0, buffer_size=2)
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            self._run(backend)
+
+        # Root start/end plus the first two buffered records.
+        assert len(caplog.records) == 4
+
+    def test_flow_span_without_threshold_is_plain_span(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            self._run(LoggingBackend())
+
+        assert len(caplog.records) == 6
+
+
+class TestSummaryMode:
+    def test_single_record_per_flow(self, caplog: pytest.LogCaptureFixture) -> None:
+        _set_context(FlowContext(correlation_id="cid"))
+        backend = LoggingBackend(summary=True)
+
+        with (
+            caplog.at_level(logging.INFO, logger="penstock"),
+            backend.flow_span("start", "f"),
+        ):
+            for name in ("validate", "charge", "ship"):
+                with backend.span(name, "f"):
+                    pass
+
+        assert [r.message for r in caplog.records] == ["flow.summary"]
+        summary = caplog.records[0]
+        assert summary.correlation_id == "cid"  # type: ignore[attr-defined]
+        assert summary.step_count == 3  # type: ignore[attr-defined]
+        entries = [e.split(":") for e in summary.steps.split(";")]  # type: ignore[attr-defined]
+        assert [e[0] for e in entries] == ["validate", "charge", "ship"]
+        offsets = [float(e[1]) for e in entries]
+        assert offsets == sorted(offsets)
+
+    def test_summary_marks_failure(self, caplog: pytest.LogCaptureFixture) -> None:
+        _set_context(FlowContext(correlation_id="cid"))
+        backend = LoggingBackend(summary=True)
+
+        with (
+            caplog.at_level(logging.INFO, logger="penstock"),
+            pytest.raises(ValueError),
+            backend.flow_span("start", "f"),
+        ):
+            raise ValueError("boom")
+
+        assert caplog.records[0].failed is True  # type: ignore[attr-defined]
+
+    def test_capacity_learned_per_flow(self) -> None:
+        _set_context(FlowContext(correlation_id="cid"))
+        backend = LoggingBackend(summary=True)
+
+        with backend.flow_span("start", "f"):
+            for i in range(20):
+                with backend.span(f"s{i}", "f"):
+                    pass
+
+        assert backend._capacity["f"] == 20
+
+
+class TestStepTimings:
+    def test_record_and_encode(self) -> None:
+        timings = StepTimings(origin=10_000_000, capacity=1)
+        timings.record("a", 10_000_000, 10_500_000)
+        timings.record("b", 10_500_000, 11_000_000)
+        timings.record("c", 11_000_000, 11_000_250)
+
+        assert timings.count == 3
+        assert timings.encode() == "a:0.000:0.500;b:0.500:0.500;c:1.000:0.000"
+
+    def test_empty(self) -> None:
+        assert StepTimings(origin=0).encode() == ""
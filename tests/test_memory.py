@@ -0,0 +1,138 @@
+"""Tests for penstock.memory."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import tracemalloc
+from collections.abc import Iterator
+
+import pytest
+
+from penstock import memory
+from penstock._config import configure
+from penstock._decorators import entrypoint, step
+
+
+@pytest.fixture(autouse=True)
+def _reset_memory() -> Iterator[None]:
+    yield
+    memory.disable()
+    memory.reset()
+
+
+_retained: list[bytes] = []
+
+
+class TestMemoryAccounting:
+    def test_attributes_net_and_peak_per_step(self) -> None:
+        @step("mem", after="start")
+        def leak() -> None:
+            _retained.append(b"x" * 1_000_000)
+
+        @step("mem", after="start")
+        def spike() -> None:
+            buf = b"y" * 2_000_000
+            del buf
+
+        @entrypoint("mem")
+        def start() -> None:
+            leak()
+            spike()
+
+        memory.enable()
+        start()
+        stats = memory.report()
+        _retained.clear()
+
+        assert stats["mem", "leak"].calls == 1
+        assert stats["mem", "leak"].net_bytes >= 1_000_000
+        assert stats["mem", "spike"].net_bytes < 100_000
+        assert stats["mem", "spike"].peak_bytes >= 2_000_000
+        # The entrypoint sees the peak of its nested steps.
+        assert stats["mem", "start"].peak_bytes >= 2_000_000
+        assert stats["mem", "start"].net_bytes >= 1_000_000
+
+    def test_span_attributes(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging")
+
+        @entrypoint("mem_attrs")
+        def start() -> None:
+            _retained.append(b"z" * 500_000)
+
+        memory.enable()
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            start()
+        _retained.clear()
+
+        end = caplog.records[-1]
+        assert end.mem_net_bytes >= 500_000  # type: ignore[attr-defined]
+        assert end.mem_peak_bytes >= 500_000  # type: ignore[attr-defined]
+
+    def test_async_step_only_charged_while_running(self) -> None:
+        @step("mem_async", after="start")
+        async def allocate() -> None:
+            _retained.append(b"a" * 1_000_000)
+            await asyncio.sleep(0.01)
+
+        async def other() -> None:
+            await asyncio.sleep(0)
+            _retained.append(b"b" * 3_000_000)
+
+        @entrypoint("mem_async")
+        async def start() -> None:
+            await allocate()
+
+        async def main() -> None:
+            await asyncio.gather(start(), other())
+
+        memory.enable()
+        asyncio.run(main())
+        stats = memory.report()
+        _retained.clear()
+
+        assert 1_000_000 <= stats["mem_async", "allocate"].net_bytes < 2_000_000
+
+    def test_runtime_toggle(self) -> None:
+        was_tracing = tracemalloc.is_tracing()
+
+        @entrypoint("mem_toggle")
+        def start() -> None:
+            pass
+
+        memory.enable()
+        assert memory.is_enabled()
+        start()
+        memory.disable()
+        assert not memory.is_enabled()
+        start()
+
+        assert memory.report()["mem_toggle", "start"].calls == 1
+        assert tracemalloc.is_tracing() == was_tracing
+        memory.reset()
+        assert memory.report() == {}
+
+    def test_disable_mid_step_is_not_reported(self) -> None:
+        @step("mem_switch", after="start")
+        def switch_off() -> None:
+            _retained.append(b"s" * 2_000_000)
+            memory.disable()
+
+        @step("mem_switch", after="start")
+        def switch_on() -> None:
+            memory.enable()
+
+        @entrypoint("mem_switch")
+        def start() -> None:
+            switch_on()
+            switch_off()
+
+        memory.enable()
+        start()
+        _retained.clear()
+        assert memory.report() == {}
+
+        memory.enable()
+        start()
+        _retained.clear()
+        assert memory.report() == {}
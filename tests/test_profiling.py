@@ -0,0 +1,95 @@
+"""Tests for penstock.profiling.FlowProfiler."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from penstock._decorators import entrypoint, step
+from penstock._instrument import _async_factories, _sync_factories
+from penstock.profiling import FlowProfiler, _current
+
+
+def _busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestFlowProfiler:
+    def test_attributes_samples_to_flow_and_step(self) -> None:
+        @step("profiled", after="start")
+        def render_pdf() -> None:
+            _busy(0.1)
+
+        @entrypoint("profiled")
+        def start() -> None:
+            render_pdf()
+
+        with FlowProfiler(hz=500) as profiler:
+            start()
+
+        assert profiler.flows() == ["profiled"]
+        stacks = profiler.collapsed("profiled")
+        assert sum(stacks.values()) > 5
+        assert all(s.startswith("step:") for s in stacks)
+        pdf = [s for s in stacks if s.startswith("step:render_pdf;")]
+        assert pdf
+        assert all("_busy" in s for s in pdf)
+
+    def test_async_steps_only_sampled_while_running(self) -> None:
+        @step("profiled_async", after="start")
+        async def wait() -> None:
+            await asyncio.sleep(0.1)
+
+        @entrypoint("profiled_async")
+        async def start() -> None:
+            await wait()
+            _busy(0.1)
+
+        with FlowProfiler(hz=500) as profiler:
+            asyncio.run(start())
+
+        stacks = profiler.collapsed("profiled_async")
+        assert any(s.startswith("step:start;") for s in stacks)
+        assert not any(s.startswith("step:wait;") for s in stacks)
+
+    def test_write_collapsed_files(self, tmp_path: Path) -> None:
+        @entrypoint("written")
+        def start() -> None:
+            _busy(0.05)
+
+        with FlowProfiler(hz=500) as profiler:
+            start()
+
+        paths = profiler.write(tmp_path / "out")
+        assert paths == [tmp_path / "out" / "written.collapsed"]
+        lines = paths[0].read_text().splitlines()
+        stack, count = lines[0].rsplit(" ", 1)
+        assert stack.startswith("step:start;")
+        assert int(count) > 0
+
+    def test_markers_removed_after_stop(self) -> None:
+        @entrypoint("stopped")
+        def start() -> None:
+            pass
+
+        profiler = FlowProfiler()
+        profiler.start()
+        profiler.stop()
+        start()
+
+        assert _current == {}
+        assert _async_factories == []
+        assert _sync_factories == []
+
+    def test_only_one_profiler(self) -> None:
+        with FlowProfiler(), pytest.raises(RuntimeError, match="already running"):
+            FlowProfiler().start()
+
+    def test_invalid_hz(self) -> None:
+        with pytest.raises(ValueError, match="positive"):
+            FlowProfiler(hz=0)
@@ -0,0 +1,196 @@
+"""Tests for penstock.propagation."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+import pytest
+
+from penstock import propagation
+from penstock._context import FlowContext, _set_context
+from penstock.propagation import (
+    TraceParent,
+    extract,
+    format_baggage,
+    inject,
+    is_correlation_id,
+    parse_baggage,
+    parse_traceparent,
+    parse_tracestate,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+TRACEPARENT = f"00-{TRACE_ID}-{PARENT_ID}-01"
+
+
+@pytest.fixture(autouse=True)
+def _no_baggage_keys() -> Iterator[None]:
+    yield
+    propagation.set_baggage_keys(())
+
+
+class TestTraceParent:
+    def test_parses_valid_header(self) -> None:
+        parent = parse_traceparent(TRACEPARENT)
+        assert parent == TraceParent(TRACE_ID, PARENT_ID, 1)
+        assert parent is not None
+        assert parent.sampled
+        assert str(parent) == TRACEPARENT
+
+    def test_unsampled_flag(self) -> None:
+        parent = parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00")
+        assert parent is not None
+        assert not parent.sampled
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "",
+            TRACEPARENT[:-1],
+            TRACEPARENT + "-extra",
+            TRACEPARENT.upper(),
+            f"00-{'0' * 32}-{PARENT_ID}-01",
+            f"00-{TRACE_ID}-{'0' * 16}-01",
+            f"ff-{TRACE_ID}-{PARENT_ID}-01",
+            f"00-{TRACE_ID[:-1]}g-{PARENT_ID}-01",
+            f"00-{TRACE_ID[:8]}-{TRACE_ID[9:]}0-{PARENT_ID}-01",
+            f"00_{TRACE_ID}-{PARENT_ID}-01",
+            f" 0-{TRACE_ID}-{PARENT_ID}-01",
+        ],
+    )
+    def test_rejects_invalid_header(self, value: str) -> None:
+        assert parse_traceparent(value) is None
+
+    def test_accepts_future_version_with_extra_fields(self) -> None:
+        parent = parse_traceparent(f"01-{TRACE_ID}-{PARENT_ID}-01-future")
+        assert parent == TraceParent(TRACE_ID, PARENT_ID, 1)
+
+
+class TestTraceState:
+    def test_normalises_valid_header(self) -> None:
+        assert parse_tracestate("congo=t61rcWkgMzE, rojo=00f067aa,") == (
+            "congo=t61rcWkgMzE,rojo=00f067aa"
+        )
+        assert parse_tracestate("tenant@vendor=x") == "tenant@vendor=x"
+
+    @pytest.mark.parametrize(
+        "value",
+        ["", "novalue", "Upper=x", "a=b=c", "a@b@c=x", "_a=x", "k=a\x7f"],
+    )
+    def test_rejects_invalid_header(self, value: str) -> None:
+        assert parse_tracestate(value) is None
+
+    def test_rejects_too_many_members(self) -> None:
+        assert parse_tracestate(",".join(f"k{i}=v" for i in range(33))) is None
+
+
+class TestBaggage:
+    def test_parses_members(self) -> None:
+        assert parse_baggage("tenant=acme, user=j%20doe;ttl=60 ,bad key=x,=y") == {
+            "tenant": "acme",
+            "user": "j doe",
+        }
+
+    def test_ignores_oversized_header(self) -> None:
+        assert parse_baggage("k=" + "v" * 9000) == {}
+
+    def test_round_trip(self) -> None:
+        items = {"tenant": "acme, inc", "region": "eu-west-1"}
+        assert parse_baggage(format_baggage(items)) == items
+
+
+class TestCorrelationId:
+    @pytest.mark.parametrize("value", ["abc", "req-7f3a:2c.1_x", "a" * 128])
+    def test_accepts(self, value: str) -> None:
+        assert is_correlation_id(value)
+
+    @pytest.mark.parametrize("value", ["", "a" * 129, "has space", "semi;colon"])
+    def test_rejects(self, value: str) -> None:
+        assert not is_correlation_id(value)
+
+
+class TestExtract:
+    def test_no_headers(self) -> None:
+        no_headers: dict[str, str] = {}
+        ctx = extract(no_headers.get)
+        assert len(ctx.correlation_id) == 32
+        assert ctx.sampled is None
+        assert ctx.traceparent is None
+
+    def test_correlation_header_wins(self) -> None:
+        ctx = extract({"x-correlation-id": "req-1", "traceparent": TRACEPARENT}.get)
+        assert ctx.correlation_id == "req-1"
+        assert ctx.traceparent == TRACEPARENT
+
+    def test_trace_id_becomes_correlation_id(self) -> None:
+        headers = {
+            "x-correlation-id": "not valid!",
+            "traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00",
+            "tracestate": "rojo=1",
+        }
+        ctx = extract(headers.get)
+        assert ctx.correlation_id == TRACE_ID
+        assert ctx.sampled is False
+        assert ctx.tracestate == "rojo=1"
+
+    def test_penstock_sampling_header_wins(self) -> None:
+        headers = {"traceparent": TRACEPARENT, "x-penstock-sampled": "0"}
+        assert extract(headers.get).sampled is False
+
+    def test_tracestate_needs_valid_traceparent(self) -> None:
+        ctx = extract({"traceparent": "junk", "tracestate": "rojo=1"}.get)
+        assert ctx.traceparent is None
+        assert ctx.tracestate is None
+
+    def test_selected_baggage_becomes_metadata(self) -> None:
+        headers = {"baggage": "tenant=acme,secret=x"}
+        assert extract(headers.get).metadata == {}
+        propagation.set_baggage_keys(["tenant"])
+        assert extract(headers.get).metadata == {"tenant": "acme"}
+
+    def test_deadline(self) -> None:
+        assert extract({"x-penstock-deadline": "1700000000.5"}.get).deadline == (
+            1700000000.5
+        )
+
+
+class TestInject:
+    def test_empty_outside_flow(self) -> None:
+        assert inject() == {}
+
+    def test_passes_on_inbound_trace(self) -> None:
+        ctx = extract({"traceparent": TRACEPARENT, "tracestate": "rojo=1"}.get)
+        _set_context(ctx)
+        assert inject() == {
+            "x-correlation-id": TRACE_ID,
+            "x-penstock-sampled": "1",
+            "traceparent": TRACEPARENT,
+            "tracestate": "rojo=1",
+        }
+
+    def test_starts_trace_from_generated_id(self) -> None:
+        ctx = FlowContext(sampled=False)
+        parent = parse_traceparent(inject(ctx)["traceparent"])
+        assert parent is not None
+        assert parent.trace_id == ctx.correlation_id
+        assert not parent.sampled
+
+    def test_no_trace_for_custom_id(self) -> None:
+        assert inject(FlowContext(correlation_id="req-1")) == {
+            "x-correlation-id": "req-1"
+        }
+
+    def test_selected_baggage(self) -> None:
+        propagation.set_baggage_keys(["tenant"])
+        ctx = FlowContext(
+            correlation_id="req-1", metadata={"tenant": "a b", "other": "x"}
+        )
+        assert inject(ctx)["baggage"] == "tenant=a%20b"
+
+    def test_state_round_trip(self) -> None:
+        ctx = extract({"traceparent": TRACEPARENT, "tracestate": "rojo=1"}.get)
+        restored = FlowContext._from_state(ctx._to_state())
+        assert restored.traceparent == TRACEPARENT
+        assert restored.tracestate == "rojo=1"
+        assert ctx.fork().traceparent == TRACEPARENT
@@ -77,6 +77,16 @@ class TestValidateFlow:
             _registry.validate_flow("nope")
 
 
+class TestRuntimeEdges:
+    def test_record_and_clear(self) -> None:
+        _registry.record_edges("f", [("a", "b")])
+        _registry.record_edges("f", [("a", "b"), ("b", "c")])
+        assert _registry.get_runtime_edges("f") == {("a", "b"), ("b", "c")}
+        assert _registry.get_runtime_edges("other") == set()
+        _registry.clear()
+        assert _registry.get_runtime_edges("f") == set()
+
+
 class TestClear:
     def test_clear(self) -> None:
         _registry.register(_step())
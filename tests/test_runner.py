@@ -0,0 +1,242 @@
+"""Tests for penstock._runner (run_flow / arun_flow)."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+
+import pytest
+
+from penstock._config import configure
+from penstock._context import current_flow_id, get_flow_context
+from penstock._decorators import entrypoint, step
+from penstock._runner import arun_flow, run_flow
+from penstock.deadlines import DeadlineExceeded, remaining
+
+
+def _order_flow(delay: float) -> None:
+    @entrypoint("orders")
+    def validate(order: str) -> str:
+        return f"{order}:valid"
+
+    @step("orders", after="validate")
+    def charge(order: str) -> str:
+        time.sleep(delay)
+        return f"{order}:charged"
+
+    @step("orders", after="validate")
+    async def ship(order: str) -> str:
+        await asyncio.sleep(delay)
+        return f"{order}:shipped"
+
+    @step("orders", after=["charge", "ship"])
+    def notify(charged: str, shipped: str) -> tuple[str, str]:
+        return charged, shipped
+
+
+class TestRunFlow:
+    def test_results_follow_after_edges(self) -> None:
+        _order_flow(0)
+
+        results = run_flow("orders", "o1")
+
+        assert results == {
+            "validate": "o1:valid",
+            "charge": "o1:valid:charged",
+            "ship": "o1:valid:shipped",
+            "notify": ("o1:valid:charged", "o1:valid:shipped"),
+        }
+
+    def test_independent_steps_run_concurrently(self) -> None:
+        _order_flow(0.2)
+
+        start = time.perf_counter()
+        run_flow("orders", "o1")
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.35
+
+    def test_sync_steps_run_in_parallel_threads(self) -> None:
+        barrier = threading.Barrier(2, timeout=2)
+
+        @entrypoint("fanout")
+        def start() -> None:
+            pass
+
+        @step("fanout", after="start")
+        def left(_: None) -> int:
+            barrier.wait()
+            return 1
+
+        @step("fanout", after="start")
+        def right(_: None) -> int:
+            barrier.wait()
+            return 2
+
+        assert run_flow("fanout", max_workers=2)["right"] == 2
+
+    def test_single_flow_context(self) -> None:
+        @entrypoint("cids")
+        def start() -> str | None:
+            return current_flow_id()
+
+        @step("cids", after="start")
+        def sync_step(_: str) -> str | None:
+            return current_flow_id()
+
+        @step("cids", after="start")
+        async def async_step(_: str) -> str | None:
+            return current_flow_id()
+
+        results = run_flow("cids")
+
+        assert results["start"] is not None
+        assert results["sync_step"] == results["start"]
+        assert results["async_step"] == results["start"]
+        assert get_flow_context() is None
+
+    def test_spans(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging")
+        _order_flow(0)
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            run_flow("orders", "o1")
+
+        ends = [r for r in caplog.records if r.getMessage() == "step.end"]
+        assert sorted(r.step for r in ends) == [  # type: ignore[attr-defined]
+            "charge",
+            "notify",
+            "ship",
+            "validate",
+        ]
+        assert ends[-1].step == "validate"  # type: ignore[attr-defined]
+        assert len({r.correlation_id for r in ends}) == 1  # type: ignore[attr-defined]
+
+    def test_alternative_entrypoints(self) -> None:
+        @entrypoint("users")
+        def api_request() -> str:
+            return "api"
+
+        @entrypoint("users")
+        def admin_action() -> str:
+            return "admin"
+
+        @step("users", after=["api_request", "admin_action"])
+        def persist(source: str) -> str:
+            return f"saved via {source}"
+
+        with pytest.raises(ValueError, match="entrypoint="):
+            run_flow("users")
+        results = run_flow("users", entrypoint="admin_action")
+        assert results == {"admin_action": "admin", "persist": "saved via admin"}
+
+    def test_unknown_entrypoint(self) -> None:
+        @entrypoint("known")
+        def start() -> None:
+            pass
+
+        with pytest.raises(KeyError, match="no entrypoint 'other'"):
+            run_flow("known", entrypoint="other")
+
+    def test_cycle(self) -> None:
+        @entrypoint("cyclic")
+        def start() -> None:
+            pass
+
+        @step("cyclic", after=["start", "b"])
+        def a(*_: object) -> None:
+            pass
+
+        @step("cyclic", after="a")
+        def b(_: object) -> None:
+            pass
+
+        with pytest.raises(ValueError, match="cycle"):
+            run_flow("cyclic")
+
+    def test_failure_cancels_and_propagates(self) -> None:
+        finished: list[str] = []
+
+        @entrypoint("failing")
+        def start() -> None:
+            pass
+
+        @step("failing", after="start")
+        def broken(_: None) -> None:
+            raise ValueError("boom")
+
+        @step("failing", after="start")
+        async def slow(_: None) -> None:
+            await asyncio.sleep(1)
+            finished.append("slow")
+
+        with pytest.raises(ValueError, match="boom"):
+            run_flow("failing")
+        assert finished == []
+        assert get_flow_context() is None
+
+    def test_other_failures_kept_as_notes(self) -> None:
+        @entrypoint("failing_twice")
+        def start() -> None:
+            pass
+
+        @step("failing_twice", after="start")
+        async def broken(_: None) -> None:
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        @step("failing_twice", after="start")
+        async def cleanup(_: None) -> None:
+            try:
+                await asyncio.sleep(1)
+            finally:
+                raise KeyError("cleanup failed")
+
+        with pytest.raises(ValueError, match="boom") as info:
+            run_flow("failing_twice")
+        [note] = info.value.__notes__
+        assert "Another step failed" in note
+        assert "KeyError: 'cleanup failed'" in note
+
+    def test_coalescing_entrypoint_rejected(self) -> None:
+        @entrypoint("shared", coalesce=lambda: "same")
+        def start() -> None:
+            pass
+
+        with pytest.raises(ValueError, match="coalesces calls"):
+            run_flow("shared")
+
+    def test_entrypoint_deadline(self) -> None:
+        ran: list[str] = []
+
+        @entrypoint("timed", deadline=0.05)
+        def start() -> float | None:
+            return remaining()
+
+        @step("timed", after="start")
+        def slow(_: float | None) -> None:
+            time.sleep(0.1)
+
+        @step("timed", after="slow")
+        def late(_: None) -> None:
+            ran.append("late")
+
+        with pytest.raises(DeadlineExceeded):
+            run_flow("timed")
+        assert ran == []
+
+
+class TestArunFlow:
+    def test_async_entrypoint(self) -> None:
+        @entrypoint("async_run")
+        async def start(x: int) -> int:
+            return x + 1
+
+        @step("async_run", after="start")
+        async def double(x: int) -> int:
+            return x * 2
+
+        results = asyncio.run(arun_flow("async_run", 1))
+        assert results == {"start": 2, "double": 4}
@@ -0,0 +1,158 @@
+"""Tests for penstock.sampling and sampled flow execution."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import pytest
+
+from penstock._config import configure, get_sampler
+from penstock._context import FlowContext, _set_context, get_flow_context
+from penstock._decorators import entrypoint, step
+from penstock.sampling import AlwaysOnSampler, RateLimitingSampler, RateSampler
+
+
+class TestRateSampler:
+    def test_extremes(self) -> None:
+        assert RateSampler(1.0).should_sample("f") is True
+        assert RateSampler(0.0).should_sample("f") is False
+
+    def test_per_flow_override(self) -> None:
+        sampler = RateSampler(0.0, per_flow={"important": 1.0})
+        assert sampler.should_sample("important") is True
+        assert sampler.should_sample("other") is False
+
+    def test_fraction(self) -> None:
+        sampler = RateSampler(0.5)
+        hits = sum(sampler.should_sample("f") for _ in range(2000))
+        assert 800 < hits < 1200
+
+    def test_invalid_rate_raises(self) -> None:
+        with pytest.raises(ValueError, match="between 0 and 1"):
+            RateSampler(1.5)
+        with pytest.raises(ValueError, match="between 0 and 1"):
+            RateSampler(0.5, per_flow={"f": -1})
+
+
+class TestRateLimitingSampler:
+    def test_burst_then_limited(self) -> None:
+        sampler = RateLimitingSampler(0.001, burst=3)
+        results = [sampler.should_sample("f") for _ in range(5)]
+        assert results == [True, True, True, False, False]
+
+    def test_buckets_are_per_flow(self) -> None:
+        sampler = RateLimitingSampler(0.001, burst=1)
+        assert sampler.should_sample("a") is True
+        assert sampler.should_sample("a") is False
+        assert sampler.should_sample("b") is True
+
+    def test_invalid_rate_raises(self) -> None:
+        with pytest.raises(ValueError, match="positive"):
+            RateLimitingSampler(0)
+        with pytest.raises(ValueError, match="burst"):
+            RateLimitingSampler(1, burst=0.5)
+        with pytest.raises(ValueError, match="burst"):
+            RateLimitingSampler(1, burst=0)
+
+    def test_rate_below_one_per_second(self) -> None:
+        sampler = RateLimitingSampler(0.1)
+        assert sampler.should_sample("f") is True
+        assert sampler.should_sample("f") is False
+        # Ten seconds later the bucket has refilled one token.
+        sampler._buckets["f"]._refilled -= 10
+        assert sampler.should_sample("f") is True
+        assert sampler.should_sample("f") is False
+
+
+class TestConfigureSampler:
+    def test_default_is_none(self) -> None:
+        assert get_sampler() is None
+
+    def test_configure_sets_sampler(self) -> None:
+        sampler = AlwaysOnSampler()
+        configure("logging", sampler=sampler)
+        assert get_sampler() is sampler
+
+
+class TestSampledExecution:
+    def test_unsampled_flow_emits_no_spans(
+        self, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        configure("logging", sampler=RateSampler(0.0))
+
+        @step("unsampled", after="start")
+        def process() -> str:
+            return "done"
+
+        @entrypoint("unsampled")
+        def start() -> tuple[bool | None, str]:
+            ctx = get_flow_context()
+            assert ctx is not None
+            return ctx.sampled, process()
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            assert start() == (False, "done")
+        assert caplog.records == []
+
+    def test_sampled_flow_emits_spans(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging", sampler=RateSampler(0.0, per_flow={"sampled": 1.0}))
+
+        @entrypoint("sampled")
+        def start() -> None:
+            pass
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            start()
+        assert [r.message for r in caplog.records] == ["step.start", "step.end"]
+
+    def test_decision_made_once_per_flow(self) -> None:
+        calls: list[str] = []
+
+        class CountingSampler(AlwaysOnSampler):
+            def should_sample(self, flow_name: str) -> bool:
+                calls.append(flow_name)
+                return True
+
+        configure("logging", sampler=CountingSampler())
+
+        @step("once", after="start")
+        def process() -> None:
+            pass
+
+        @entrypoint("once")
+        def start() -> None:
+            process()
+            process()
+
+        start()
+        assert calls == ["once"]
+
+    def test_inherits_upstream_decision(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging", sampler=RateSampler(1.0))
+        _set_context(FlowContext(sampled=False))
+
+        @entrypoint("inherited")
+        def start() -> bool | None:
+            ctx = get_flow_context()
+            assert ctx is not None
+            return ctx.sampled
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            assert start() is False
+        assert caplog.records == []
+
+    def test_async_unsampled(self, caplog: pytest.LogCaptureFixture) -> None:
+        configure("logging", sampler=RateSampler(0.0))
+
+        @step("async_unsampled", after="start")
+        async def process() -> int:
+            return 1
+
+        @entrypoint("async_unsampled")
+        async def start() -> int:
+            return await process()
+
+        with caplog.at_level(logging.INFO, logger="penstock"):
+            assert asyncio.run(start()) == 1
+        assert caplog.records == []
@@ -0,0 +1,102 @@
+"""Tests for penstock.watchdog."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import Iterator
+
+import pytest
+
+from penstock import watchdog
+from penstock._context import current_flow_id
+from penstock._decorators import entrypoint, step
+from penstock.watchdog import LoopBlock
+
+
+@pytest.fixture(autouse=True)
+def _disable_watchdog() -> Iterator[None]:
+    yield
+    watchdog.disable()
+
+
+def _collect(threshold_ms: float, *, capture_stack: bool = False) -> list[LoopBlock]:
+    blocks: list[LoopBlock] = []
+    watchdog.enable(threshold_ms, capture_stack=capture_stack, handler=blocks.append)
+    return blocks
+
+
+class TestLoopWatchdog:
+    def test_reports_blocking_step(self) -> None:
+        blocks = _collect(20)
+
+        @step("blocking", after="start")
+        async def fetch() -> None:
+            time.sleep(0.05)
+
+        @entrypoint("blocking")
+        async def start() -> str:
+            await fetch()
+            await asyncio.sleep(0)
+            return current_flow_id() or ""
+
+        cid = asyncio.run(start())
+
+        assert len(blocks) == 1
+        block = blocks[0]
+        assert (block.flow_name, block.step_name) == ("blocking", "fetch")
+        assert block.correlation_id == cid
+        assert block.duration_ms >= 50
+        assert block.stack is None
+
+    def test_ignores_suspended_time(self) -> None:
+        blocks = _collect(20)
+
+        @entrypoint("non_blocking")
+        async def start() -> None:
+            await asyncio.sleep(0.05)
+
+        asyncio.run(start())
+        assert blocks == []
+
+    def test_captures_stack(self) -> None:
+        blocks = _collect(20, capture_stack=True)
+
+        def legacy_client_call() -> None:
+            time.sleep(0.1)
+
+        @entrypoint("stack")
+        async def start() -> None:
+            legacy_client_call()
+
+        asyncio.run(start())
+
+        assert len(blocks) == 1
+        assert blocks[0].stack is not None
+        assert "legacy_client_call" in blocks[0].stack
+
+    def test_logs_by_default(self, caplog: pytest.LogCaptureFixture) -> None:
+        watchdog.enable(10)
+
+        @entrypoint("logged")
+        async def start() -> None:
+            time.sleep(0.02)
+
+        with caplog.at_level(logging.WARNING, logger="penstock"):
+            asyncio.run(start())
+
+        blocked = [r for r in caplog.records if r.message == "loop.blocked"]
+        assert len(blocked) == 1
+        assert blocked[0].step == "start"  # type: ignore[attr-defined]
+
+    def test_disable_stops_reports(self) -> None:
+        blocks = _collect(10)
+        watchdog.disable()
+
+        @entrypoint("disabled")
+        async def start() -> None:
+            time.sleep(0.02)
+
+        asyncio.run(start())
+        assert blocks == []